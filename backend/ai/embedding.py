@@ -17,3 +17,13 @@ class EmbeddingService:
         except Exception as e:
             logger.error(f"Error generating embedding: {e}")
             return []
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generates embeddings for many texts in batched requests. Failed items come back as [].
+        """
+        try:
+            return self.llm.get_embeddings(texts)
+        except Exception as e:
+            logger.error(f"Error generating embeddings: {e}")
+            return [[] for _ in texts]
@@ -0,0 +1,148 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from ai.embedding import EmbeddingService
+from ai.vector_index import VectorIndexManager, INDEX_NAMES
+from models import EMBEDDING_OPS
+from config import settings
+from typing import Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+STAGING_COLUMN = "embedding_new"
+CENTROID_INDEX = "ix_problem_clusters_centroid_hnsw"
+# Rows without text cannot be re-embedded; they are swapped in with a NULL embedding
+HAS_TEXT = "COALESCE(btrim(text), '') <> ''"
+
+class EmbeddingMigrator:
+    """
+    Moves problem_statements.embedding to the configured EMBEDDING_STORAGE / EMBEDDING_DIM / EMBEDDING_MODEL.
+
+    Rows are written into a staging column in batches of EMBEDDING_MIGRATION_BATCH, one short transaction each,
+    so the table stays readable and an interrupted run resumes where it stopped. Only the final swap
+    (drop old column, rename staging column, retype centroids) takes an exclusive lock, after which the
+    ANN indexes are rebuilt.
+
+    - "convert": cast existing vectors (e.g. vector -> halfvec); the dimension must not change.
+    - "reembed": embed every problem's text again with the configured model (model or dimension change).
+    """
+    def __init__(self, db: Session, batch_size: Optional[int] = None):
+        self.db = db
+        self.batch_size = batch_size or settings.EMBEDDING_MIGRATION_BATCH
+        self.target_type = f"{settings.EMBEDDING_STORAGE}({int(settings.EMBEDDING_DIM)})"
+
+    def _column_type(self, table: str, column: str) -> Optional[str]:
+        return self.db.execute(text(
+            "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+            "WHERE attrelid = CAST(:table AS regclass) AND attname = :column AND NOT attisdropped"
+        ), {"table": table, "column": column}).scalar()
+
+    def _prepare_staging(self):
+        current = self._column_type("problem_statements", STAGING_COLUMN)
+        if current == self.target_type:
+            logger.info(f"Resuming migration into existing {STAGING_COLUMN} ({current}).")
+            return
+        if current is not None:
+            self.db.execute(text(f"ALTER TABLE problem_statements DROP COLUMN {STAGING_COLUMN}"))
+        self.db.execute(text(f"ALTER TABLE problem_statements ADD COLUMN {STAGING_COLUMN} {self.target_type}"))
+        self.db.commit()
+
+    def _convert_batches(self) -> int:
+        migrated = 0
+        while True:
+            ids = self.db.execute(text(
+                f"UPDATE problem_statements SET {STAGING_COLUMN} = CAST(embedding AS {self.target_type}) "
+                f"WHERE id IN (SELECT id FROM problem_statements WHERE {STAGING_COLUMN} IS NULL "
+                f"AND embedding IS NOT NULL ORDER BY id LIMIT :n) RETURNING id"
+            ), {"n": self.batch_size}).scalars().all()
+            self.db.commit()
+            if not ids:
+                return migrated
+            migrated += len(ids)
+            logger.info(f"Converted {migrated} embeddings.")
+
+    def _reembed_batches(self) -> int:
+        embedder = EmbeddingService()
+        migrated, last_id = 0, 0
+        while True:
+            rows = self.db.execute(text(
+                f"SELECT id, text FROM problem_statements WHERE {STAGING_COLUMN} IS NULL AND {HAS_TEXT} "
+                f"AND id > :last ORDER BY id LIMIT :n"
+            ), {"last": last_id, "n": self.batch_size}).all()
+            if not rows:
+                return migrated
+            last_id = rows[-1].id
+
+            vectors = embedder.get_embeddings([row.text for row in rows])
+            updates = [
+                {"id": row.id, "embedding": "[" + ",".join(str(float(x)) for x in vector) + "]"}
+                for row, vector in zip(rows, vectors) if vector
+            ]
+            if updates:
+                self.db.execute(text(
+                    f"UPDATE problem_statements SET {STAGING_COLUMN} = CAST(:embedding AS {self.target_type}) WHERE id = :id"
+                ), updates)
+            self.db.commit()
+            migrated += len(updates)
+            logger.info(f"Re-embedded {migrated} problems ({len(rows) - len(updates)} failed in this batch).")
+
+    def _swap(self, mode: str):
+        cast_centroid = f"CAST(centroid AS {self.target_type})" if mode == "convert" else "NULL"
+        for name in list(INDEX_NAMES.values()) + [CENTROID_INDEX]:
+            self.db.execute(text(f"DROP INDEX IF EXISTS {name}"))
+        self.db.execute(text("ALTER TABLE problem_statements DROP COLUMN embedding"))
+        self.db.execute(text(f"ALTER TABLE problem_statements RENAME COLUMN {STAGING_COLUMN} TO embedding"))
+        self.db.execute(text(
+            f"ALTER TABLE problem_clusters ALTER COLUMN centroid TYPE {self.target_type} USING {cast_centroid}"
+        ))
+        self.db.commit()
+
+        self.db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {CENTROID_INDEX} ON problem_clusters "
+            f"USING hnsw (centroid {EMBEDDING_OPS}) WITH (m = 16, ef_construction = 64)"
+        ))
+        self.db.commit()
+        VectorIndexManager(self.db).build_index()
+
+    def run(self, mode: str = "convert") -> int:
+        """
+        Migrates all rows and swaps the column in. Returns the number of rows migrated in this run.
+        Rows whose re-embedding failed keep the swap from happening; rerun to retry just those.
+        Rows with no text are skipped by "reembed" and end up without an embedding.
+        """
+        if self.db.get_bind().dialect.name != "postgresql":
+            raise RuntimeError("Embedding migration requires PostgreSQL with the pgvector extension.")
+        if mode not in ("convert", "reembed"):
+            raise ValueError(f"Unknown migration mode {mode!r}, expected 'convert' or 'reembed'.")
+
+        source_type = self._column_type("problem_statements", "embedding")
+        if mode == "convert" and source_type == self.target_type:
+            logger.info(f"problem_statements.embedding is already {source_type}, nothing to convert.")
+            return 0
+        if mode == "convert":
+            source_dim = source_type.split("(")[-1].rstrip(")") if source_type else None
+            if source_dim != str(int(settings.EMBEDDING_DIM)):
+                raise ValueError(
+                    f"Cannot convert {source_type} to {self.target_type}: the dimension changed, use 'reembed'."
+                )
+
+        logger.info(f"Migrating problem embeddings {source_type} -> {self.target_type} ({mode}).")
+        self._prepare_staging()
+        migrated = self._convert_batches() if mode == "convert" else self._reembed_batches()
+
+        missing = self.db.execute(text(
+            f"SELECT count(*) FROM problem_statements WHERE {STAGING_COLUMN} IS NULL AND embedding IS NOT NULL"
+            + (f" AND {HAS_TEXT}" if mode == "reembed" else "")
+        )).scalar()
+        if missing:
+            logger.error(f"{missing} rows were not migrated; rerun to retry them before the column is swapped.")
+            return migrated
+
+        self._swap(mode)
+        if mode == "reembed":
+            # Centroids were in the old embedding space
+            from logic.clustering import ClusterEngine
+            ClusterEngine(self.db).refresh_centroids()
+
+        logger.info(f"Embedding migration complete: {migrated} rows migrated to {self.target_type}.")
+        return migrated
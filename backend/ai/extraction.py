@@ -1,42 +1,134 @@
-from typing import Optional
+from typing import List, Optional, Union
 from ai.llm_provider import LLMProvider
+from config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are an expert product researcher finding startup opportunities."
+MAX_POST_CHARS = 2000 # Truncate for token limits
+
+# Returned in place of a problem when the LLM call failed (timeout, 5xx, outage), as opposed to None
+# for "no problem found", so callers can leave the post to be retried
+EXTRACTION_FAILED = object()
+
 class ProblemExtractor:
     def __init__(self):
         self.llm = LLMProvider()
 
-    def extract_problem(self, text: str) -> Optional[str]:
+    def extract_problem(self, text: str) -> Union[str, None, object]:
         """
-        Extracts a core problem statement from the text. Returns None if no clear problem is found.
+        Extracts a core problem statement from the text. Returns None if no clear problem is found
+        and EXTRACTION_FAILED if the LLM gave no answer.
         """
         prompt = (
             "Analyze the following Reddit post text and extract the core problem, frustration, or unmet need. "
             "Ignore broad complaints or memes. "
             "If a specific problem is found, return it as a concise single sentence starting with 'Problem: ...'. "
             "If no clear problem is found, return 'NO_PROBLEM'.\n\n"
-            f"Text: {text[:2000]}" # Truncate for token limits
+            f"Text: {text[:MAX_POST_CHARS]}"
         )
 
         try:
             result = self.llm.generate_text(
-                system_prompt="You are an expert product researcher finding startup opportunities.",
+                system_prompt=SYSTEM_PROMPT,
                 user_prompt=prompt,
                 max_tokens=100
             )
-            
             if not result:
-                return None
-                
-            if result.startswith("Problem:"):
-                return result.replace("Problem:", "").strip()
-            elif result == "NO_PROBLEM":
-                return None
-            else:
-                return result # Fallback
+                # LLMProvider logs and returns None when the call fails
+                return EXTRACTION_FAILED
+            return self._parse_result(result)
 
         except Exception as e:
             logger.error(f"Error extracting problem: {e}")
+            return EXTRACTION_FAILED
+
+    @staticmethod
+    def _parse_result(result: Optional[str]) -> Optional[str]:
+        if not result:
             return None
+
+        result = result.strip()
+        if result.startswith("Problem:"):
+            return result.replace("Problem:", "").strip()
+        elif result == "NO_PROBLEM":
+            return None
+        else:
+            return result # Fallback
+
+    def pack_batches(self, texts: List[str]) -> List[List[int]]:
+        """
+        Groups text indices into prompts of at most EXTRACTION_BATCH_MAX_POSTS posts
+        and EXTRACTION_BATCH_MAX_TOKENS estimated tokens.
+        """
+        batches = []
+        current, current_tokens = [], 0
+        for i, text in enumerate(texts):
+            tokens = len(text[:MAX_POST_CHARS]) // 4 + 10 # ~4 chars per token plus the post header
+            if current and (
+                len(current) >= settings.EXTRACTION_BATCH_MAX_POSTS
+                or current_tokens + tokens > settings.EXTRACTION_BATCH_MAX_TOKENS
+            ):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(i)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+
+    def extract_batch(self, texts: List[str]) -> List[Union[str, None, object]]:
+        """
+        Extracts problems for several posts with a single generate_json call.
+        Posts missing from the response, or with a malformed entry, fall back to extract_problem,
+        so a failed call yields EXTRACTION_FAILED for the posts it could not answer.
+        """
+        if len(texts) == 1:
+            return [self.extract_problem(texts[0])]
+
+        posts_block = "\n\n".join(
+            f"### Post {i + 1}\n{text[:MAX_POST_CHARS]}" for i, text in enumerate(texts)
+        )
+        prompt = (
+            "Analyze each of the following Reddit posts and extract its core problem, frustration, or unmet need. "
+            "Ignore broad complaints or memes. "
+            "Return a JSON object with a key 'results' mapping each post number (as a string) to either "
+            "a concise single sentence starting with 'Problem: ...' or 'NO_PROBLEM' if no clear problem is found.\n\n"
+            f"{posts_block}"
+        )
+
+        results: List[Union[str, None, object]] = [None] * len(texts)
+        fallback = list(range(len(texts)))
+        try:
+            data = self.llm.generate_json(system_prompt=SYSTEM_PROMPT, user_prompt=prompt)
+            entries = data.get("results", data) if isinstance(data, dict) else None
+
+            if isinstance(entries, dict):
+                fallback = []
+                for i in range(len(texts)):
+                    value = entries.get(str(i + 1))
+                    if isinstance(value, str) and value.strip():
+                        results[i] = self._parse_result(value)
+                    else:
+                        fallback.append(i)
+
+        except Exception as e:
+            logger.error(f"Error extracting problem batch: {e}")
+
+        if fallback:
+            logger.info(f"Batched extraction fell back to single-post calls for {len(fallback)}/{len(texts)} posts.")
+            for i in fallback:
+                results[i] = self.extract_problem(texts[i])
+
+        return results
+
+    def extract_problems(self, texts: List[str]) -> List[Union[str, None, object]]:
+        """
+        Extracts problems for many posts, batching them into as few LLM calls as the token budget allows.
+        """
+        results: List[Union[str, None, object]] = [None] * len(texts)
+        for batch in self.pack_batches(texts):
+            for i, problem in zip(batch, self.extract_batch([texts[i] for i in batch])):
+                results[i] = problem
+        return results
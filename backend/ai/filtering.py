@@ -1,41 +1,97 @@
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Pattern
 import logging
+import re
 
 logger = logging.getLogger(__name__)
 
-class NoiseFilter:
-    def __init__(self):
-        self.min_length = 50
-        self.meme_flairs = ["Meme", "Comedy", "Satire", "Funny", "Shitpost"]
-        self.ignore_keywords = ["promotion", "promo", "discount", "code", "referral"]
+DEFAULT_MIN_LENGTH = 50
+DEFAULT_MEME_FLAIRS = ["Meme", "Comedy", "Satire", "Funny", "Shitpost"]
+DEFAULT_IGNORE_KEYWORDS = ["promotion", "promo", "discount", "code", "referral"]
 
-    def is_noise(self, post: Dict[str, Any]) -> bool:
-        """
-        Returns True if the post is considered noise.
-        """
-        text = post.get("text", "") or ""
-        title = post.get("title", "") or ""
-        flair = post.get("link_flair_text", "")
-        
+def compile_terms(terms: List[str]) -> Optional[Pattern]:
+    """
+    Compiles terms into one case-insensitive alternation with word-boundary semantics,
+    so "code" matches "promo code" but not "decode"/"encode". Plural and past-tense forms
+    ("memes", "discounts", "discounted") still match, as they did with substring checks.
+    """
+    if not terms:
+        return None
+    # Longest first so overlapping terms prefer the longer match
+    alternation = "|".join(re.escape(t) for t in sorted(set(terms), key=len, reverse=True))
+    return re.compile(rf"\b(?:{alternation})(?:s|es|ed)?\b", re.IGNORECASE)
+
+class FilterRules:
+    """
+    A compiled rule set: minimum text length, meme flairs and spam keywords.
+    """
+    def __init__(
+        self,
+        min_length: int = DEFAULT_MIN_LENGTH,
+        meme_flairs: List[str] = DEFAULT_MEME_FLAIRS,
+        ignore_keywords: List[str] = DEFAULT_IGNORE_KEYWORDS
+    ):
+        self.min_length = min_length
+        self.meme_flairs = list(meme_flairs)
+        self.ignore_keywords = list(ignore_keywords)
+        self.flair_re = compile_terms(self.meme_flairs)
+        self.keyword_re = compile_terms(self.ignore_keywords)
+
+    def is_noise(self, title: str, text: str, flair: Optional[str]) -> bool:
         # 1. Length Check
         if len(text) < self.min_length:
             return True
-            
+
         # 2. Flair Check
-        if flair and any(f.lower() in str(flair).lower() for f in self.meme_flairs):
+        if flair and self.flair_re is not None and self.flair_re.search(flair):
             return True
-            
-        # 3. Keyword Check (Simple spam detection)
-        content = (title + " " + text).lower()
-        if any(kw in content for kw in self.ignore_keywords):
+
+        # 3. Keyword Check (Simple spam detection), searched in place instead of building title + text
+        if self.keyword_re is not None and (self.keyword_re.search(title) or self.keyword_re.search(text)):
             return True
 
         return False
 
+# Per-subreddit overrides. Developer subs talk about "code" constantly, so it is not a spam signal there.
+SUBREDDIT_RULES: Dict[str, FilterRules] = {
+    "webdev": FilterRules(ignore_keywords=[kw for kw in DEFAULT_IGNORE_KEYWORDS if kw != "code"]),
+}
+
+class NoiseFilter:
+    def __init__(self, rules: Optional[FilterRules] = None, subreddit_rules: Optional[Dict[str, FilterRules]] = None):
+        self.rules = rules or FilterRules()
+        rule_sets = SUBREDDIT_RULES if subreddit_rules is None else subreddit_rules
+        self.subreddit_rules = {name.lower(): r for name, r in rule_sets.items()}
+
+    def rules_for(self, subreddit: Optional[str]) -> FilterRules:
+        if subreddit and self.subreddit_rules:
+            return self.subreddit_rules.get(subreddit.lower(), self.rules)
+        return self.rules
+
+    def is_noise(self, post: Dict[str, Any]) -> bool:
+        """
+        Returns True if the post is considered noise.
+        """
+        rules = self.rules_for(post.get("subreddit"))
+        return rules.is_noise(post.get("title") or "", post.get("text") or "", post.get("link_flair_text"))
+
+    def noise_mask(self, posts: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Batch is_noise: one bool per post, with rule sets resolved once per subreddit.
+        """
+        rules_cache: Dict[Optional[str], FilterRules] = {}
+        mask = []
+        for post in posts:
+            subreddit = post.get("subreddit")
+            rules = rules_cache.get(subreddit)
+            if rules is None:
+                rules = rules_cache[subreddit] = self.rules_for(subreddit)
+            mask.append(rules.is_noise(post.get("title") or "", post.get("text") or "", post.get("link_flair_text")))
+        return mask
+
     def filter_posts(self, posts: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
         Filters a list of posts.
         """
-        filtered = [p for p in posts if not self.is_noise(p)]
+        filtered = [p for p, noise in zip(posts, self.noise_mask(posts)) if not noise]
         logger.info(f"Filtered {len(posts)} posts down to {len(filtered)} potential signals.")
         return filtered
@@ -0,0 +1,163 @@
+from array import array
+from typing import Any, Dict, Optional
+from config import settings
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class SQLiteCacheBackend:
+    """
+    Local on-disk cache. Entries expire after `ttl_seconds`; once the table grows past
+    `max_entries` the least recently used rows are evicted.
+    """
+    EVICT_EVERY = 500 # Writes between eviction passes
+
+    def __init__(self, path: str, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_cache_accessed_at ON llm_cache (accessed_at)")
+
+    def get(self, key: str) -> Optional[bytes]:
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute("SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > self.ttl_seconds:
+                self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                return None
+            self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key: str, value: bytes):
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self.writes += 1
+            if self.writes % self.EVICT_EVERY == 0:
+                self._evict(now)
+
+    def _evict(self, now: float):
+        self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl_seconds,))
+        self.conn.execute(
+            "DELETE FROM llm_cache WHERE key IN ("
+            "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+
+class RedisCacheBackend:
+    """
+    Shared cache on REDIS_URL. TTL is set per key; size-based eviction is left to the
+    server's maxmemory-policy (allkeys-lru recommended).
+    """
+    PREFIX = "llm_cache:"
+
+    def __init__(self, url: str, ttl_seconds: int):
+        import redis # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.client.get(self.PREFIX + key)
+
+    def set(self, key: str, value: bytes):
+        self.client.set(self.PREFIX + key, value, ex=self.ttl_seconds)
+
+class LLMCache:
+    """
+    Content-addressed cache for LLM results. Keys hash (kind, backend, model, prompt, params),
+    so any change to the prompt or model is a miss. Backend errors are logged and treated as misses.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(kind: str, backend: str, model: str, **params: Any) -> str:
+        payload = json.dumps({"kind": kind, "backend": backend, "model": model, **params}, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str, kind: str) -> Optional[Any]:
+        try:
+            raw = self.backend.get(key)
+        except Exception as e:
+            logger.error(f"LLM cache read Error: {e}")
+            raw = None
+
+        with self.lock:
+            if raw is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return self._decode(raw, kind)
+
+    def set(self, key: str, kind: str, value: Any):
+        try:
+            self.backend.set(key, self._encode(value, kind))
+        except Exception as e:
+            logger.error(f"LLM cache write Error: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        total = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / total if total else 0.0}
+
+    @staticmethod
+    def _encode(value: Any, kind: str) -> bytes:
+        # Embeddings as packed float32 (pgvector stores float32 anyway), ~4x smaller than JSON
+        if kind == "embedding":
+            return array("f", value).tobytes()
+        return json.dumps(value).encode("utf-8")
+
+    @staticmethod
+    def _decode(raw: bytes, kind: str) -> Any:
+        if kind == "embedding":
+            vector = array("f")
+            vector.frombytes(raw)
+            return vector.tolist()
+        return json.loads(raw)
+
+_cache: Optional[LLMCache] = None
+_cache_failed = False
+_cache_lock = threading.Lock()
+
+def get_llm_cache() -> Optional[LLMCache]:
+    """
+    Process-wide cache shared by every LLMProvider, or None when LLM_CACHE_BACKEND is "none".
+    """
+    global _cache, _cache_failed
+    if settings.LLM_CACHE_BACKEND == "none" or _cache_failed:
+        return None
+
+    with _cache_lock:
+        if _cache is None:
+            try:
+                if settings.LLM_CACHE_BACKEND == "redis":
+                    backend = RedisCacheBackend(settings.REDIS_URL, settings.LLM_CACHE_TTL_SECONDS)
+                else:
+                    backend = SQLiteCacheBackend(
+                        settings.LLM_CACHE_PATH, settings.LLM_CACHE_TTL_SECONDS, settings.LLM_CACHE_MAX_ENTRIES
+                    )
+            except Exception as e:
+                logger.error(f"Could not open LLM cache ({settings.LLM_CACHE_BACKEND}), running uncached: {e}")
+                _cache_failed = True
+                return None
+            _cache = LLMCache(backend)
+        return _cache
@@ -1,12 +1,61 @@
-from typing import Optional, Any
+from typing import Optional, Any, List, Dict, Tuple
+from concurrent.futures import ThreadPoolExecutor
 from config import settings
-from openai import OpenAI
+from ai.llm_cache import get_llm_cache
+from openai import OpenAI, AsyncOpenAI
+import openai
 import ollama
+import httpx
+import asyncio
+import random
+import threading
+import weakref
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+def pack_embedding_batches(texts: List[str], max_items: int) -> List[List[int]]:
+    """
+    Groups text indices into batches of at most `max_items` inputs and EMBEDDING_BATCH_MAX_TOKENS estimated tokens.
+    Empty texts are left out (the APIs reject them), so their result stays [].
+    """
+    batches = []
+    current, current_tokens = [], 0
+    for i, text in enumerate(texts):
+        if not text:
+            continue
+
+        tokens = len(text) // 4 + 1 # Rough estimate, ~4 chars per token
+        if current and (len(current) >= max_items or current_tokens + tokens > settings.EMBEDDING_BATCH_MAX_TOKENS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def embedding_model_for(backend: str) -> str:
+    if settings.EMBEDDING_MODEL:
+        return settings.EMBEDDING_MODEL
+    return "text-embedding-3-small" if backend == "openai" else "nomic-embed-text"
+
+def embedding_request_params(model: str) -> Dict[str, Any]:
+    # text-embedding-3-* can shorten their output to any size; other models return their native size
+    if model.startswith("text-embedding-3"):
+        return {"dimensions": settings.EMBEDDING_DIM}
+    return {}
+
+def check_dimension(vector: List[float], model: str) -> List[float]:
+    """
+    Vectors that don't match the EMBEDDING_DIM column would fail on insert, so they count as failed items.
+    """
+    if vector and len(vector) != settings.EMBEDDING_DIM:
+        logger.error(f"{model} returned {len(vector)}-dim embeddings but EMBEDDING_DIM={settings.EMBEDDING_DIM}")
+        return []
+    return vector
+
 class LLMProvider:
     def __init__(self):
         self.backend = settings.LLM_BACKEND
@@ -17,8 +66,35 @@ class LLMProvider:
             self.model = settings.OLLAMA_MODEL
             # Ollama client is stateless/http, no init needed usually but good to check connection
             pass
+        self.embedding_model = embedding_model_for(self.backend) # Best practice for local: nomic-embed-text
+        self.cache = get_llm_cache()
+
+    def _cached(self, kind: str, model: str, compute, **params: Any) -> Any:
+        """
+        Returns the cached result for (kind, backend, model, params) or computes and stores it.
+        Failed calls (None / []) are not cached.
+        """
+        if self.cache is None:
+            return compute()
+
+        key = self.cache.make_key(kind, self.backend, model, **params)
+        cached = self.cache.get(key, kind)
+        if cached is not None:
+            return cached
+
+        result = compute()
+        if result:
+            self.cache.set(key, kind, result)
+        return result
 
     def generate_text(self, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> Optional[str]:
+        return self._cached(
+            "text", self.model,
+            lambda: self._generate_text(system_prompt, user_prompt, max_tokens),
+            system_prompt=system_prompt, user_prompt=user_prompt, max_tokens=max_tokens
+        )
+
+    def _generate_text(self, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> Optional[str]:
         try:
             if self.backend == "openai":
                 response = self.client.chat.completions.create(
@@ -46,6 +122,13 @@ class LLMProvider:
             return None
 
     def generate_json(self, system_prompt: str, user_prompt: str) -> Optional[Any]:
+        return self._cached(
+            "json", self.model,
+            lambda: self._generate_json(system_prompt, user_prompt),
+            system_prompt=system_prompt, user_prompt=user_prompt
+        )
+
+    def _generate_json(self, system_prompt: str, user_prompt: str) -> Optional[Any]:
         """
         Tries to force JSON output. 
         Note: Local models like Phi3/Gemma2 might need stricter prompting for JSON.
@@ -80,24 +163,310 @@ class LLMProvider:
             return None
             
     def get_embedding(self, text: str) -> list[float]:
+        return self._cached(
+            "embedding", self.embedding_model, lambda: self._get_embedding(text), text=text, dim=settings.EMBEDDING_DIM
+        )
+
+    def _get_embedding(self, text: str) -> list[float]:
         try:
             if self.backend == "openai":
                 text = text.replace("\n", " ")
                 response = self.client.embeddings.create(
                     input=[text],
-                    model="text-embedding-3-small"
+                    model=self.embedding_model,
+                    **embedding_request_params(self.embedding_model)
                 )
-                return response.data[0].embedding
+                return check_dimension(response.data[0].embedding, self.embedding_model)
             
             elif self.backend == "ollama":
                 # Using nomic-embed-text or similar usually, but let's assume the user has an embedding model
                 # or we use the main model (Gemma/Phi aren't great for embedding, better to use 'nomic-embed-text')
                 # For simplicity, we'll try to use the configured model, but usually you want a specific embed model.
                 # Let's fallback to 'nomic-embed-text' if not specified, or just use the model.
-                embed_model = "nomic-embed-text" # Best practice practice for local
-                response = ollama.embeddings(model=embed_model, prompt=text)
-                return response['embedding']
+                response = ollama.embeddings(model=self.embedding_model, prompt=text)
+                return check_dimension(response['embedding'], self.embedding_model)
 
         except Exception as e:
             logger.error(f"Embedding Error ({self.backend}): {e}")
             return []
+
+    def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embeds many texts, returning vectors in input order.
+        Inputs are packed into batches bounded by EMBEDDING_BATCH_MAX_ITEMS/EMBEDDING_BATCH_MAX_TOKENS
+        and sent EMBEDDING_CONCURRENCY at a time. A failed batch is retried item by item,
+        so only the items that really fail come back as [].
+        """
+        results: List[List[float]] = [[] for _ in texts]
+
+        # Only texts missing from the cache go to the backend
+        keys = [None] * len(texts)
+        pending = list(range(len(texts)))
+        if self.cache is not None:
+            pending = []
+            for i, text in enumerate(texts):
+                keys[i] = self.cache.make_key(
+                    "embedding", self.backend, self.embedding_model, text=text, dim=settings.EMBEDDING_DIM
+                )
+                cached = self.cache.get(keys[i], "embedding")
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    pending.append(i)
+
+        # Ollama's embeddings endpoint takes a single prompt, so there concurrency does all the work
+        max_items = 1 if self.backend == "ollama" else settings.EMBEDDING_BATCH_MAX_ITEMS
+        batches = [[pending[j] for j in batch] for batch in pack_embedding_batches([texts[i] for i in pending], max_items)]
+
+        def run_batch(indices: List[int]):
+            try:
+                vectors = self._embed_batch([texts[i] for i in indices])
+                for i, vector in zip(indices, vectors):
+                    results[i] = check_dimension(vector, self.embedding_model)
+            except Exception as e:
+                logger.error(f"Embedding batch Error ({self.backend}, {len(indices)} items): {e}")
+                if len(indices) > 1:
+                    for i in indices:
+                        results[i] = self._get_embedding(texts[i])
+
+        with ThreadPoolExecutor(max_workers=settings.EMBEDDING_CONCURRENCY) as executor:
+            list(executor.map(run_batch, batches))
+
+        if self.cache is not None:
+            for i in pending:
+                if results[i]:
+                    self.cache.set(keys[i], "embedding", results[i])
+
+        return results
+
+    def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.backend == "openai":
+            response = self.client.embeddings.create(
+                input=[t.replace("\n", " ") for t in texts],
+                model=self.embedding_model,
+                **embedding_request_params(self.embedding_model)
+            )
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+        return [ollama.embeddings(model=self.embedding_model, prompt=t)['embedding'] for t in texts]
+
+class AsyncLLMProvider:
+    """
+    Async counterpart of LLMProvider for the pipeline and FastAPI handlers.
+    Calls go through one pooled HTTP client and are bounded by one semaphore (LLM_MAX_CONCURRENCY) per
+    backend per event loop, shared by every instance on that loop; they time out after LLM_TIMEOUT_SECONDS
+    and are retried with jittered exponential backoff. Results go through the same LLMCache as the sync provider.
+
+    Pass `http_client` to use your own client instead of the shared one; the provider never closes it.
+    Whoever runs the event loop closes the shared clients with aclose_shared() before it ends.
+    """
+    # event loop -> backend -> (semaphore, HTTP client); entries go away with their loop
+    _shared: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, Tuple[asyncio.Semaphore, httpx.AsyncClient]]]" = (
+        weakref.WeakKeyDictionary()
+    )
+    _shared_lock = threading.Lock()
+
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None):
+        self.backend = settings.LLM_BACKEND
+        self.http_client = http_client
+        self.model = settings.OPENAI_MODEL if self.backend == "openai" else settings.OLLAMA_MODEL
+        self.embedding_model = embedding_model_for(self.backend)
+        self.cache = get_llm_cache()
+        self._openai: Optional[Tuple[httpx.AsyncClient, AsyncOpenAI]] = None
+
+    def _resources(self) -> Tuple[asyncio.Semaphore, httpx.AsyncClient]:
+        loop = asyncio.get_running_loop()
+        with self._shared_lock:
+            backends = self._shared.setdefault(loop, {})
+            if self.backend not in backends:
+                limits = httpx.Limits(
+                    max_connections=settings.LLM_POOL_MAX_CONNECTIONS,
+                    max_keepalive_connections=settings.LLM_POOL_MAX_CONNECTIONS
+                )
+                backends[self.backend] = (
+                    asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY),
+                    httpx.AsyncClient(limits=limits, timeout=settings.LLM_TIMEOUT_SECONDS)
+                )
+            semaphore, shared_client = backends[self.backend]
+        return semaphore, self.http_client or shared_client
+
+    @classmethod
+    async def aclose_shared(cls):
+        """
+        Closes the HTTP clients shared on the running event loop; later calls on the loop open new ones.
+        """
+        with cls._shared_lock:
+            backends = cls._shared.pop(asyncio.get_running_loop(), {})
+        for _, client in backends.values():
+            await client.aclose()
+
+    def _openai_client(self, http_client: httpx.AsyncClient) -> AsyncOpenAI:
+        if self._openai is None or self._openai[0] is not http_client:
+            # Retries are handled here, with jitter, rather than by the SDK
+            self._openai = (http_client, AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client, max_retries=0))
+        return self._openai[1]
+
+    async def _ollama(self, http_client: httpx.AsyncClient, path: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Ollama's REST API directly: its SDK client cannot share an HTTP client
+        response = await http_client.post(f"{settings.OLLAMA_BASE_URL.rstrip('/')}{path}", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    @staticmethod
+    def _is_retryable(e: Exception) -> bool:
+        if isinstance(e, (asyncio.TimeoutError, httpx.TransportError)):
+            return True
+        if isinstance(e, (openai.APIConnectionError, openai.RateLimitError, openai.InternalServerError)):
+            return True
+        if isinstance(e, httpx.HTTPStatusError):
+            return e.response.status_code == 429 or e.response.status_code >= 500
+        return False
+
+    async def _call(self, make_request):
+        """
+        Runs `make_request(http_client)` (a coroutine factory) under the semaphore with timeout and retries.
+        """
+        semaphore, http_client = self._resources()
+        for attempt in range(settings.LLM_MAX_RETRIES + 1):
+            try:
+                async with semaphore:
+                    return await asyncio.wait_for(make_request(http_client), timeout=settings.LLM_TIMEOUT_SECONDS)
+            except Exception as e:
+                if attempt == settings.LLM_MAX_RETRIES or not self._is_retryable(e):
+                    raise
+                delay = min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"LLM call failed ({self.backend}): {e!r}. Retry {attempt + 1} in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+    async def _cached(self, kind: str, model: str, compute, **params: Any) -> Any:
+        if self.cache is None:
+            return await compute()
+
+        key = self.cache.make_key(kind, self.backend, model, **params)
+        cached = self.cache.get(key, kind)
+        if cached is not None:
+            return cached
+
+        result = await compute()
+        if result:
+            self.cache.set(key, kind, result)
+        return result
+
+    async def generate_text(self, system_prompt: str, user_prompt: str, max_tokens: int = 500) -> Optional[str]:
+        return await self._cached(
+            "text", self.model,
+            lambda: self._generate_text(system_prompt, user_prompt, max_tokens),
+            system_prompt=system_prompt, user_prompt=user_prompt, max_tokens=max_tokens
+        )
+
+    async def _generate_text(self, system_prompt: str, user_prompt: str, max_tokens: int) -> Optional[str]:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        try:
+            if self.backend == "openai":
+                response = await self._call(lambda client: self._openai_client(client).chat.completions.create(
+                    model=self.model, messages=messages, max_tokens=max_tokens, temperature=0.0
+                ))
+                return response.choices[0].message.content.strip()
+
+            response = await self._call(lambda client: self._ollama(
+                client, "/api/chat", {"model": self.model, "messages": messages, "stream": False}
+            ))
+            return response['message']['content'].strip()
+
+        except Exception as e:
+            logger.error(f"LLM Generation Error ({self.backend}): {e}")
+            return None
+
+    async def generate_json(self, system_prompt: str, user_prompt: str) -> Optional[Any]:
+        return await self._cached(
+            "json", self.model,
+            lambda: self._generate_json(system_prompt, user_prompt),
+            system_prompt=system_prompt, user_prompt=user_prompt
+        )
+
+    async def _generate_json(self, system_prompt: str, user_prompt: str) -> Optional[Any]:
+        messages = [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_prompt}
+        ]
+        try:
+            if self.backend == "openai":
+                response = await self._call(lambda client: self._openai_client(client).chat.completions.create(
+                    model=self.model, messages=messages, response_format={"type": "json_object"}
+                ))
+                return json.loads(response.choices[0].message.content)
+
+            response = await self._call(lambda client: self._ollama(
+                client, "/api/chat", {"model": self.model, "messages": messages, "format": "json", "stream": False}
+            ))
+            return json.loads(response['message']['content'])
+
+        except Exception as e:
+            logger.error(f"LLM JSON Error ({self.backend}): {e}")
+            return None
+
+    async def get_embedding(self, text: str) -> List[float]:
+        vectors = await self.get_embeddings([text])
+        return vectors[0]
+
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Async get_embeddings: same batching, ordering, caching and per-item failure isolation as LLMProvider.
+        """
+        results: List[List[float]] = [[] for _ in texts]
+
+        keys = [None] * len(texts)
+        pending = list(range(len(texts)))
+        if self.cache is not None:
+            pending = []
+            for i, text in enumerate(texts):
+                keys[i] = self.cache.make_key(
+                    "embedding", self.backend, self.embedding_model, text=text, dim=settings.EMBEDDING_DIM
+                )
+                cached = self.cache.get(keys[i], "embedding")
+                if cached is not None:
+                    results[i] = cached
+                else:
+                    pending.append(i)
+
+        max_items = 1 if self.backend == "ollama" else settings.EMBEDDING_BATCH_MAX_ITEMS
+        batches = [[pending[j] for j in batch] for batch in pack_embedding_batches([texts[i] for i in pending], max_items)]
+
+        async def run_batch(indices: List[int]):
+            try:
+                vectors = await self._embed_batch([texts[i] for i in indices])
+                for i, vector in zip(indices, vectors):
+                    results[i] = check_dimension(vector, self.embedding_model)
+            except Exception as e:
+                logger.error(f"Embedding batch Error ({self.backend}, {len(indices)} items): {e}")
+                if len(indices) > 1:
+                    await asyncio.gather(*(run_batch([i]) for i in indices))
+
+        await asyncio.gather(*(run_batch(batch) for batch in batches))
+
+        if self.cache is not None:
+            for i in pending:
+                if results[i]:
+                    self.cache.set(keys[i], "embedding", results[i])
+
+        return results
+
+    async def _embed_batch(self, texts: List[str]) -> List[List[float]]:
+        if self.backend == "openai":
+            response = await self._call(lambda client: self._openai_client(client).embeddings.create(
+                input=[t.replace("\n", " ") for t in texts],
+                model=self.embedding_model,
+                **embedding_request_params(self.embedding_model)
+            ))
+            return [d.embedding for d in sorted(response.data, key=lambda d: d.index)]
+
+        vectors = []
+        for text in texts:
+            response = await self._call(lambda client: self._ollama(
+                client, "/api/embeddings", {"model": self.embedding_model, "prompt": text}
+            ))
+            vectors.append(response['embedding'])
+        return vectors
@@ -0,0 +1,148 @@
+import numpy as np
+from sklearn.feature_extraction.text import HashingVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from models import Post, Subreddit, DuplicateLink
+from ai.filtering import NoiseFilter
+from config import settings
+from typing import Any, Dict, List, Optional
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+MODEL_FORMAT_VERSION = 1
+
+def post_text(post: Dict[str, Any]) -> str:
+    return f"{post.get('title') or ''}\n\n{post.get('text') or ''}"
+
+class PreClassifier:
+    """
+    Cheap CPU gate in front of LLM extraction: hashed word 1-2 gram features + logistic regression.
+    The hashing trick keeps the vectorizer stateless, so the model file is just the weight vector
+    (an .npz with coef, intercept, n_features, ngram_max, version).
+    """
+    def __init__(self, coef: np.ndarray, intercept: float, n_features: int, ngram_max: int = 2):
+        self.coef = coef.astype(np.float32)
+        self.intercept = float(intercept)
+        self.vectorizer = make_vectorizer(n_features, ngram_max)
+
+    @classmethod
+    def load(cls, path: str) -> "PreClassifier":
+        data = np.load(path)
+        if int(data["version"]) != MODEL_FORMAT_VERSION:
+            raise ValueError(f"Unsupported pre-classifier model version {int(data['version'])} in {path}")
+        return cls(data["coef"], float(data["intercept"]), int(data["n_features"]), int(data["ngram_max"]))
+
+    def save(self, path: str):
+        np.savez_compressed(
+            path,
+            version=MODEL_FORMAT_VERSION,
+            coef=self.coef,
+            intercept=self.intercept,
+            n_features=self.vectorizer.n_features,
+            ngram_max=self.vectorizer.ngram_range[1]
+        )
+
+    def score(self, texts: List[str]) -> np.ndarray:
+        """
+        Probability that each text contains an extractable problem.
+        """
+        if not texts:
+            return np.zeros(0, dtype=np.float32)
+        logits = self.vectorizer.transform(texts) @ self.coef + self.intercept
+        return 1.0 / (1.0 + np.exp(-logits))
+
+def make_vectorizer(n_features: int, ngram_max: int) -> HashingVectorizer:
+    return HashingVectorizer(
+        n_features=n_features,
+        ngram_range=(1, ngram_max),
+        alternate_sign=False,
+        norm="l2",
+        lowercase=True
+    )
+
+_model: Optional[PreClassifier] = None
+_model_lock = threading.Lock()
+
+def get_preclassifier() -> Optional[PreClassifier]:
+    """
+    Loads the model at PRECLASSIFIER_PATH once per process. None when the gate is disabled or no model exists.
+    """
+    global _model
+    if not settings.PRECLASSIFIER_PATH:
+        return None
+
+    with _model_lock:
+        if _model is None:
+            if not os.path.exists(settings.PRECLASSIFIER_PATH):
+                logger.warning(f"Pre-classifier model {settings.PRECLASSIFIER_PATH} not found, gate disabled.")
+                return None
+            _model = PreClassifier.load(settings.PRECLASSIFIER_PATH)
+            logger.info(f"Loaded pre-classifier from {settings.PRECLASSIFIER_PATH}")
+        return _model
+
+def load_training_data(db: Session):
+    """
+    Labels are Post.has_problem on processed posts that actually reached the LLM:
+    posts dropped by the noise filter, by an earlier pre-classifier or as MinHash duplicates carry no LLM verdict.
+    """
+    noise_filter = NoiseFilter()
+    texts, labels = [], []
+    rows = db.execute(
+        select(Post.title, Post.text, Post.has_problem, Subreddit.name.label("subreddit"))
+        .outerjoin(Subreddit, Post.subreddit_id == Subreddit.id)
+        .where(
+            Post.is_processed == True,
+            Post.classifier_skipped.isnot(True),
+            Post.id.notin_(select(DuplicateLink.duplicate_post_id).where(DuplicateLink.kind == "post"))
+        )
+        .execution_options(yield_per=1000)
+    )
+    for row in rows:
+        post = dict(row._mapping)
+        if noise_filter.is_noise(post):
+            continue
+        texts.append(post_text(post))
+        labels.append(1 if row.has_problem else 0)
+    return texts, np.array(labels)
+
+def train_preclassifier(db: Session, path: Optional[str] = None, test_size: float = 0.2) -> Dict[str, Any]:
+    """
+    Trains on historical LLM verdicts, prints precision/recall and LLM calls saved per threshold
+    on a held-out split, then saves the model.
+    """
+    path = path or settings.PRECLASSIFIER_PATH or "preclassifier.npz"
+    texts, labels = load_training_data(db)
+    if len(texts) < 50 or labels.min() == labels.max():
+        raise ValueError(f"Need at least 50 labelled posts with both classes, found {len(texts)}.")
+
+    vectorizer = make_vectorizer(settings.PRECLASSIFIER_N_FEATURES, 2)
+    X = vectorizer.transform(texts)
+    X_train, X_test, y_train, y_test = train_test_split(X, labels, test_size=test_size, stratify=labels, random_state=42)
+
+    clf = LogisticRegression(class_weight="balanced", max_iter=1000)
+    clf.fit(X_train, y_train)
+
+    model = PreClassifier(clf.coef_[0], clf.intercept_[0], settings.PRECLASSIFIER_N_FEATURES, 2)
+    probs = 1.0 / (1.0 + np.exp(-(X_test @ model.coef + model.intercept)))
+
+    print(f"Trained on {len(y_train)} posts, evaluated on {len(y_test)} ({int(y_test.sum())} with problems).")
+    print(f"{'threshold':>9}  {'precision':>9}  {'recall':>7}  {'llm calls saved':>15}")
+    report = {}
+    for threshold in sorted({0.1, 0.2, 0.3, 0.4, 0.5, settings.PRECLASSIFIER_THRESHOLD}):
+        forwarded = probs >= threshold
+        tp = int((forwarded & (y_test == 1)).sum())
+        precision = tp / forwarded.sum() if forwarded.sum() else 0.0
+        recall = tp / y_test.sum()
+        saved = 1.0 - forwarded.mean()
+        report[threshold] = {"precision": precision, "recall": recall, "llm_calls_saved": saved}
+        marker = "  <- PRECLASSIFIER_THRESHOLD" if threshold == settings.PRECLASSIFIER_THRESHOLD else ""
+        print(f"{threshold:>9.2f}  {precision:>9.3f}  {recall:>7.3f}  {saved:>14.1%}{marker}")
+
+    model.save(path)
+    print(f"Saved pre-classifier to {path}")
+    return report
@@ -0,0 +1,200 @@
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import Session
+from sqlalchemy import select, update, and_, or_
+from models import Post, Subreddit
+from ai.filtering import NoiseFilter
+from ai.extraction import EXTRACTION_FAILED, ProblemExtractor
+from ai.embedding import EmbeddingService
+from ai.vector_store import VectorStore
+from ai.preclassifier import get_preclassifier, post_text
+from config import settings
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _claimable(now: datetime):
+    stale = now - timedelta(seconds=settings.JOB_PROCESS_CLAIM_SECONDS)
+    return and_(Post.is_processed == False, or_(Post.process_claim == None, Post.process_claimed_at < stale))
+
+def unprocessed_ranges(db: Session, size: int) -> List[Tuple[str, str]]:
+    """
+    Splits the unprocessed, unclaimed posts into (after, until] id ranges of about `size` posts each.
+    Only ids are read, streamed.
+    """
+    ranges, after, count, last_id = [], "", 0, None
+    result = db.execute(
+        select(Post.id).where(_claimable(datetime.now(timezone.utc))).order_by(Post.id)
+        .execution_options(yield_per=10000)
+    )
+    for last_id in result.scalars():
+        count += 1
+        if count == size:
+            ranges.append((after, last_id))
+            after, count = last_id, 0
+    if count:
+        ranges.append((after, last_id))
+    return ranges
+
+def claim_unprocessed(db: Session, size: int, batch: str) -> List[str]:
+    """
+    Claims the unprocessed, unclaimed posts for extraction jobs, about `size` posts per claim
+    ("<batch>:<part>"), for PostProcessor.run(claim) on several workers at once. Each claim is a
+    conditional UPDATE, so a post taken by a concurrent split stays with it; that part may end up empty.
+    """
+    now = datetime.now(timezone.utc)
+    claims = []
+    for part, (after, until) in enumerate(unprocessed_ranges(db, size)):
+        claim = f"{batch}:{part}"
+        db.execute(
+            update(Post)
+            .where(Post.id > after, Post.id <= until, _claimable(now))
+            .values(process_claim=claim, process_claimed_at=now)
+            .execution_options(synchronize_session=False)
+        )
+        claims.append(claim)
+    db.commit()
+    return claims
+
+def release_claim(db: Session, claim: str):
+    """
+    Frees the posts of a finished extraction job; those left unprocessed (failed extraction) go to the next split.
+    """
+    db.execute(
+        update(Post).where(Post.process_claim == claim)
+        .values(process_claim=None, process_claimed_at=None)
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+class PostProcessor:
+    """
+    Drains unprocessed posts through NoiseFilter -> PreClassifier (optional) -> ProblemExtractor -> EmbeddingService.
+    Posts are read in keyset-paginated chunks and each chunk is committed as one transaction
+    (problem rows + is_processed/has_problem flags), so memory stays flat and a crashed run
+    simply resumes from the posts that are still unprocessed.
+    """
+    def __init__(self, db: Session, chunk_size: Optional[int] = None, concurrency: Optional[int] = None):
+        self.db = db
+        self.chunk_size = chunk_size or settings.PROCESSING_CHUNK_SIZE
+        self.concurrency = concurrency or settings.PROCESSING_CONCURRENCY
+        self.noise_filter = NoiseFilter()
+        self.preclassifier = get_preclassifier()
+        self.extractor = ProblemExtractor()
+        self.embedder = EmbeddingService()
+        self.store = VectorStore(db)
+
+    def iter_unprocessed(self, claim: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yields chunks of unprocessed posts as plain dicts, paging on the primary key.
+        `claim` restricts it to the posts claimed by claim_unprocessed, so claims can be processed in parallel.
+        """
+        last_id = ""
+        while True:
+            stmt = (
+                select(Post.id, Post.title, Post.text, Subreddit.name.label("subreddit"))
+                .outerjoin(Subreddit, Post.subreddit_id == Subreddit.id)
+                .where(Post.is_processed == False, Post.id > last_id)
+                .order_by(Post.id)
+                .limit(self.chunk_size)
+            )
+            if claim is not None:
+                stmt = stmt.where(Post.process_claim == claim)
+            rows = self.db.execute(stmt).all()
+            if not rows:
+                return
+
+            last_id = rows[-1].id
+            yield [dict(row._mapping) for row in rows]
+
+    def _extract(self, posts: List[Dict[str, Any]], executor: ThreadPoolExecutor):
+        """
+        Filter + pre-classifier + batched extraction for a chunk.
+        Returns the problem statement per post (None, or EXTRACTION_FAILED when the LLM call failed)
+        and the ids gated out by the pre-classifier.
+        """
+        signals = [i for i, noise in enumerate(self.noise_filter.noise_mask(posts)) if not noise]
+        texts = [post_text(posts[i]) for i in signals]
+
+        skipped = set()
+        if self.preclassifier is not None and texts:
+            forwarded = self.preclassifier.score(texts) >= settings.PRECLASSIFIER_THRESHOLD
+            skipped = {posts[i]["id"] for i, keep in zip(signals, forwarded) if not keep}
+            texts = [text for text, keep in zip(texts, forwarded) if keep]
+            signals = [i for i, keep in zip(signals, forwarded) if keep]
+
+        problem_texts: List[Any] = [None] * len(posts)
+        batches = self.extractor.pack_batches(texts)
+        extracted = executor.map(lambda batch: self.extractor.extract_batch([texts[i] for i in batch]), batches)
+        for batch, problems in zip(batches, extracted):
+            for i, problem in zip(batch, problems):
+                problem_texts[signals[i]] = problem
+        return problem_texts, skipped
+
+    def process_chunk(self, posts: List[Dict[str, Any]], executor: ThreadPoolExecutor) -> Dict[str, int]:
+        problem_texts, skipped = self._extract(posts, executor)
+
+        # A failed extraction is not "no problem": leave those posts unprocessed so the next run retries them
+        flags = {post["id"]: False for post, text in zip(posts, problem_texts) if text is not EXTRACTION_FAILED}
+
+        # Embed every problem found in the chunk with batched requests
+        candidates = [(post, text) for post, text in zip(posts, problem_texts) if text and post["id"] in flags]
+        embeddings = self.embedder.get_embeddings([text for _, text in candidates])
+
+        problems = []
+        for (post, text), embedding in zip(candidates, embeddings):
+            if not embedding:
+                # Leave the post unprocessed so the next run retries it
+                del flags[post["id"]]
+                continue
+
+            problems.append({
+                "post_id": post["id"],
+                "text": text,
+                "original_text_segment": (post["text"] or "")[:2000],
+                "embedding": embedding
+            })
+
+        try:
+            # Near-duplicates are linked to the stored problem instead, so only inserted posts have a problem
+            inserted = self.store.add_problems(problems)
+            flags.update((post_id, True) for post_id in inserted)
+            if flags:
+                self.db.execute(
+                    update(Post),
+                    [
+                        {"id": post_id, "is_processed": True, "has_problem": found, "classifier_skipped": post_id in skipped}
+                        for post_id, found in flags.items()
+                    ]
+                )
+            self.db.commit()
+        except Exception as e:
+            logger.error(f"Error saving processed chunk: {e}")
+            self.db.rollback()
+            raise
+
+        return {
+            "processed": len(flags),
+            "problems": len(inserted),
+            "duplicates": len(problems) - len(inserted),
+            "failed": len(posts) - len(flags),
+            "classifier_skipped": len(skipped)
+        }
+
+    def run(self, claim: Optional[str] = None) -> Dict[str, int]:
+        totals = {"processed": 0, "problems": 0, "duplicates": 0, "failed": 0, "classifier_skipped": 0}
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            for chunk in self.iter_unprocessed(claim):
+                stats = self.process_chunk(chunk, executor)
+                for key, value in stats.items():
+                    totals[key] += value
+                logger.info(
+                    f"Processed {totals['processed']} posts so far "
+                    f"({totals['problems']} problems, {totals['duplicates']} duplicates, {totals['failed']} to retry, "
+                    f"{totals['classifier_skipped']} gated by the pre-classifier)."
+                )
+
+        if self.extractor.llm.cache is not None:
+            logger.info(f"LLM cache: {self.extractor.llm.cache.stats()}")
+        return totals
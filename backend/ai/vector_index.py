@@ -0,0 +1,112 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import text, select, func
+from models import ProblemStatement, EMBEDDING_OPS
+from config import settings
+from typing import Dict, List, Optional
+import logging
+import math
+
+logger = logging.getLogger(__name__)
+
+TABLE = "problem_statements"
+COLUMN = "embedding"
+INDEX_NAMES = {
+    "hnsw": "ix_problem_statements_embedding_hnsw",
+    "ivfflat": "ix_problem_statements_embedding_ivfflat",
+    "binary": "ix_problem_statements_embedding_binary",
+}
+
+def binary_expression(column: str = COLUMN) -> str:
+    """
+    Bit-quantized form of an embedding (1 bit per dimension, sign), matching the "binary" index expression.
+    """
+    return f"(binary_quantize({column})::bit({int(settings.EMBEDDING_DIM)}))"
+
+def ivfflat_lists(rows: int) -> int:
+    """
+    pgvector's rule of thumb: rows / 1000 up to 1M rows, sqrt(rows) beyond.
+    """
+    if settings.IVFFLAT_LISTS:
+        return settings.IVFFLAT_LISTS
+    if rows > 1_000_000:
+        return int(math.sqrt(rows))
+    return max(10, rows // 1000)
+
+def set_search_params(db: Session, ef_search: Optional[int] = None, probes: Optional[int] = None):
+    """
+    Sets the per-query ANN knobs for the current transaction only (SET LOCAL semantics via set_config).
+    No-op outside Postgres.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    if ef_search is not None:
+        db.execute(text("SELECT set_config('hnsw.ef_search', :value, true)"), {"value": str(int(ef_search))})
+    if probes is not None:
+        db.execute(text("SELECT set_config('ivfflat.probes', :value, true)"), {"value": str(int(probes))})
+
+class VectorIndexManager:
+    """
+    Creates, switches and inspects the pgvector index on problem_statements.embedding.
+    HNSW is the default (good recall without training, builds on an empty table);
+    IVFFlat builds faster and smaller but must be built after the data is loaded, since its lists
+    are trained on the rows present at build time. "binary" is HNSW over the bit-quantized vectors
+    (32x smaller than float32), searched with an exact-cosine rerank of the candidates.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+
+    def _require_postgres(self):
+        if self.db.get_bind().dialect.name != "postgresql":
+            raise RuntimeError("Vector indexes require PostgreSQL with the pgvector extension.")
+
+    def status(self) -> List[Dict]:
+        """
+        Existing ANN indexes on the embedding column with their definition and size.
+        """
+        self._require_postgres()
+        rows = self.db.execute(text(
+            "SELECT indexname, indexdef, pg_size_pretty(pg_relation_size(quote_ident(indexname)::regclass)) AS size "
+            "FROM pg_indexes WHERE tablename = :table AND indexname = ANY(:names)"
+        ), {"table": TABLE, "names": list(INDEX_NAMES.values())})
+        return [dict(row._mapping) for row in rows]
+
+    def drop_index(self, kind: str):
+        self._require_postgres()
+        self.db.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAMES[kind]}"))
+        self.db.commit()
+
+    def build_index(self, kind: Optional[str] = None, rebuild: bool = False) -> Optional[str]:
+        """
+        Ensures the configured index kind (VECTOR_INDEX_TYPE unless given) exists and drops the other one,
+        so the planner has exactly one ANN index to choose. Returns the index name, None for "none".
+        """
+        self._require_postgres()
+        kind = kind or settings.VECTOR_INDEX_TYPE
+
+        for other in INDEX_NAMES:
+            if other != kind or rebuild:
+                self.db.execute(text(f"DROP INDEX IF EXISTS {INDEX_NAMES[other]}"))
+        if kind == "none":
+            self.db.commit()
+            logger.info("Dropped ANN indexes, searches will be exact.")
+            return None
+
+        if kind == "ivfflat":
+            rows = self.db.execute(select(func.count()).select_from(ProblemStatement)).scalar()
+            method, params = "ivfflat", f"lists = {ivfflat_lists(rows)}"
+        else:
+            method, params = "hnsw", f"m = {int(settings.HNSW_M)}, ef_construction = {int(settings.HNSW_EF_CONSTRUCTION)}"
+        target = f"{binary_expression()} bit_hamming_ops" if kind == "binary" else f"{COLUMN} {EMBEDDING_OPS}"
+
+        name = INDEX_NAMES[kind]
+        self.db.execute(
+            text("SELECT set_config('maintenance_work_mem', :value, true)"),
+            {"value": settings.VECTOR_INDEX_BUILD_MEMORY}
+        )
+        self.db.execute(text(
+            f"CREATE INDEX IF NOT EXISTS {name} ON {TABLE} "
+            f"USING {method} ({target}) WITH ({params})"
+        ))
+        self.db.commit()
+        logger.info(f"Vector index {name} ready ({params}).")
+        return name
@@ -1,11 +1,30 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import select
-from models import ProblemCluster, ProblemStatement
-from typing import List, Optional
+from sqlalchemy import select, insert, update, cast, func, true, Integer
+from pgvector.sqlalchemy import BIT
+from models import ProblemCluster, ProblemStatement, Post, Subreddit, DuplicateLink
+from ai.vector_index import set_search_params
+from ai.vectors import normalize, exact_nearest
+from database import values_cte
+from config import settings
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+import numpy as np
 import logging
 
 logger = logging.getLogger(__name__)
 
+def _nearest(rows, query_embedding: List[float], limit: int, fields: Tuple[str, ...]) -> List[Dict]:
+    """
+    Exact cosine top-`limit` of rows whose last column is the vector, as dicts of `fields` plus "distance".
+    """
+    if not rows:
+        return []
+    order, distances = exact_nearest([query_embedding], [row[-1] for row in rows], k=limit)
+    return [
+        {**{f: rows[i][k] for k, f in enumerate(fields)}, "distance": float(distance)}
+        for i, distance in zip(order[0], distances[0])
+    ]
+
 class VectorStore:
     def __init__(self, db: Session):
         self.db = db
@@ -13,8 +32,17 @@ class VectorStore:
     def add_problem(self, extracted_text: str, original_text: str, post_id: str, embedding: List[float]):
         """
         Adds a new extracted problem to the database with its embedding.
+        A near-duplicate of a stored problem is linked to it instead, and the stored problem is returned.
         """
         try:
+            match = self.find_duplicates([embedding])[0]
+            if match is not None:
+                canonical_id, canonical_post_id, distance = match
+                self._link_duplicates([(post_id, canonical_id, canonical_post_id, distance)])
+                self.db.commit()
+                logger.info(f"Problem from post {post_id} duplicates problem ID {canonical_id}, linked.")
+                return self.db.get(ProblemStatement, canonical_id)
+
             new_problem = ProblemStatement(
                 post_id=post_id,
                 text=extracted_text,
@@ -31,15 +59,235 @@ class VectorStore:
             self.db.rollback()
             return None
 
-    def search_similar(self, query_embedding: List[float], limit: int = 5):
+    def add_problems(self, problems: List[dict]) -> List[str]:
+        """
+        Bulk inserts problems (dicts with post_id, text, original_text_segment, embedding) in one statement.
+        Problems within PROBLEM_DEDUPE_MAX_DISTANCE of a stored problem, or of an earlier one in the batch,
+        are recorded as DuplicateLinks instead. Does not commit, so callers can make it part of a larger
+        transaction. Returns the post ids of the problems inserted.
+        """
+        if not problems:
+            return []
+        max_distance = settings.PROBLEM_DEDUPE_MAX_DISTANCE
+        if max_distance <= 0:
+            self.db.execute(insert(ProblemStatement), problems)
+            logger.info(f"Added {len(problems)} problems to vector store.")
+            return [p["post_id"] for p in problems]
+
+        stored = self.find_duplicates([p["embedding"] for p in problems])
+        unit = normalize(np.asarray([p["embedding"] for p in problems], dtype=np.float32))
+
+        kept: List[int] = []
+        batch_duplicates: List[Tuple[int, int, float]] = [] # (row, kept row, distance)
+        links = []
+        for i, match in enumerate(stored):
+            if match is not None:
+                canonical_id, canonical_post_id, distance = match
+                links.append((problems[i]["post_id"], canonical_id, canonical_post_id, distance))
+                continue
+            if kept:
+                distances = 1.0 - unit[kept] @ unit[i]
+                j = int(distances.argmin())
+                if distances[j] <= max_distance:
+                    batch_duplicates.append((i, kept[j], float(distances[j])))
+                    continue
+            kept.append(i)
+
+        inserted_ids = self.db.scalars(
+            insert(ProblemStatement).returning(ProblemStatement.id, sort_by_parameter_order=True),
+            [problems[i] for i in kept]
+        ).all() if kept else []
+        problem_ids = dict(zip(kept, inserted_ids))
+        links += [
+            (problems[i]["post_id"], problem_ids[j], problems[j]["post_id"], distance)
+            for i, j, distance in batch_duplicates
+        ]
+        self._link_duplicates(links)
+
+        logger.info(f"Added {len(kept)} problems to vector store, linked {len(links)} duplicates.")
+        return [problems[i]["post_id"] for i in kept]
+
+    def find_duplicates(
+        self, embeddings: List[List[float]], chunk_size: int = 500
+    ) -> List[Optional[Tuple[int, str, float]]]:
+        """
+        (problem_id, post_id, cosine distance) of the nearest stored problem within PROBLEM_DEDUPE_MAX_DISTANCE,
+        or None, per embedding. On Postgres each chunk of embeddings is one query, a LATERAL
+        search_similar-style lookup per row served by the ANN index; elsewhere (SQLite tests) stored
+        embeddings are compared in NumPy.
+        """
+        max_distance = settings.PROBLEM_DEDUPE_MAX_DISTANCE
+        if max_distance <= 0 or not embeddings:
+            return [None] * len(embeddings)
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            results = []
+            for start in range(0, len(embeddings), chunk_size):
+                queries = values_cte(
+                    "queries", [("i", Integer()), ("embedding", ProblemStatement.embedding.type)],
+                    list(enumerate(embeddings[start:start + chunk_size]))
+                )
+                # The same query search_similar runs, binary shortlist and rerank included, once per VALUES row
+                distance = ProblemStatement.embedding.cosine_distance(queries.c.embedding).label("distance")
+                nearest = self._similar_query(
+                    (ProblemStatement.id, ProblemStatement.post_id, distance), queries.c.embedding, 1,
+                    None, None, None, None, None
+                ).lateral("nearest")
+                rows = self.db.execute(
+                    select(queries.c.i, nearest.c.id, nearest.c.post_id, nearest.c.distance)
+                    .select_from(queries.outerjoin(nearest, true()))
+                    .order_by(queries.c.i)
+                ).all()
+                results.extend(
+                    (row.id, row.post_id, float(row.distance))
+                    if row.distance is not None and row.distance <= max_distance else None
+                    for row in rows
+                )
+            return results
+
+        rows = self.db.execute(
+            select(ProblemStatement.id, ProblemStatement.post_id, ProblemStatement.embedding)
+            .where(ProblemStatement.embedding != None)
+        ).all()
+        if not rows:
+            return [None] * len(embeddings)
+        order, distances = exact_nearest(embeddings, [row.embedding for row in rows])
+        return [
+            (rows[j].id, rows[j].post_id, float(distance)) if distance <= max_distance else None
+            for j, distance in zip(order[:, 0], distances[:, 0])
+        ]
+
+    def _link_duplicates(self, links: List[Tuple[str, int, str, float]]):
+        """
+        Records (duplicate post, canonical problem, canonical post, distance) links and flags the
+        canonical problems' clusters for rescoring. Does not commit.
+        """
+        if not links:
+            return
+        self.db.execute(insert(DuplicateLink), [
+            {
+                "kind": "problem",
+                "duplicate_post_id": post_id,
+                "canonical_post_id": canonical_post_id,
+                "canonical_problem_id": canonical_id,
+                "similarity": 1.0 - distance
+            }
+            for post_id, canonical_id, canonical_post_id, distance in links
+        ])
+        self.db.execute(
+            update(ProblemCluster)
+            .where(ProblemCluster.id.in_(
+                select(ProblemStatement.cluster_id).where(ProblemStatement.id.in_([link[1] for link in links]))
+            ))
+            .values(is_dirty=True)
+            .execution_options(synchronize_session=False)
+        )
+
+    def _filter_posts(self, stmt, subreddits: Optional[List[str]], since: Optional[datetime], until: Optional[datetime]):
+        if subreddits or since or until:
+            stmt = stmt.join(Post, Post.id == ProblemStatement.post_id)
+        if subreddits:
+            stmt = stmt.join(Subreddit, Subreddit.id == Post.subreddit_id).where(Subreddit.name.in_(subreddits))
+        if since:
+            stmt = stmt.where(Post.created_utc >= since)
+        if until:
+            stmt = stmt.where(Post.created_utc < until)
+        return stmt
+
+    def _similar_query(
+        self,
+        columns: tuple,
+        query_embedding: List[float],
+        limit: int,
+        subreddits: Optional[List[str]],
+        since: Optional[datetime],
+        until: Optional[datetime],
+        ef_search: Optional[int],
+        probes: Optional[int]
+    ):
+        filtered = bool(subreddits or since or until)
+        if ef_search is None:
+            # The index returns ef_search candidates before filters apply, widen it so filtered queries still fill `limit`
+            ef_search = settings.VECTOR_FILTERED_EF_SEARCH if filtered else settings.HNSW_EF_SEARCH
+        binary = settings.VECTOR_INDEX_TYPE == "binary"
+        candidates = limit * settings.VECTOR_BINARY_CANDIDATES if binary else limit
+        set_search_params(self.db, ef_search=max(ef_search, candidates), probes=probes or settings.IVFFLAT_PROBES)
+
+        if binary:
+            # Same expression as the index, so the planner can use it
+            bits = BIT(settings.EMBEDDING_DIM)
+            quantized = cast(func.binary_quantize(ProblemStatement.embedding), bits)
+            query_bits = cast(func.binary_quantize(cast(query_embedding, ProblemStatement.embedding.type)), bits)
+            shortlist = (
+                self._filter_posts(select(ProblemStatement.id), subreddits, since, until)
+                .order_by(quantized.hamming_distance(query_bits))
+                .limit(candidates)
+                .subquery()
+            )
+            stmt = select(*columns).join(shortlist, ProblemStatement.id == shortlist.c.id)
+        else:
+            stmt = self._filter_posts(select(*columns), subreddits, since, until)
+
+        return stmt.order_by(ProblemStatement.embedding.cosine_distance(query_embedding)).limit(limit)
+
+    def search_similar(
+        self,
+        query_embedding: List[float],
+        limit: int = 5,
+        subreddits: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None,
+        ef_search: Optional[int] = None,
+        probes: Optional[int] = None
+    ):
         """
-        Finds similar problems using cosine similarity (L2 distance is default in pgvector but we can use operators).
+        Finds similar problems by cosine distance (<=>), served by the HNSW/IVFFlat index on Postgres.
+        Optional filters restrict matches to posts from the given subreddits and/or created in [since, until).
+        ef_search/probes override HNSW_EF_SEARCH/IVFFLAT_PROBES for this transaction.
+        With VECTOR_INDEX_TYPE=binary, limit * VECTOR_BINARY_CANDIDATES candidates are taken by Hamming
+        distance on the bit-quantized index and reranked by exact cosine distance.
         """
-        # Note: pgvector supports <-> (L2 distance), <=> (Cosine distance), <#> (Inner product)
-        # We'll use cosine distance (<=>) for standardized vectors.
-        stmt = select(ProblemStatement).order_by(
-            ProblemStatement.embedding.cosine_distance(query_embedding)
-        ).limit(limit)
-        
-        results = self.db.execute(stmt).scalars().all()
-        return results
+        stmt = self._similar_query((ProblemStatement,), query_embedding, limit, subreddits, since, until, ef_search, probes)
+        return self.db.execute(stmt).scalars().all()
+
+    def search_problems(
+        self,
+        query_embedding: List[float],
+        limit: int = 10,
+        subreddits: Optional[List[str]] = None,
+        since: Optional[datetime] = None,
+        until: Optional[datetime] = None
+    ):
+        """
+        Like search_similar, but returns dicts of id, text, post_id, cluster_id and distance instead of
+        full problems, so stored embeddings are never transferred. Elsewhere than Postgres (SQLite
+        tests) the distances are computed in NumPy.
+        """
+        columns = (ProblemStatement.id, ProblemStatement.text, ProblemStatement.post_id, ProblemStatement.cluster_id)
+        if self.db.get_bind().dialect.name == "postgresql":
+            distance = ProblemStatement.embedding.cosine_distance(query_embedding).label("distance")
+            stmt = self._similar_query(columns + (distance,), query_embedding, limit, subreddits, since, until, None, None)
+            return [dict(row._mapping) for row in self.db.execute(stmt)]
+
+        rows = self.db.execute(
+            self._filter_posts(select(*columns, ProblemStatement.embedding), subreddits, since, until)
+            .where(ProblemStatement.embedding != None)
+        ).all()
+        return _nearest(rows, query_embedding, limit, ("id", "text", "post_id", "cluster_id"))
+
+    def search_clusters(self, query_embedding: List[float], limit: int = 5):
+        """
+        Clusters whose centroid is nearest the query, as dicts of id, name, size, total_validation_score
+        and distance, served by ix_problem_clusters_centroid_hnsw on Postgres.
+        """
+        columns = (ProblemCluster.id, ProblemCluster.name, ProblemCluster.size, ProblemCluster.total_validation_score)
+        if self.db.get_bind().dialect.name == "postgresql":
+            set_search_params(self.db, ef_search=max(settings.HNSW_EF_SEARCH, limit))
+            distance = ProblemCluster.centroid.cosine_distance(query_embedding)
+            return [dict(row._mapping) for row in self.db.execute(
+                select(*columns, distance.label("distance")).where(ProblemCluster.centroid != None)
+                .order_by(distance).limit(limit)
+            )]
+
+        rows = self.db.execute(select(*columns, ProblemCluster.centroid).where(ProblemCluster.centroid != None)).all()
+        return _nearest(rows, query_embedding, limit, ("id", "name", "size", "total_validation_score"))
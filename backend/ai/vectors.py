@@ -0,0 +1,22 @@
+import numpy as np
+from typing import Sequence, Tuple
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    """
+    Scales each vector (the last axis) to unit length; zero vectors are left as they are.
+    """
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+def exact_nearest(queries: Sequence, vectors: Sequence, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Exact cosine k-nearest neighbours in NumPy, the fallback where pgvector is not available (SQLite tests).
+    Returns (indices, distances), each of shape (len(queries), min(k, len(vectors))), closest first.
+    """
+    distances = 1.0 - normalize(np.asarray(queries, dtype=np.float32)) @ normalize(np.asarray(vectors, dtype=np.float32)).T
+    if k == 1:
+        order = distances.argmin(axis=1)[:, None]
+    else:
+        order = np.argsort(distances, axis=1, kind="stable")[:, :k]
+    return order, np.take_along_axis(distances, order, axis=1)
@@ -0,0 +1,155 @@
+from collections import OrderedDict
+from fastapi import Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from generations import get_generation_async
+from config import settings
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class MemoryResponseCache:
+    """
+    Per-process LRU cache; entries expire after `ttl_seconds`.
+    """
+    def __init__(self, ttl_seconds: int, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+
+    async def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.monotonic() - entry[0] > self.ttl_seconds:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    async def set(self, key: str, value: bytes):
+        with self.lock:
+            self.entries[key] = (time.monotonic(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+class RedisResponseCache:
+    """
+    Cache shared by all API workers on REDIS_URL.
+    """
+    PREFIX = "api_cache:"
+
+    def __init__(self, url: str, ttl_seconds: int):
+        import redis.asyncio # Optional dependency, only needed for this backend
+        self.client = redis.asyncio.Redis.from_url(url)
+        self.ttl_seconds = ttl_seconds
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(self.PREFIX + key)
+
+    async def set(self, key: str, value: bytes):
+        await self.client.set(self.PREFIX + key, value, ex=self.ttl_seconds)
+
+def _etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+class ResponseCache:
+    """
+    Caches serialized read-API responses under the current data generation (see generations.py), so
+    entries go stale exactly when scoring, ideation or a cluster merge commits new data. The
+    generation is re-read at most every API_GENERATION_POLL_SECONDS per process.
+
+    Every response carries an ETag derived from the generation and body; a matching If-None-Match
+    gets a 304 without a body.
+    """
+    def __init__(self, backend=None, poll_seconds: Optional[float] = None):
+        self.backend = backend
+        self.poll_seconds = settings.API_GENERATION_POLL_SECONDS if poll_seconds is None else poll_seconds
+        self.generation = 0
+        self.checked_at = float("-inf")
+
+    async def current_generation(self, db: AsyncSession) -> int:
+        now = time.monotonic()
+        if now - self.checked_at >= self.poll_seconds:
+            self.generation = await get_generation_async(db)
+            self.checked_at = now
+        return self.generation
+
+    def _key(self, request: Request, generation: int) -> str:
+        query = "&".join(f"{k}={v}" for k, v in sorted(request.query_params.multi_items()))
+        return f"{generation}:{request.url.path}?{query}"
+
+    async def _load(self, key: str) -> Optional[Tuple[bytes, Dict[str, str]]]:
+        if self.backend is None:
+            return None
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            logger.warning(f"Response cache read failed: {e}")
+            return None
+        if value is None:
+            return None
+        headers, _, body = value.partition(b"\n")
+        return body, json.loads(headers)
+
+    async def _store(self, key: str, body: bytes, headers: Dict[str, str]):
+        if self.backend is None:
+            return
+        try:
+            await self.backend.set(key, json.dumps(headers).encode() + b"\n" + body)
+        except Exception as e:
+            logger.warning(f"Response cache write failed: {e}")
+
+    async def respond(
+        self, request: Request, db: AsyncSession, build: Callable[[], Awaitable[Tuple[bytes, Dict[str, str]]]]
+    ) -> Response:
+        """
+        Serves the request from the cache, or calls `build` for (JSON body, extra headers) and caches it.
+        Errors raised by `build` (e.g. 404) propagate and are not cached.
+        """
+        generation = await self.current_generation(db)
+        key = self._key(request, generation)
+        cached = await self._load(key)
+        if cached is None:
+            body, headers = await build()
+            headers["ETag"] = f'"{generation}-{hashlib.sha256(body).hexdigest()[:16]}"'
+            await self._store(key, body, headers)
+        else:
+            body, headers = cached
+
+        headers = {**headers, "Cache-Control": "no-cache"} # Clients may keep it, but must revalidate
+        if _etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+
+_response_cache: Optional[ResponseCache] = None
+_response_cache_lock = threading.Lock()
+
+def get_response_cache() -> ResponseCache:
+    """
+    Process-wide response cache for API_CACHE_BACKEND. Falls back to no caching (ETags still work)
+    when the backend cannot be created.
+    """
+    global _response_cache
+    with _response_cache_lock:
+        if _response_cache is None:
+            backend = None
+            try:
+                if settings.API_CACHE_BACKEND == "redis":
+                    backend = RedisResponseCache(settings.REDIS_URL, settings.API_CACHE_TTL_SECONDS)
+                elif settings.API_CACHE_BACKEND == "memory":
+                    backend = MemoryResponseCache(settings.API_CACHE_TTL_SECONDS, settings.API_CACHE_MAX_ENTRIES)
+            except Exception as e:
+                logger.warning(f"Response cache backend {settings.API_CACHE_BACKEND!r} unavailable ({e}), caching disabled.")
+            _response_cache = ResponseCache(backend)
+        return _response_cache
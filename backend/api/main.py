@@ -1,10 +1,19 @@
-from fastapi import FastAPI, Depends, HTTPException
-from sqlalchemy.orm import Session
-from database import get_db
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload, load_only
+from sqlalchemy import select, func, tuple_
+from database import get_async_db
+from api.cache import ResponseCache, get_response_cache
+from api.search import QueryEmbedder, get_query_embedder
+from ai.vector_store import VectorStore
 from models import ProblemCluster, GeneratedIdea
+from config import settings
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
-from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional, Tuple
+from pydantic import BaseModel, Field, TypeAdapter
+import base64
+import json
 
 app = FastAPI(title="Reddit Idea Validator API")
 
@@ -15,6 +24,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Pydantic Models for Response
@@ -25,6 +35,9 @@ class IdeaResponse(BaseModel):
     monetization_strategy: str
     market_size_estimate: str
 
+    class Config:
+        from_attributes = True
+
 class ClusterResponse(BaseModel):
     id: int
     name: str
@@ -39,18 +52,185 @@ class ClusterResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class SearchRequest(BaseModel):
+    query: str = Field(min_length=1, max_length=settings.SEARCH_MAX_QUERY_CHARS)
+    limit_problems: int = Field(10, ge=0, le=settings.SEARCH_MAX_RESULTS)
+    limit_clusters: int = Field(5, ge=0, le=settings.SEARCH_MAX_RESULTS)
+    subreddits: Optional[List[str]] = None # Problem filters
+    since: Optional[datetime] = None
+    until: Optional[datetime] = None
+
+class ProblemHit(BaseModel):
+    id: int
+    text: Optional[str]
+    post_id: Optional[str]
+    cluster_id: Optional[int]
+    score: float # Cosine similarity to the query
+
+class ClusterHit(BaseModel):
+    id: int
+    name: Optional[str]
+    size: Optional[int]
+    total_validation_score: Optional[float]
+    score: float # Cosine similarity of the centroid to the query
+
+class SearchResponse(BaseModel):
+    problems: List[ProblemHit]
+    clusters: List[ClusterHit]
+
+CLUSTER_LIST = TypeAdapter(List[ClusterResponse])
+
+SCORE_COLUMNS = (
+    ProblemCluster.frequency_score,
+    ProblemCluster.intensity_score,
+    ProblemCluster.engagement_score,
+    ProblemCluster.recency_score,
+    ProblemCluster.total_validation_score,
+)
+IDEA_COLUMNS = (
+    GeneratedIdea.cluster_id,
+    GeneratedIdea.title,
+    GeneratedIdea.description,
+    GeneratedIdea.solution_type,
+    GeneratedIdea.monetization_strategy,
+    GeneratedIdea.market_size_estimate,
+)
+
+def encode_cursor(score: float, cluster_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, cluster_id]).encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, cluster_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), int(cluster_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+async def list_clusters(
+    db: AsyncSession,
+    limit: int,
+    cursor: Optional[str],
+    min_score: Optional[float],
+    since: Optional[datetime],
+    until: Optional[datetime]
+) -> Tuple[List[ClusterResponse], Optional[str]]:
+    """
+    One page of clusters by validation score and the cursor for the next page (None on the last).
+    Descriptions are truncated to API_DESCRIPTION_PREVIEW_CHARS, ideas come from one extra query.
+    """
+    preview = func.substr(ProblemCluster.description, 1, settings.API_DESCRIPTION_PREVIEW_CHARS).label("preview")
+    stmt = (
+        select(ProblemCluster, preview)
+        .options(
+            load_only(ProblemCluster.id, ProblemCluster.name, *SCORE_COLUMNS),
+            selectinload(ProblemCluster.generated_ideas).load_only(*IDEA_COLUMNS)
+        )
+        .order_by(ProblemCluster.total_validation_score.desc(), ProblemCluster.id.desc())
+        .limit(limit + 1)
+    )
+    if cursor:
+        # Keyset: strictly after the last row of the previous page, served by ix_problem_clusters_score_id
+        stmt = stmt.where(tuple_(ProblemCluster.total_validation_score, ProblemCluster.id) < tuple_(*decode_cursor(cursor)))
+    if min_score is not None:
+        stmt = stmt.where(ProblemCluster.total_validation_score >= min_score)
+    if since is not None:
+        stmt = stmt.where(ProblemCluster.created_at >= since)
+    if until is not None:
+        stmt = stmt.where(ProblemCluster.created_at < until)
+
+    rows = (await db.execute(stmt)).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1].ProblemCluster
+        next_cursor = encode_cursor(last.total_validation_score, last.id)
+
+    return [
+        ClusterResponse(
+            id=cluster.id,
+            name=cluster.name or "",
+            description=description or "",
+            frequency_score=cluster.frequency_score or 0.0,
+            intensity_score=cluster.intensity_score or 0.0,
+            engagement_score=cluster.engagement_score or 0.0,
+            recency_score=cluster.recency_score or 0.0,
+            total_validation_score=cluster.total_validation_score or 0.0,
+            generated_ideas=[IdeaResponse.model_validate(idea) for idea in cluster.generated_ideas]
+        )
+        for cluster, description in rows
+    ], next_cursor
+
 @app.get("/clusters", response_model=List[ClusterResponse])
-def get_clusters(db: Session = Depends(get_db)):
-    clusters = db.query(ProblemCluster).order_by(ProblemCluster.total_validation_score.desc()).all()
-    return clusters
+async def get_clusters(
+    request: Request,
+    limit: int = Query(settings.API_PAGE_SIZE, ge=1, le=settings.API_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    min_score: Optional[float] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    db: AsyncSession = Depends(get_async_db),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    """
+    Clusters by validation score, one page at a time. The list stays a plain JSON array; when more
+    pages exist the X-Next-Cursor header holds the cursor for the next request.
+    Pages are cached until the pipeline next changes scores or ideas.
+    """
+    async def build():
+        clusters, next_cursor = await list_clusters(db, limit, cursor, min_score, since, until)
+        return CLUSTER_LIST.dump_json(clusters), {"X-Next-Cursor": next_cursor} if next_cursor else {}
+    return await cache.respond(request, db, build)
 
 @app.get("/clusters/{cluster_id}", response_model=ClusterResponse)
-def get_cluster(cluster_id: int, db: Session = Depends(get_db)):
-    cluster = db.query(ProblemCluster).filter(ProblemCluster.id == cluster_id).first()
-    if not cluster:
-        raise HTTPException(status_code=404, detail="Cluster not found")
-    return cluster
+async def get_cluster(
+    cluster_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    cache: ResponseCache = Depends(get_response_cache)
+):
+    async def build():
+        cluster = (await db.execute(
+            select(ProblemCluster)
+            .options(
+                load_only(ProblemCluster.id, ProblemCluster.name, ProblemCluster.description, *SCORE_COLUMNS),
+                selectinload(ProblemCluster.generated_ideas).load_only(*IDEA_COLUMNS)
+            )
+            .where(ProblemCluster.id == cluster_id)
+        )).scalar_one_or_none()
+        if not cluster:
+            raise HTTPException(status_code=404, detail="Cluster not found")
+        return ClusterResponse.model_validate(cluster).model_dump_json().encode(), {}
+    return await cache.respond(request, db, build)
+
+@app.post("/search", response_model=SearchResponse)
+async def search(
+    body: SearchRequest,
+    db: AsyncSession = Depends(get_async_db),
+    embedder: QueryEmbedder = Depends(get_query_embedder)
+):
+    """
+    Semantic search: problems and clusters nearest the query, most similar first. Both lookups are
+    ANN queries in one transaction (problem embedding index, centroid index); the query embedding
+    is cached per process.
+    """
+    embedding = await embedder.embed(body.query)
+    if not embedding:
+        raise HTTPException(status_code=503, detail="Embedding backend unavailable")
+
+    def run(session):
+        store = VectorStore(session)
+        problems = store.search_problems(
+            embedding, body.limit_problems, body.subreddits, body.since, body.until
+        ) if body.limit_problems else []
+        clusters = store.search_clusters(embedding, body.limit_clusters) if body.limit_clusters else []
+        return problems, clusters
+
+    problems, clusters = await db.run_sync(run)
+    return SearchResponse(
+        problems=[ProblemHit(**row, score=1.0 - row["distance"]) for row in problems],
+        clusters=[ClusterHit(**row, score=1.0 - row["distance"]) for row in clusters]
+    )
 
 @app.get("/")
-def read_root():
+async def read_root():
     return {"status": "ok", "message": "Reddit Validator API is running"}
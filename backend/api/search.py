@@ -0,0 +1,45 @@
+from collections import OrderedDict
+from fastapi.concurrency import run_in_threadpool
+from ai.embedding import EmbeddingService
+from config import settings
+from typing import List, Optional
+import threading
+
+class QueryEmbedder:
+    """
+    Embeds search queries with an in-process LRU in front of EmbeddingService (and the LLM cache
+    behind it), so repeated searches never reach the embedding backend. Queries are keyed with
+    whitespace collapsed; failed embeddings are not cached.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.service = EmbeddingService()
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def embed(self, query: str) -> List[float]:
+        key = " ".join(query.split())
+        with self.lock:
+            vector = self.entries.get(key)
+            if vector is not None:
+                self.entries.move_to_end(key)
+                return vector
+
+        # EmbeddingService is blocking
+        vector = await run_in_threadpool(self.service.get_embedding, key)
+        if vector:
+            with self.lock:
+                self.entries[key] = vector
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+        return vector
+
+_query_embedder: Optional[QueryEmbedder] = None
+_query_embedder_lock = threading.Lock()
+
+def get_query_embedder() -> QueryEmbedder:
+    global _query_embedder
+    with _query_embedder_lock:
+        if _query_embedder is None:
+            _query_embedder = QueryEmbedder(settings.SEARCH_EMBEDDING_CACHE_SIZE)
+        return _query_embedder
@@ -0,0 +1,75 @@
+"""
+Clustering scalability over synthetic embedding sets.
+
+Each (size, reducer) run happens in a fresh subprocess so peak RSS is measured per run.
+Embeddings are Gaussian blobs around random unit centers, generated straight into a float32 matrix.
+
+Usage (from backend/):
+    python -m benchmarks.bench_clustering --sizes 10000 100000 500000 --reducers none pca
+    python -m benchmarks.bench_clustering --sizes 10000 --reducers pca --dim 1536 --n-jobs 8
+
+Note: 500k x 1536 float32 is ~3 GB before any reduction; "none" at that size can take hours.
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import time
+
+def make_embeddings(n: int, dim: int, centers: int, seed: int = 42):
+    import numpy as np
+    rng = np.random.default_rng(seed)
+    means = rng.normal(size=(centers, dim)).astype(np.float32)
+    means /= np.linalg.norm(means, axis=1, keepdims=True)
+
+    matrix = np.empty((n, dim), dtype=np.float32)
+    step = 10000
+    for start in range(0, n, step):
+        stop = min(n, start + step)
+        labels = rng.integers(0, centers, size=stop - start)
+        matrix[start:stop] = means[labels] + rng.normal(scale=0.02, size=(stop - start, dim)).astype(np.float32)
+    return matrix
+
+def run_one(n: int, reducer: str, dim: int, n_jobs: int):
+    os.environ["CLUSTER_REDUCER"] = reducer
+    os.environ["CLUSTER_N_JOBS"] = str(n_jobs)
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    from logic.clustering import ClusterEngine
+
+    matrix = make_embeddings(n, dim, centers=max(10, n // 200))
+    engine = ClusterEngine(db=None)
+
+    start = time.perf_counter()
+    labels = engine.fit_labels(matrix)
+    elapsed = time.perf_counter() - start
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # KiB on Linux
+    clusters = len(set(labels.tolist()) - {-1})
+    print(f"{n:>8}  {reducer:>6}  {elapsed:10.2f}s  {peak_mb:10.0f} MB  {clusters:>8} clusters", flush=True)
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--reducers", nargs="+", default=["none", "pca"], choices=["none", "pca", "umap"])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--n-jobs", type=int, default=-1)
+    parser.add_argument("--worker", nargs=2, metavar=("SIZE", "REDUCER"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_one(int(args.worker[0]), args.worker[1], args.dim, args.n_jobs)
+        return
+
+    print(f"{'size':>8}  {'reduce':>6}  {'wall time':>11}  {'peak RSS':>13}  {'found':>17}")
+    for n in args.sizes:
+        for reducer in args.reducers:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_clustering", "--worker", str(n), reducer,
+                 "--dim", str(args.dim), "--n-jobs", str(args.n_jobs)],
+                check=False
+            )
+
+if __name__ == "__main__":
+    main()
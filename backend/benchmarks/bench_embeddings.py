@@ -0,0 +1,85 @@
+"""
+Embedding throughput: one request per text (get_embedding) vs batched get_embeddings.
+
+Starts a local stub of the OpenAI /v1/embeddings endpoint that sleeps --latency-ms per request,
+so the numbers show request overhead rather than model speed.
+
+Usage (from backend/):
+    python -m benchmarks.bench_embeddings --texts 2000 --latency-ms 30
+"""
+import argparse
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+os.environ["LLM_BACKEND"] = "openai"
+os.environ.setdefault("OPENAI_API_KEY", "stub")
+os.environ["LLM_CACHE_BACKEND"] = "none" # Measure the backend, not the cache
+
+from openai import OpenAI
+from ai.llm_provider import LLMProvider
+
+DIM = 1536
+
+class StubEmbeddingsHandler(BaseHTTPRequestHandler):
+    latency = 0.03
+    requests = 0
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        StubEmbeddingsHandler.requests += 1
+        time.sleep(self.latency)
+
+        payload = json.dumps({
+            "object": "list",
+            "model": body["model"],
+            "data": [
+                {"object": "embedding", "index": i, "embedding": [float(len(text) % 7)] * DIM}
+                for i, text in enumerate(inputs)
+            ],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0}
+        }).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--texts", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=30)
+    args = parser.parse_args()
+
+    StubEmbeddingsHandler.latency = args.latency_ms / 1000.0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubEmbeddingsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    provider = LLMProvider()
+    provider.client = OpenAI(api_key="stub", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+    texts = [f"Problem {i}: manual invoicing takes hours every week for small agencies." for i in range(args.texts)]
+
+    for label, fn in [
+        ("get_embedding (loop)", lambda: [provider.get_embedding(t) for t in texts]),
+        ("get_embeddings (batched)", lambda: provider.get_embeddings(texts)),
+    ]:
+        StubEmbeddingsHandler.requests = 0
+        start = time.perf_counter()
+        vectors = fn()
+        elapsed = time.perf_counter() - start
+        assert len(vectors) == len(texts) and all(vectors)
+        print(
+            f"{label:<26} {len(texts):>7} texts  {StubEmbeddingsHandler.requests:>6} requests  "
+            f"{elapsed:8.3f}s  {len(texts) / elapsed:9.0f} texts/sec"
+        )
+
+    server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Problem extraction: one LLM call per post (extract_problem) vs batched prompts (extract_problems).
+
+Uses a deterministic fake LLM backend that charges a fixed per-call latency plus a per-token cost,
+so the comparison reflects prompt overhead rather than model quality.
+
+Usage (from backend/):
+    python -m benchmarks.bench_extraction --posts 500 --call-ms 300 --token-us 200
+"""
+import argparse
+import os
+import re
+import time
+
+os.environ["LLM_CACHE_BACKEND"] = "none" # Measure the backend, not the cache
+
+from ai.extraction import ProblemExtractor
+
+class FakeLLM:
+    """
+    Flags posts mentioning "invoice" as problems. Latency = call_s + tokens * token_s (prompt + completion).
+    """
+    cache = None
+
+    def __init__(self, call_s: float, token_s: float, malformed_every: int = 0):
+        self.call_s = call_s
+        self.token_s = token_s
+        self.malformed_every = malformed_every
+        self.calls = 0
+        self.tokens = 0
+
+    def _charge(self, prompt: str, completion: str):
+        tokens = (len(prompt) + len(completion)) // 4 + 1
+        self.calls += 1
+        self.tokens += tokens
+        time.sleep(self.call_s + tokens * self.token_s)
+
+    @staticmethod
+    def _answer(text: str) -> str:
+        return "Problem: Invoicing is slow and manual." if "invoice" in text else "NO_PROBLEM"
+
+    def generate_text(self, system_prompt: str, user_prompt: str, max_tokens: int = 500):
+        completion = self._answer(user_prompt)
+        self._charge(system_prompt + user_prompt, completion)
+        return completion
+
+    def generate_json(self, system_prompt: str, user_prompt: str):
+        posts = re.split(r"### Post (\d+)\n", user_prompt)[1:]
+        results = {number: self._answer(text) for number, text in zip(posts[::2], posts[1::2])}
+        # Simulate a model that occasionally drops an entry
+        if self.malformed_every and self.calls % self.malformed_every == 0 and results:
+            results.pop(next(iter(results)))
+        self._charge(system_prompt + user_prompt, str(results))
+        return {"results": results}
+
+def make_posts(n: int):
+    body = "We run a small agency and every month someone spends two days chasing clients. " * 4
+    return [
+        f"Post {i}\n\n{body}{'The invoice step is the worst part.' if i % 3 == 0 else 'Anyway, nice weather.'}"
+        for i in range(n)
+    ]
+
+def run(label: str, extractor: ProblemExtractor, fn, posts):
+    start = time.perf_counter()
+    results = fn(posts)
+    elapsed = time.perf_counter() - start
+    llm = extractor.llm
+    found = sum(1 for r in results if r)
+    print(
+        f"{label:<26} {len(posts):>6} posts  {llm.calls:>5} calls  {found:>5} problems  "
+        f"{len(posts) / elapsed:8.1f} posts/sec  {llm.tokens / len(posts):8.1f} tokens/post"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=500)
+    parser.add_argument("--call-ms", type=float, default=300)
+    parser.add_argument("--token-us", type=float, default=200)
+    parser.add_argument("--malformed-every", type=int, default=0, help="Drop one entry from every Nth batched response")
+    args = parser.parse_args()
+
+    posts = make_posts(args.posts)
+
+    single = ProblemExtractor()
+    single.llm = FakeLLM(args.call_ms / 1000, args.token_us / 1e6)
+    run("extract_problem (single)", single, lambda ps: [single.extract_problem(p) for p in ps], posts)
+
+    batched = ProblemExtractor()
+    batched.llm = FakeLLM(args.call_ms / 1000, args.token_us / 1e6, args.malformed_every)
+    run("extract_problems (batched)", batched, batched.extract_problems, posts)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Compares the per-post save_posts loop against save_posts_bulk.
+
+Usage (from backend/):
+    python -m benchmarks.bench_ingestion --posts 5000
+    DATABASE_URL=postgresql://... python -m benchmarks.bench_ingestion --posts 20000
+
+Defaults to a throwaway SQLite file when DATABASE_URL is not set.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/bench_ingestion.db"
+
+from database import SessionLocal
+from models import Post, Subreddit
+from ingestion.collector import save_posts, save_posts_bulk
+
+SUBREDDITS = ["startups", "entrepreneur", "saas", "webdev", "marketing", "automation"]
+
+def make_posts(n: int, prefix: str):
+    now = time.time()
+    return [{
+        "id": f"{prefix}{i}",
+        "title": f"Post {i}",
+        "text": "Lorem ipsum dolor sit amet " * 10,
+        "url": f"https://reddit.com/{prefix}{i}",
+        "author": f"user{i % 97}",
+        "score": random.randint(0, 500),
+        "num_comments": random.randint(0, 100),
+        "created_utc": now - random.randint(0, 86400 * 30),
+        "subreddit": SUBREDDITS[i % len(SUBREDDITS)]
+    } for i in range(n)]
+
+def reset(db):
+    db.query(Post).filter(Post.id.like("bench_%")).delete(synchronize_session=False)
+    db.commit()
+
+def timed(label: str, fn, n: int):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<28} {n:>8} rows  {elapsed:8.3f}s  {n / elapsed:10.0f} rows/sec")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--chunk-size", type=int, default=None)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    for name in SUBREDDITS:
+        if not db.query(Subreddit).filter(Subreddit.name == name).first():
+            db.add(Subreddit(name=name, category="Bench"))
+    db.commit()
+
+    loop_posts = make_posts(args.posts, "bench_loop_")
+    bulk_posts = make_posts(args.posts, "bench_bulk_")
+
+    reset(db)
+    print(f"Backend: {db.get_bind().dialect.name}")
+    timed("save_posts (fresh)", lambda: save_posts(db, loop_posts), args.posts)
+    timed("save_posts_bulk (fresh)", lambda: save_posts_bulk(db, bulk_posts, args.chunk_size), args.posts)
+
+    # Re-ingest with half the counters changed, like a second scan of the same listings
+    for p in loop_posts[::2] + bulk_posts[::2]:
+        p["score"] += 1
+    timed("save_posts (rescan)", lambda: save_posts(db, loop_posts), args.posts)
+    timed("save_posts_bulk (rescan)", lambda: save_posts_bulk(db, bulk_posts, args.chunk_size), args.posts)
+
+    reset(db)
+    db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Latency of POST /search on a large problem table (target: well under 100ms at 1M rows).
+
+Loads --rows problems and --clusters clusters (Gaussian blobs around random centers, like real
+embedding clusters) into problem_statements/problem_clusters with COPY, builds the configured
+VECTOR_INDEX_TYPE index, then reports p50/p95/p99 for:
+  - the two ANN queries alone (VectorStore.search_problems + search_clusters, sync session)
+  - the whole endpoint driven in-process (async session, JSON), with query embeddings served from
+    the per-process cache the way repeated searches are; embedding backend latency is not included.
+
+Rows are tagged and deleted afterwards unless --keep (the ANN index is left built); use --skip-load to reuse kept rows.
+Point DATABASE_URL at a scratch Postgres database with pgvector.
+
+Usage (from backend/):
+    python -m benchmarks.bench_search --rows 1000000 --clusters 5000 --queries 500
+    python -m benchmarks.bench_search --skip-load --queries 2000 --concurrency 20
+"""
+import argparse
+import asyncio
+import io
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from ai.vector_index import VectorIndexManager
+from config import settings
+from database import SessionLocal, engine
+from schema import ensure_schema
+
+TAG = "bench_search"
+
+def make_vectors(n: int, centers: np.ndarray, rng) -> np.ndarray:
+    X = centers[rng.integers(0, len(centers), size=n)] + rng.normal(scale=0.3, size=(n, centers.shape[1]))
+    return (X / np.linalg.norm(X, axis=1, keepdims=True)).astype(np.float32)
+
+def literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.5f}" for x in vector) + "]"
+
+def copy_rows(table: str, columns: str, lines):
+    raw = engine.raw_connection()
+    try:
+        buffer = io.StringIO("".join(lines))
+        raw.cursor().copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+        raw.commit()
+    finally:
+        raw.close()
+
+def load(rows: int, clusters: int, centers: np.ndarray, rng, batch: int = 20000):
+    start = time.perf_counter()
+    centroids = make_vectors(clusters, centers, rng)
+    copy_rows("problem_clusters", "name, description, centroid, size, total_validation_score", (
+        f"{TAG} {i}\t{TAG}\t{literal(v)}\t0\t{rng.random() * 100:.3f}\n" for i, v in enumerate(centroids)
+    ))
+    for offset in range(0, rows, batch):
+        vectors = make_vectors(min(batch, rows - offset), centers, rng)
+        copy_rows("problem_statements", "text, original_text_segment, embedding", (
+            f"problem {offset + i}\t{TAG}\t{literal(v)}\n" for i, v in enumerate(vectors)
+        ))
+        print(f"  loaded {offset + len(vectors)}/{rows}", end="\r")
+    print(f"Loaded {rows} problems and {clusters} clusters in {time.perf_counter() - start:.0f}s")
+
+def cleanup():
+    with engine.begin() as conn:
+        conn.execute(text("DELETE FROM problem_statements WHERE original_text_segment = :tag"), {"tag": TAG})
+        conn.execute(text("DELETE FROM problem_clusters WHERE description = :tag"), {"tag": TAG})
+
+def report(label: str, latencies):
+    latencies = np.asarray(latencies)
+    print(
+        f"{label:<26} p50={np.percentile(latencies, 50):7.2f}ms  p95={np.percentile(latencies, 95):7.2f}ms  "
+        f"p99={np.percentile(latencies, 99):7.2f}ms"
+    )
+
+def bench_ann(queries: np.ndarray, limit_problems: int, limit_clusters: int):
+    from ai.vector_store import VectorStore
+
+    latencies = []
+    with SessionLocal() as db:
+        store = VectorStore(db)
+        for q in queries:
+            start = time.perf_counter()
+            store.search_problems(q.tolist(), limit_problems)
+            store.search_clusters(q.tolist(), limit_clusters)
+            latencies.append((time.perf_counter() - start) * 1000)
+            db.rollback() # set_config(..., true) is per transaction, like a request
+    return latencies
+
+async def bench_endpoint(queries: np.ndarray, limit_problems: int, limit_clusters: int, concurrency: int):
+    import httpx
+    from api.main import app
+    from api.search import get_query_embedder
+
+    embedder = get_query_embedder()
+    texts = [f"{TAG} query {i}" for i in range(len(queries))]
+    embedder.entries.update((t, q.tolist()) for t, q in zip(texts, queries)) # Warm cache: no backend calls
+
+    latencies = []
+    pending = iter(texts)
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api") as client:
+        async def worker():
+            for query in pending:
+                start = time.perf_counter()
+                response = await client.post("/search", json={
+                    "query": query, "limit_problems": limit_problems, "limit_clusters": limit_clusters
+                })
+                latencies.append((time.perf_counter() - start) * 1000)
+                response.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return latencies, len(texts) / elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--limit-problems", type=int, default=10)
+    parser.add_argument("--limit-clusters", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--skip-load", action="store_true", help="Reuse rows kept by a previous --keep run")
+    parser.add_argument("--keep", action="store_true", help="Leave the loaded rows in place")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "postgresql":
+        raise SystemExit("bench_search needs DATABASE_URL pointing at Postgres with pgvector.")
+
+    rng = np.random.default_rng(42)
+    centers = rng.normal(size=(max(10, args.clusters), settings.EMBEDDING_DIM))
+
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    ensure_schema(engine)
+
+    try:
+        if not args.skip_load:
+            with SessionLocal() as db:
+                VectorIndexManager(db).build_index("none") # Building once after COPY is much faster
+            load(args.rows, args.clusters, centers, rng)
+            with SessionLocal() as db:
+                start = time.perf_counter()
+                VectorIndexManager(db).build_index()
+                print(f"Built {settings.VECTOR_INDEX_TYPE} index in {time.perf_counter() - start:.0f}s")
+            with engine.begin() as conn:
+                conn.execute(text("ANALYZE problem_statements"))
+                conn.execute(text("ANALYZE problem_clusters"))
+
+        queries = make_vectors(args.queries, centers, np.random.default_rng(7))
+        bench_ann(queries[:min(20, len(queries))], args.limit_problems, args.limit_clusters) # Warm-up
+        report("ANN (problems + clusters)", bench_ann(queries, args.limit_problems, args.limit_clusters))
+
+        latencies, rps = asyncio.run(bench_endpoint(queries, args.limit_problems, args.limit_clusters, args.concurrency))
+        report(f"POST /search (c={args.concurrency})", latencies)
+        print(f"{rps:.0f} requests/s")
+    finally:
+        if not args.keep:
+            cleanup()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+ANN recall/latency against exact search, for HNSW and IVFFlat over a scratch pgvector table.
+
+Vectors are Gaussian blobs around random unit centers (like real embedding clusters). Ground truth
+is exact cosine top-k computed in NumPy; each index setting reports recall@k and p50/p95 latency.
+The scratch table (bench_vectors) is dropped afterwards, problem_statements is never touched.
+
+Usage (from backend/, needs DATABASE_URL pointing at Postgres with pgvector):
+    python -m benchmarks.bench_vector_index --rows 100000 --queries 200 --k 10
+    python -m benchmarks.bench_vector_index --kinds hnsw --ef-search 20 40 100 200
+"""
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from database import engine
+
+TABLE = "bench_vectors"
+
+def make_vectors(n: int, dim: int, centers: int, rng) -> np.ndarray:
+    means = rng.normal(size=(centers, dim)).astype(np.float32)
+    labels = rng.integers(0, centers, size=n)
+    X = means[labels] + rng.normal(scale=0.3, size=(n, dim)).astype(np.float32)
+    return X / np.linalg.norm(X, axis=1, keepdims=True)
+
+def literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+def load(conn, X: np.ndarray, batch: int = 1000):
+    conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+    conn.execute(text(f"CREATE TABLE {TABLE} (id integer PRIMARY KEY, embedding vector({X.shape[1]}))"))
+    for start in range(0, len(X), batch):
+        conn.execute(
+            text(f"INSERT INTO {TABLE} (id, embedding) VALUES (:id, CAST(:embedding AS vector))"),
+            [{"id": start + i, "embedding": literal(v)} for i, v in enumerate(X[start:start + batch])]
+        )
+    conn.commit()
+
+def run_queries(conn, queries: np.ndarray, k: int, settings_sql: list):
+    latencies, results = [], []
+    for q in queries:
+        with conn.begin():
+            for statement in settings_sql:
+                conn.execute(text(statement))
+            start = time.perf_counter()
+            ids = conn.execute(
+                text(f"SELECT id FROM {TABLE} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"),
+                {"q": literal(q), "k": k}
+            ).scalars().all()
+            latencies.append((time.perf_counter() - start) * 1000)
+        results.append(ids)
+    return results, np.array(latencies)
+
+def report(label: str, results, truth: np.ndarray, latencies: np.ndarray, k: int):
+    recall = np.mean([len(set(r) & set(t.tolist())) / k for r, t in zip(results, truth)])
+    print(f"{label:<28} recall@{k}={recall:6.3f}  p50={np.percentile(latencies, 50):8.2f}ms  p95={np.percentile(latencies, 95):8.2f}ms")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--kinds", nargs="+", default=["hnsw", "ivfflat"], choices=["hnsw", "ivfflat"])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[20, 40, 100, 200])
+    parser.add_argument("--probes", type=int, nargs="+", default=[1, 5, 10, 20])
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(42)
+    X = make_vectors(args.rows, args.dim, centers=max(10, args.rows // 500), rng=rng)
+    queries = make_vectors(args.queries, args.dim, centers=max(10, args.rows // 500), rng=np.random.default_rng(7))
+    truth = np.argsort(-(queries @ X.T), axis=1)[:, :args.k]
+
+    with engine.connect() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        start = time.perf_counter()
+        load(conn, X)
+        print(f"Loaded {args.rows} x {args.dim} vectors in {time.perf_counter() - start:.1f}s")
+
+        try:
+            results, latencies = run_queries(conn, queries, args.k, ["SET LOCAL enable_indexscan = off"])
+            report("exact (seq scan)", results, truth, latencies, args.k)
+
+            for kind in args.kinds:
+                conn.execute(text(f"DROP INDEX IF EXISTS {TABLE}_ann"))
+                params = "m = 16, ef_construction = 64" if kind == "hnsw" else f"lists = {max(10, args.rows // 1000)}"
+                start = time.perf_counter()
+                conn.execute(text("SET maintenance_work_mem = '1GB'"))
+                conn.execute(text(f"CREATE INDEX {TABLE}_ann ON {TABLE} USING {kind} (embedding vector_cosine_ops) WITH ({params})"))
+                conn.commit()
+                print(f"Built {kind} ({params}) in {time.perf_counter() - start:.1f}s")
+
+                knob, values = ("hnsw.ef_search", args.ef_search) if kind == "hnsw" else ("ivfflat.probes", args.probes)
+                for value in values:
+                    results, latencies = run_queries(conn, queries, args.k, [f"SET LOCAL {knob} = {int(value)}"])
+                    report(f"{kind} {knob}={value}", results, truth, latencies, args.k)
+        finally:
+            conn.rollback()
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+            conn.commit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Load test for the read API: N concurrent clients issuing GET /clusters (first pages and cursor
+pages) and GET /clusters/{id}, reporting p50/p99 latency and requests per second.
+
+Without --url the app is driven in-process (httpx ASGI transport, no network) against a seeded
+throwaway SQLite database, or against DATABASE_URL if set (it must already have the schema; seeding
+adds --clusters rows). The response cache is disabled unless --cache is given, so the numbers
+reflect the database path. For before/after comparisons run the same command on both revisions.
+
+Usage (from backend/):
+    python -m benchmarks.load_test_api --clusters 2000 --requests 5000 --concurrency 50
+    python -m benchmarks.load_test_api --url http://localhost:8000 --requests 20000 --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+
+if "DATABASE_URL" not in os.environ:
+    os.environ["DATABASE_URL"] = f"sqlite:///{tempfile.mkdtemp()}/load_test_api.db"
+
+def seed(clusters: int, ideas_per_cluster: int):
+    from database import SessionLocal, engine
+    from models import ProblemCluster, GeneratedIdea
+    from schema import ensure_schema
+    from sqlalchemy import insert
+
+    ensure_schema(engine)
+    rng = random.Random(0)
+    with SessionLocal() as db:
+        ids = db.execute(insert(ProblemCluster).returning(ProblemCluster.id), [{
+            "name": f"Load test cluster {i}",
+            "description": "Users keep running into the same problem. " * 20,
+            "frequency_score": rng.random() * 100,
+            "intensity_score": rng.random() * 100,
+            "engagement_score": rng.random() * 100,
+            "recency_score": rng.random() * 100,
+            "total_validation_score": round(rng.random() * 100, 1) # Ties exercise the (score, id) keyset
+        } for i in range(clusters)]).scalars().all()
+        db.execute(insert(GeneratedIdea), [{
+            "cluster_id": cluster_id,
+            "title": f"Idea {j}",
+            "description": "A tool that fixes it. " * 10,
+            "solution_type": "SaaS",
+            "monetization_strategy": "Subscription",
+            "technical_complexity": "Medium",
+            "market_size_estimate": "Unknown"
+        } for cluster_id in ids for j in range(ideas_per_cluster)])
+        db.commit()
+    return ids
+
+async def run(client, cluster_ids, requests: int, concurrency: int, page_size: int):
+    latencies, errors = [], 0
+    cursors = []
+    remaining = iter(range(requests))
+    rng = random.Random(1)
+
+    async def one():
+        nonlocal errors
+        roll = rng.random()
+        if roll < 0.4 or not cursors:
+            path, params = "/clusters", {"limit": page_size}
+        elif roll < 0.7:
+            path, params = "/clusters", {"limit": page_size, "cursor": rng.choice(cursors)}
+        else:
+            path, params = f"/clusters/{rng.choice(cluster_ids)}", {}
+        start = time.perf_counter()
+        response = await client.get(path, params=params)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            errors += 1
+        elif "x-next-cursor" in response.headers and len(cursors) < 1000:
+            cursors.append(response.headers["x-next-cursor"])
+
+    async def worker():
+        for _ in remaining:
+            await one()
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return np.array(latencies), errors, time.perf_counter() - start
+
+async def main_async(args):
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=30, limits=httpx.Limits(max_connections=args.concurrency))
+        cluster_ids = list(range(1, args.clusters + 1))
+    else:
+        cluster_ids = seed(args.clusters, args.ideas)
+        from api.main import app
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://api", timeout=30)
+
+    async with client:
+        await run(client, cluster_ids, min(200, args.requests), args.concurrency, args.page_size) # Warm-up
+        latencies, errors, elapsed = await run(client, cluster_ids, args.requests, args.concurrency, args.page_size)
+
+    print(
+        f"{args.requests} requests, concurrency {args.concurrency}: "
+        f"p50={np.percentile(latencies, 50):.2f}ms  p99={np.percentile(latencies, 99):.2f}ms  "
+        f"rps={args.requests / elapsed:.0f}  errors={errors}"
+    )
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="", help="Running API to test; default drives the app in-process")
+    parser.add_argument("--clusters", type=int, default=1000, help="Rows to seed; with --url, ids 1..N are requested")
+    parser.add_argument("--ideas", type=int, default=3)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--page-size", type=int, default=50)
+    parser.add_argument("--cache", action="store_true", help="Keep the response cache enabled")
+    args = parser.parse_args()
+    if not args.cache:
+        os.environ["API_CACHE_BACKEND"] = "none" # Before config is first imported
+    asyncio.run(main_async(args))
+
+if __name__ == "__main__":
+    main()
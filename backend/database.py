@@ -1,10 +1,48 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, select, update, values, column, cast
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from config import settings
+from typing import Any, Dict, List, Optional, Tuple
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = settings.DATABASE_URL
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+ASYNC_DRIVERS = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+# libpq query parameters asyncpg understands, under its own name; the rest are dropped from the async URL
+ASYNCPG_PARAMS = {"sslmode": "ssl", "host": "host", "port": "port", "target_session_attrs": "target_session_attrs"}
+
+def pool_options(url: str) -> Dict[str, Any]:
+    if make_url(url).get_backend_name() == "sqlite":
+        return {} # SQLite uses its own single-file pools
+    return {
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+
+def async_database_url() -> str:
+    """
+    ASYNC_DATABASE_URL, or DATABASE_URL with its driver swapped for the async one.
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    url = url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername))
+    if url.get_backend_name() == "postgresql" and url.query:
+        # asyncpg takes the query string as connect() keyword arguments and rejects libpq-only ones
+        dropped = sorted(set(url.query) - set(ASYNCPG_PARAMS))
+        if dropped:
+            logger.warning(f"Dropped {', '.join(dropped)} from the async database URL; set ASYNC_DATABASE_URL to keep them.")
+        url = url.set(query={ASYNCPG_PARAMS[key]: value for key, value in url.query.items() if key in ASYNCPG_PARAMS})
+    return url.render_as_string(hide_password=False)
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **pool_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -15,3 +53,91 @@ def get_db():
         yield db
     finally:
         db.close()
+
+_async_engine = None
+_async_session_factory: Optional[async_sessionmaker] = None
+_async_lock = threading.Lock()
+
+def get_async_engine():
+    """
+    Engine for the API, created on first use so pipeline processes don't need the async driver.
+    API_STATEMENT_TIMEOUT_MS is applied per connection on Postgres.
+    """
+    global _async_engine, _async_session_factory
+    with _async_lock:
+        if _async_engine is None:
+            url = async_database_url()
+            connect_args = {}
+            if make_url(url).get_backend_name() == "postgresql" and settings.API_STATEMENT_TIMEOUT_MS:
+                connect_args["server_settings"] = {"statement_timeout": str(int(settings.API_STATEMENT_TIMEOUT_MS))}
+            _async_engine = create_async_engine(url, connect_args=connect_args, **pool_options(url))
+            if make_url(url).get_backend_name() == "postgresql":
+                event.listen(_async_engine.sync_engine, "connect", _register_vector_codecs)
+            _async_session_factory = async_sessionmaker(_async_engine, autoflush=False, expire_on_commit=False)
+        return _async_engine
+
+async def _vector_codecs(conn):
+    from pgvector.utils import Vector, HalfVector
+    for name, cls in (("vector", Vector), ("halfvec", HalfVector)):
+        try:
+            # Text format: the SQLAlchemy types already bind pgvector's text literal, which the binary
+            # codec of pgvector.asyncpg.register_vector would have to parse again on every query
+            await conn.set_type_codec(
+                name,
+                encoder=lambda value, cls=cls: value if isinstance(value, str) else cls._to_db(value),
+                decoder=cls._from_db,
+                format="text"
+            )
+        except ValueError as e:
+            if not str(e).startswith("unknown type:"): # halfvec needs pgvector 0.7
+                raise
+
+def _register_vector_codecs(dbapi_connection, connection_record):
+    """
+    pgvector's codecs on each asyncpg connection, so vectors bind from lists/arrays and come back as
+    NumPy arrays on any query, not only through the SQLAlchemy column types.
+    """
+    dbapi_connection.run_async(_vector_codecs)
+
+async def get_async_db():
+    get_async_engine()
+    async with _async_session_factory() as db:
+        yield db
+
+def values_cte(name: str, columns: List[Tuple[str, Any]], rows: List[tuple]):
+    """
+    Rows as a VALUES list in a MATERIALIZED CTE, each (name, type) column cast back to its type once
+    per row. Postgres only; used to turn per-row lookups into one LATERAL join.
+    """
+    data = values(*[column(col, col_type) for col, col_type in columns], name=f"{name}_values").data(rows)
+    # VALUES columns are untyped; materializing keeps the cast from being repeated per comparison
+    return (
+        select(*[cast(data.c[col], col_type).label(col) for col, col_type in columns])
+        .cte(name).prefix_with("MATERIALIZED")
+    )
+
+def bulk_update(db, model, rows: List[Dict[str, Any]], chunk_size: int = 10000):
+    """
+    Updates many rows by primary key ("id") without committing.
+    Postgres gets one UPDATE ... FROM (VALUES ...) per chunk; other dialects an executemany.
+    """
+    if not rows:
+        return
+
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(update(model), rows)
+        return
+
+    table = model.__table__
+    names = list(rows[0].keys())
+    for start in range(0, len(rows), chunk_size):
+        data = values(*[column(name, table.c[name].type) for name in names], name="data").data(
+            [tuple(row[name] for name in names) for row in rows[start:start + chunk_size]]
+        )
+        db.execute(
+            update(model)
+            .where(table.c.id == data.c.id)
+            # VALUES columns are untyped (NULLs resolve to text), so cast back to the target type
+            .values({name: cast(data.c[name], table.c[name].type) for name in names if name != "id"})
+            .execution_options(synchronize_session=False)
+        )
@@ -0,0 +1,32 @@
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import IntegrityError
+from models import DataGeneration
+
+CLUSTERS = "clusters" # Scores, membership and ideas behind the read API
+
+def bump_generation(db: Session, name: str = CLUSTERS):
+    """
+    Marks derived data as changed. Call inside the transaction that changes it, before its commit,
+    so readers never see new data under an old generation. Does not commit.
+    """
+    bumped = db.execute(
+        update(DataGeneration).where(DataGeneration.name == name)
+        .values(generation=DataGeneration.generation + 1)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if bumped:
+        return
+    try:
+        with db.begin_nested():
+            db.execute(insert(DataGeneration).values(name=name, generation=1))
+    except IntegrityError:
+        # Another writer created the row first
+        bump_generation(db, name)
+
+def get_generation(db: Session, name: str = CLUSTERS) -> int:
+    return db.execute(select(DataGeneration.generation).where(DataGeneration.name == name)).scalar() or 0
+
+async def get_generation_async(db: AsyncSession, name: str = CLUSTERS) -> int:
+    return (await db.execute(select(DataGeneration.generation).where(DataGeneration.name == name))).scalar() or 0
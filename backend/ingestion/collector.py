@@ -1,13 +1,19 @@
 import asyncio
 from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, update, tuple_
 from database import SessionLocal, engine
-from models import Base, Post, Subreddit
-from ingestion.reddit_client import RedditClient
+from models import Post, Subreddit, ProblemStatement, ProblemCluster, DuplicateLink, PostSignatureBand
+from ingestion.scheduler import ConcurrentFetcher
+from ingestion.cursors import CursorStore
+from ingestion.dedupe import MinHashIndex, minhash, band_values, to_bytes, from_bytes
+from schema import ensure_schema
+from config import settings
+from typing import Dict, List, Optional, Tuple
 import logging
 from datetime import datetime
 
-# Build DB tables if they don't exist
-Base.metadata.create_all(bind=engine)
+# Build DB tables if they don't exist and add columns/indexes missing from existing ones
+ensure_schema(engine)
 
 logger = logging.getLogger(__name__)
 
@@ -64,9 +70,206 @@ def save_posts(db: Session, posts_data: list):
     db.commit()
     logger.info(f"Saved {new_count} new posts to database.")
 
+def resolve_subreddit_ids(db: Session, names: List[str]) -> Dict[str, int]:
+    """
+    Maps subreddit names to IDs with one SELECT, creating any missing ones in a single INSERT.
+    """
+    names = set(names)
+    if not names:
+        return {}
+
+    rows = db.execute(select(Subreddit.name, Subreddit.id).where(Subreddit.name.in_(names))).all()
+    ids = {name: sub_id for name, sub_id in rows}
+
+    missing = names - ids.keys()
+    if missing:
+        # We should have created them, but just in case
+        db.execute(insert(Subreddit), [{"name": name, "category": "Unknown"} for name in missing])
+        rows = db.execute(select(Subreddit.name, Subreddit.id).where(Subreddit.name.in_(missing))).all()
+        ids.update({name: sub_id for name, sub_id in rows})
+
+    return ids
+
+def mark_clusters_dirty(db: Session, post_ids: List[str]):
+    """
+    Flags the clusters holding problems from these posts for the next scoring pass.
+    """
+    db.execute(
+        update(ProblemCluster)
+        .where(ProblemCluster.id.in_(
+            select(ProblemStatement.cluster_id).where(ProblemStatement.post_id.in_(post_ids))
+        ))
+        .values(is_dirty=True)
+        .execution_options(synchronize_session=False)
+    )
+
+def match_duplicate_posts(db: Session, new_rows: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+    """
+    Fingerprints new post rows in place (MinHash) and finds the ones whose estimated similarity to a stored
+    post, or to an earlier row in the batch, reaches POST_DEDUPE_MIN_SIMILARITY.
+    Stored candidates come from one lookup on the indexed (band, value) table, so the check is sub-linear.
+    Duplicates are saved as already processed (they never reach the LLM) and get no bands.
+    Returns (DuplicateLink rows, PostSignatureBand rows for the new canonical posts).
+    """
+    signatures = {}
+    for row in new_rows:
+        signature = minhash(f"{row['title'] or ''}\n{row['text'] or ''}", settings.POST_DEDUPE_MIN_TOKENS)
+        row["minhash"] = to_bytes(signature) if signature is not None else None
+        if signature is not None:
+            signatures[row["id"]] = signature
+    if not signatures:
+        return [], []
+
+    pairs = {(band, value) for signature in signatures.values() for band, value in enumerate(band_values(signature))}
+    candidate_ids = select(PostSignatureBand.post_id).where(
+        tuple_(PostSignatureBand.band, PostSignatureBand.value).in_(list(pairs))
+    )
+    index = MinHashIndex(settings.POST_DEDUPE_MIN_SIMILARITY)
+    index.add_all(
+        (row.id, from_bytes(row.minhash))
+        for row in db.execute(select(Post.id, Post.minhash).where(Post.id.in_(candidate_ids), Post.minhash != None))
+    )
+
+    links, band_rows = [], []
+    for row in new_rows:
+        signature = signatures.get(row["id"])
+        if signature is None:
+            continue
+        match = index.find(signature)
+        if match is None:
+            index.add(row["id"], signature)
+            band_rows.extend(
+                {"post_id": row["id"], "band": band, "value": value}
+                for band, value in enumerate(band_values(signature))
+            )
+            continue
+
+        canonical_id, score = match
+        row["is_processed"] = True
+        links.append({
+            "kind": "post",
+            "duplicate_post_id": row["id"],
+            "canonical_post_id": canonical_id,
+            "similarity": score
+        })
+    return links, band_rows
+
+def save_posts_bulk(db: Session, posts_data: list, chunk_size: Optional[int] = None) -> Dict[str, int]:
+    """
+    Set-based variant of save_posts.
+    Each chunk costs one SELECT to dedupe against the DB, one multi-row INSERT for new posts
+    and one executemany UPDATE refreshing score/num_comments on posts whose counters changed
+    (plus one UPDATE marking their clusters dirty for rescoring).
+    New posts that are near-duplicates of known ones are linked to them (see match_duplicate_posts).
+    Returns inserted/updated/skipped counts.
+    """
+    chunk_size = chunk_size or settings.INGEST_CHUNK_SIZE
+    counts = {"inserted": 0, "updated": 0, "skipped": 0, "duplicates": 0}
+
+    # Listings overlap (a post can be both hot and top), keep the last copy of each id
+    unique_posts = {}
+    for post_dict in posts_data:
+        if post_dict["id"] in unique_posts:
+            counts["skipped"] += 1
+        unique_posts[post_dict["id"]] = post_dict
+    posts = list(unique_posts.values())
+
+    subreddit_ids = resolve_subreddit_ids(db, [p["subreddit"] for p in posts])
+
+    for start in range(0, len(posts), chunk_size):
+        chunk = posts[start:start + chunk_size]
+
+        existing = {
+            row.id: row for row in db.execute(
+                select(Post.id, Post.score, Post.num_comments).where(Post.id.in_([p["id"] for p in chunk]))
+            )
+        }
+
+        new_rows = []
+        changed_rows = []
+        for post_dict in chunk:
+            current = existing.get(post_dict["id"])
+            if current is None:
+                new_rows.append({
+                    "id": post_dict["id"],
+                    "subreddit_id": subreddit_ids[post_dict["subreddit"]],
+                    "title": post_dict["title"],
+                    "text": post_dict["text"],
+                    "url": post_dict["url"],
+                    "author": post_dict["author"],
+                    "score": post_dict["score"],
+                    "num_comments": post_dict["num_comments"],
+                    "created_utc": datetime.fromtimestamp(post_dict["created_utc"]),
+                    "is_processed": False
+                })
+            elif current.score != post_dict["score"] or current.num_comments != post_dict["num_comments"]:
+                changed_rows.append({
+                    "id": post_dict["id"],
+                    "score": post_dict["score"],
+                    "num_comments": post_dict["num_comments"]
+                })
+            else:
+                counts["skipped"] += 1
+
+        if new_rows:
+            links, band_rows = match_duplicate_posts(db, new_rows)
+            db.execute(insert(Post), new_rows)
+            if band_rows:
+                db.execute(insert(PostSignatureBand), band_rows)
+            if links:
+                db.execute(insert(DuplicateLink), links)
+                mark_clusters_dirty(db, [link["canonical_post_id"] for link in links])
+                counts["duplicates"] += len(links)
+        if changed_rows:
+            # ORM bulk UPDATE by primary key -> a single executemany
+            db.execute(update(Post), changed_rows)
+            # Engagement feeds the cluster score: flag the affected clusters for the next scoring pass
+            mark_clusters_dirty(db, [row["id"] for row in changed_rows])
+
+        counts["inserted"] += len(new_rows)
+        counts["updated"] += len(changed_rows)
+
+    db.commit()
+    logger.info(
+        f"Bulk saved posts: {counts['inserted']} inserted ({counts['duplicates']} duplicates), "
+        f"{counts['updated']} updated, {counts['skipped']} skipped."
+    )
+    return counts
+
+async def scan_subreddits(db: Session, subreddit_names: List[str], filters: List[str] = ["new", "hot", "top"], limit: int = 50):
+    """
+    Fetches every due (subreddit, listing) pair concurrently and saves each listing as soon as it arrives.
+    CursorStore decides what is due: "new" pages back to the last watermark, "hot"/"top" only
+    refresh engagement counters once their cursor is older than ENGAGEMENT_REFRESH_MINUTES.
+    """
+    cursors = CursorStore(db)
+    planned = cursors.plan(subreddit_names, filters, limit)
+    if not planned:
+        return
+
+    subreddit_ids = resolve_subreddit_ids(db, subreddit_names)
+    fetcher = ConcurrentFetcher()
+    scanned = set()
+
+    async for sub_name, filter_type, posts in fetcher.fetch_all(planned):
+        if posts is None:
+            continue
+
+        logger.info(f"Fetched {len(posts)} posts from r/{sub_name} ({filter_type})")
+        cursors.advance(subreddit_ids[sub_name], filter_type, posts)
+        # Commits the cursor together with the posts it covers
+        save_posts_bulk(db, posts)
+        scanned.add(sub_name)
+
+    # Update last_scanned
+    if scanned:
+        db.execute(
+            update(Subreddit).where(Subreddit.name.in_(scanned)).values(last_scanned_at=datetime.now())
+        )
+        db.commit()
+
 def main():
     db = SessionLocal()
-    client = RedditClient()
     
     # 1. Initialize Subreddits
     for sub in TARGET_SUBREDDITS:
@@ -77,16 +280,7 @@ def main():
     db.commit()
     
     # 2. Fetch & Save
-    for sub in TARGET_SUBREDDITS:
-        logger.info(f"Scanning r/{sub['name']}...")
-        posts = client.get_posts(sub["name"], limit=50, filters=["hot", "top"])
-        save_posts(db, posts)
-        
-        # Update last_scanned
-        db_sub = db.query(Subreddit).filter(Subreddit.name == sub["name"]).first()
-        if db_sub:
-            db_sub.last_scanned_at = datetime.now()
-            db.commit()
+    asyncio.run(scan_subreddits(db, [sub["name"] for sub in TARGET_SUBREDDITS]))
 
     db.close()
 
@@ -0,0 +1,85 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from models import CrawlCursor, Subreddit
+from config import settings
+from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CursorStore:
+    """
+    Per-subreddit, per-listing crawl cursors.
+    "new" is paged only back to the newest post seen last time; "hot"/"top" exist to refresh
+    engagement counters on known posts, so they are re-fetched at most every ENGAGEMENT_REFRESH_MINUTES.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+
+    def load(self, subreddit_names: List[str]) -> Dict[Tuple[str, str], CrawlCursor]:
+        rows = self.db.execute(
+            select(Subreddit.name, CrawlCursor)
+            .join(CrawlCursor, CrawlCursor.subreddit_id == Subreddit.id)
+            .where(Subreddit.name.in_(subreddit_names))
+        ).all()
+        return {(name, cursor.listing): cursor for name, cursor in rows}
+
+    def plan(
+        self,
+        subreddit_names: List[str],
+        filters: List[str],
+        limit: int
+    ) -> List[Tuple[str, str, int, Optional[float]]]:
+        """
+        Returns (subreddit, listing, limit, since_utc) for every listing that is due.
+        """
+        cursors = self.load(subreddit_names)
+        refresh_before = datetime.now(timezone.utc) - timedelta(minutes=settings.ENGAGEMENT_REFRESH_MINUTES)
+
+        planned = []
+        for name in subreddit_names:
+            for filter_type in filters:
+                cursor = cursors.get((name, filter_type))
+
+                if filter_type == "new":
+                    if cursor and cursor.last_created_utc:
+                        planned.append((name, filter_type, settings.NEW_LISTING_MAX_ITEMS, _to_epoch(cursor.last_created_utc)))
+                    else:
+                        # First scan: don't backfill the whole history
+                        planned.append((name, filter_type, limit, None))
+                    continue
+
+                if cursor and cursor.last_fetched_at and _as_utc(cursor.last_fetched_at) > refresh_before:
+                    continue
+                planned.append((name, filter_type, limit, None))
+
+        skipped = len(subreddit_names) * len(filters) - len(planned)
+        logger.info(f"Planned {len(planned)} listing fetches ({skipped} still fresh).")
+        return planned
+
+    def advance(self, subreddit_id: int, listing: str, posts: List[Dict[str, Any]]):
+        """
+        Moves the cursor forward after a successful fetch. Does not commit.
+        """
+        cursor = self.db.query(CrawlCursor).filter(
+            CrawlCursor.subreddit_id == subreddit_id, CrawlCursor.listing == listing
+        ).first()
+        if not cursor:
+            cursor = CrawlCursor(subreddit_id=subreddit_id, listing=listing)
+            self.db.add(cursor)
+
+        cursor.last_fetched_at = datetime.now(timezone.utc)
+        if posts:
+            newest = max(posts, key=lambda p: p["created_utc"])
+            newest_utc = datetime.fromtimestamp(newest["created_utc"], tz=timezone.utc)
+            if cursor.last_created_utc is None or newest_utc > _as_utc(cursor.last_created_utc):
+                cursor.last_created_utc = newest_utc
+                cursor.last_fullname = newest.get("fullname")
+
+def _as_utc(value: datetime) -> datetime:
+    # SQLite drops tzinfo on the way back
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+def _to_epoch(value: datetime) -> float:
+    return _as_utc(value).timestamp()
@@ -0,0 +1,89 @@
+import hashlib
+import re
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Tuple
+
+NUM_PERM = 32
+BANDS = 8 # LSH: 8 bands x 4 rows, pairs above ~0.6 Jaccard share at least one band with high probability
+ROWS_PER_BAND = NUM_PERM // BANDS
+SHINGLE_SIZE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+# Fixed permutations so signatures stay comparable across runs; < 2^31 keeps a * h + b inside uint64
+_PERM_A = _rng.randint(1, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 31, size=NUM_PERM, dtype=np.uint64)
+
+_TOKEN_RE = re.compile(r"\w+")
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+def minhash(text: str, min_tokens: int = 10) -> Optional[np.ndarray]:
+    """
+    MinHash signature (NUM_PERM uint32 values) over word 3-gram shingles; matching positions estimate
+    the Jaccard similarity of two texts. None for texts too short to fingerprint reliably.
+    """
+    tokens = tokenize(text)
+    if len(tokens) < min_tokens:
+        return None
+
+    shingles = {" ".join(tokens[i:i + SHINGLE_SIZE]) for i in range(len(tokens) - SHINGLE_SIZE + 1)}
+    hashes = np.frombuffer(
+        b"".join(hashlib.blake2b(s.encode(), digest_size=4).digest() for s in shingles), dtype=np.uint32
+    ).astype(np.uint64)
+    permuted = (np.outer(hashes, _PERM_A) + _PERM_B) % _MERSENNE_PRIME & _MAX_HASH
+    return permuted.min(axis=0).astype(np.uint32)
+
+def to_bytes(signature: np.ndarray) -> bytes:
+    return signature.astype("<u4").tobytes()
+
+def from_bytes(data: bytes) -> np.ndarray:
+    return np.frombuffer(data, dtype="<u4")
+
+def band_values(signature: np.ndarray) -> List[int]:
+    """
+    One signed 32-bit value per LSH band, for the indexed (band, value) lookup table.
+    """
+    values = []
+    for band in range(BANDS):
+        chunk = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].astype("<u4").tobytes()
+        values.append(int.from_bytes(hashlib.blake2b(chunk, digest_size=4).digest(), "little", signed=True))
+    return values
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Estimated Jaccard similarity of the shingle sets behind two signatures.
+    """
+    return float(np.mean(a == b))
+
+class MinHashIndex:
+    """
+    In-memory LSH index for matching a batch against itself and against candidates loaded from the DB.
+    """
+    def __init__(self, min_similarity: float):
+        self.min_similarity = min_similarity
+        self.signatures: Dict[str, np.ndarray] = {}
+        self.buckets: Dict[Tuple[int, int], List[str]] = {}
+
+    def add(self, key: str, signature: np.ndarray):
+        self.signatures[key] = signature
+        for band, value in enumerate(band_values(signature)):
+            self.buckets.setdefault((band, value), []).append(key)
+
+    def add_all(self, items: Iterable[Tuple[str, np.ndarray]]):
+        for key, signature in items:
+            self.add(key, signature)
+
+    def find(self, signature: np.ndarray) -> Optional[Tuple[str, float]]:
+        """
+        Most similar indexed (key, similarity) at or above min_similarity, or None.
+        """
+        best = None
+        candidates = {key for band, value in enumerate(band_values(signature)) for key in self.buckets.get((band, value), ())}
+        for key in candidates:
+            score = similarity(signature, self.signatures[key])
+            if score >= self.min_similarity and (best is None or score > best[1]):
+                best = (key, score)
+        return best
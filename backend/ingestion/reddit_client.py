@@ -1,6 +1,6 @@
 import praw
 import time
-from typing import List, Dict, Any
+from typing import Callable, List, Dict, Any, Optional
 from config import settings
 import logging
 
@@ -9,6 +9,8 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class RedditClient:
+    PAGE_SIZE = 100 # Items per listing request
+
     def __init__(self):
         if not settings.REDDIT_CLIENT_ID or not settings.REDDIT_CLIENT_SECRET:
             logger.warning("Reddit API credentials not set. Ingestion will fail.")
@@ -19,39 +21,72 @@ class RedditClient:
             user_agent=settings.REDDIT_USER_AGENT
         )
 
+    def fetch_listing(
+        self,
+        subreddit_name: str,
+        filter_type: str,
+        limit: int = 50,
+        since_utc: Optional[float] = None,
+        before_page: Optional[Callable[[], None]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Fetches a single listing ("hot", "top" or "new") from a subreddit.
+        For "new", `since_utc` stops paging at the first post older than the watermark,
+        so PRAW never requests the following pages.
+        `before_page` is called before each page request (e.g. to take a rate-limit token).
+        Unlike get_posts, API errors (e.g. prawcore.exceptions.TooManyRequests) are raised to the caller.
+        """
+        subreddit = self.reddit.subreddit(subreddit_name)
+        if filter_type == "hot":
+            posts = subreddit.hot(limit=limit)
+        elif filter_type == "top":
+            posts = subreddit.top(time_filter="week", limit=limit)
+        elif filter_type == "new":
+            posts = subreddit.new(limit=limit)
+        else:
+            return []
+
+        posts_data = []
+        seen = 0
+        while True:
+            # PRAW requests the listing in pages of up to 100 as iteration reaches them
+            if before_page is not None and seen % self.PAGE_SIZE == 0 and seen < limit:
+                before_page()
+            post = next(posts, None)
+            if post is None:
+                break
+            seen += 1
+
+            # "new" is ordered by creation time, everything past this point is already known
+            if since_utc is not None and filter_type == "new" and post.created_utc < since_utc:
+                break
+
+            if post.stickied:
+                continue
+
+            posts_data.append({
+                "id": post.id,
+                "fullname": post.name,
+                "title": post.title,
+                "text": post.selftext,
+                "url": post.url,
+                "author": str(post.author),
+                "score": post.score,
+                "num_comments": post.num_comments,
+                "created_utc": post.created_utc,
+                "subreddit": subreddit_name
+            })
+        return posts_data
+
     def get_posts(self, subreddit_name: str, limit: int = 50, filters: List[str] = ["hot", "top"]) -> List[Dict[str, Any]]:
         """
         Fetches posts from a subreddit using specified filters.
         """
-        subreddit = self.reddit.subreddit(subreddit_name)
         posts_data = []
         
         try:
             for filter_type in filters:
-                if filter_type == "hot":
-                    posts = subreddit.hot(limit=limit)
-                elif filter_type == "top":
-                    posts = subreddit.top(time_filter="week", limit=limit)
-                elif filter_type == "new":
-                    posts = subreddit.new(limit=limit)
-                else:
-                    continue
-
-                for post in posts:
-                    if post.stickied:
-                        continue
-                    
-                    posts_data.append({
-                        "id": post.id,
-                        "title": post.title,
-                        "text": post.selftext,
-                        "url": post.url,
-                        "author": str(post.author),
-                        "score": post.score,
-                        "num_comments": post.num_comments,
-                        "created_utc": post.created_utc,
-                        "subreddit": subreddit_name
-                    })
+                posts_data.extend(self.fetch_listing(subreddit_name, filter_type, limit))
             
             logger.info(f"Fetched {len(posts_data)} posts from r/{subreddit_name}")
             return posts_data
@@ -60,9 +95,11 @@ class RedditClient:
             logger.error(f"Error fetching from r/{subreddit_name}: {e}")
             return []
 
-    def check_limits(self):
+    def check_limits(self) -> Dict[str, Any]:
         """
-        Logs rate limit status.
+        Logs and returns rate limit status (remaining, used, reset_timestamp).
+        Values are None until the first API request has been made.
         """
         limits = self.reddit.auth.limits
         logger.info(f"Rate Limits: {limits}")
+        return limits
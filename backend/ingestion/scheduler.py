@@ -0,0 +1,158 @@
+import asyncio
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from prawcore.exceptions import TooManyRequests, ServerError, RequestException
+from ingestion.reddit_client import RedditClient
+from config import settings
+import logging
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """
+    Async token bucket. Refills at `rate` tokens/sec up to `capacity`.
+    The rate is re-derived from the budget Reddit reports, and a 429 freezes the bucket until Retry-After.
+    """
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0.0
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self, tokens: float = 1.0):
+        # A request larger than the bucket would otherwise wait forever
+        tokens = min(tokens, self.capacity)
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self._refill()
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+    def pause(self, seconds: float):
+        """
+        Stops handing out tokens for `seconds` and drains the bucket (used on 429).
+        """
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+    def update_budget(self, limits: Optional[Dict[str, Any]]):
+        """
+        Slows the refill rate down when the remaining server-side budget can't sustain it until reset.
+        """
+        if not limits or limits.get("remaining") is None or not limits.get("reset_timestamp"):
+            return
+
+        seconds_to_reset = max(limits["reset_timestamp"] - time.time(), 1.0)
+        remaining = max(limits["remaining"], 0.0)
+        if remaining < 1:
+            logger.warning(f"Reddit budget exhausted, pausing {seconds_to_reset:.0f}s until reset.")
+            self.pause(seconds_to_reset)
+            return
+
+        configured = settings.REDDIT_REQUESTS_PER_MINUTE / 60.0
+        self._refill()
+        self.rate = min(configured, remaining / seconds_to_reset)
+
+class ConcurrentFetcher:
+    """
+    Fetches many (subreddit, listing) pairs in parallel while staying inside the Reddit rate budget.
+    PRAW is blocking and not thread-safe, so each worker thread borrows its own RedditClient from a pool.
+    """
+    def __init__(
+        self,
+        max_concurrency: Optional[int] = None,
+        requests_per_minute: Optional[float] = None,
+        client_factory: Callable[[], RedditClient] = RedditClient
+    ):
+        self.max_concurrency = max_concurrency or settings.REDDIT_MAX_CONCURRENCY
+        rate = (requests_per_minute or settings.REDDIT_REQUESTS_PER_MINUTE) / 60.0
+        self.bucket = TokenBucket(rate=rate, capacity=max(1.0, float(self.max_concurrency)))
+        self.client_factory = client_factory
+        self.max_retries = settings.REDDIT_MAX_RETRIES
+
+    async def _fetch_one(
+        self,
+        clients: asyncio.Queue,
+        executor: ThreadPoolExecutor,
+        subreddit_name: str,
+        filter_type: str,
+        limit: int,
+        since_utc: Optional[float]
+    ) -> Tuple[str, str, Optional[List[Dict[str, Any]]]]:
+        loop = asyncio.get_running_loop()
+
+        def acquire_page():
+            # Called from the fetch thread before each page request, so a "new" listing that pages far
+            # back to its watermark is charged for every request it actually makes
+            asyncio.run_coroutine_threadsafe(self.bucket.acquire(1), loop).result()
+
+        for attempt in range(self.max_retries + 1):
+            client = await clients.get()
+            try:
+                posts = await loop.run_in_executor(
+                    executor, client.fetch_listing, subreddit_name, filter_type, limit, since_utc, acquire_page
+                )
+                self.bucket.update_budget(client.reddit.auth.limits)
+                return subreddit_name, filter_type, posts
+
+            except TooManyRequests as e:
+                retry_after = float(e.retry_after) if e.retry_after else 2 ** attempt
+                logger.warning(f"429 on r/{subreddit_name}/{filter_type}, backing off {retry_after:.1f}s.")
+                self.bucket.pause(retry_after + random.uniform(0, 1))
+
+            except (ServerError, RequestException) as e:
+                delay = min(60.0, 2 ** attempt) + random.uniform(0, 1)
+                logger.warning(f"Transient error on r/{subreddit_name}/{filter_type}: {e}. Retrying in {delay:.1f}s.")
+                await asyncio.sleep(delay)
+
+            except Exception as e:
+                logger.error(f"Error fetching r/{subreddit_name}/{filter_type}: {e}")
+                return subreddit_name, filter_type, None
+
+            finally:
+                clients.put_nowait(client)
+
+        logger.error(f"Giving up on r/{subreddit_name}/{filter_type} after {self.max_retries} retries.")
+        return subreddit_name, filter_type, None
+
+    async def fetch_all(
+        self,
+        listings: List[Tuple[str, str, int, Optional[float]]]
+    ) -> AsyncIterator[Tuple[str, str, Optional[List[Dict[str, Any]]]]]:
+        """
+        Fetches (subreddit, listing, limit, since_utc) requests, e.g. from CursorStore.plan.
+        Yields (subreddit, listing, posts) as each listing completes, in completion order.
+        posts is None when the fetch failed, so callers can leave the cursor untouched.
+        """
+        clients = asyncio.Queue()
+        for _ in range(self.max_concurrency):
+            clients.put_nowait(self.client_factory())
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="reddit-fetch")
+        tasks = [
+            asyncio.create_task(self._fetch_one(clients, executor, name, filter_type, limit, since_utc))
+            for name, filter_type, limit, since_utc in listings
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
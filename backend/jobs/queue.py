@@ -0,0 +1,334 @@
+from contextlib import contextmanager
+from config import settings
+from typing import Any, Dict, Optional
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class SQLiteQueueBackend:
+    """
+    Queue in a local SQLite file, shared by the worker processes of one machine (":memory:" keeps it
+    inside a single process). Claims run in BEGIN IMMEDIATE transactions, so two workers never get
+    the same job and the per-stage running counts are exact.
+    """
+    def __init__(self, path: str):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        if path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, stage TEXT NOT NULL, key TEXT, payload TEXT NOT NULL, "
+            "status TEXT NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL, "
+            "run_at REAL NOT NULL, lease_until REAL, error TEXT)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_status_run_at ON jobs (status, run_at)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS ix_jobs_key ON jobs (key, status)")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS batch_parts ("
+            "batch TEXT NOT NULL, part INTEGER NOT NULL, finished_at REAL NOT NULL, PRIMARY KEY (batch, part))"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def enqueue(self, stage: str, payload: str, key: Optional[str], max_attempts: int, run_at: float) -> int:
+        with self._transaction():
+            if key is not None:
+                row = self.conn.execute("SELECT id FROM jobs WHERE key = ? AND status = 'queued'", (key,)).fetchone()
+                if row is not None:
+                    return row[0]
+            return self.conn.execute(
+                "INSERT INTO jobs (stage, key, payload, status, max_attempts, run_at) VALUES (?, ?, ?, 'queued', ?, ?)",
+                (stage, key, payload, max_attempts, run_at)
+            ).lastrowid
+
+    def claim(self, limits: Dict[str, int], now: float, lease_until: float) -> Optional[Dict[str, Any]]:
+        with self._transaction():
+            # Jobs of workers that stopped heartbeating go back to the queue, or fail after their last attempt
+            self.conn.execute(
+                "UPDATE jobs SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END, "
+                "run_at = ?, lease_until = NULL, error = 'Lease expired (worker lost)' "
+                "WHERE status = 'running' AND lease_until < ?",
+                (now, now)
+            )
+            running = dict(self.conn.execute("SELECT stage, count(*) FROM jobs WHERE status = 'running' GROUP BY stage"))
+            stages = [stage for stage, limit in limits.items() if running.get(stage, 0) < limit]
+            if not stages:
+                return None
+
+            row = self.conn.execute(
+                f"SELECT id, stage, key, payload, attempts, max_attempts FROM jobs "
+                f"WHERE status = 'queued' AND run_at <= ? AND stage IN ({','.join('?' * len(stages))}) "
+                f"ORDER BY run_at, id LIMIT 1",
+                (now, *stages)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ? WHERE id = ?",
+                (lease_until, row[0])
+            )
+        return {
+            "id": row[0], "stage": row[1], "key": row[2], "payload": row[3],
+            "attempts": row[4] + 1, "max_attempts": row[5]
+        }
+
+    def heartbeat(self, job: Dict[str, Any], lease_until: float):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET lease_until = ? WHERE id = ? AND status = 'running'", (lease_until, job["id"])
+            )
+
+    def complete(self, job: Dict[str, Any]):
+        with self.lock:
+            self.conn.execute("DELETE FROM jobs WHERE id = ?", (job["id"],))
+
+    def fail(self, job: Dict[str, Any], error: str, retry_at: Optional[float]):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, run_at = COALESCE(?, run_at), lease_until = NULL, error = ? WHERE id = ?",
+                ("queued" if retry_at is not None else "failed", retry_at, error, job["id"])
+            )
+
+    def finish_batch_part(self, batch: str, part: int, parts: int, now: float, expire_before: float) -> bool:
+        with self._transaction():
+            self.conn.execute("DELETE FROM batch_parts WHERE finished_at < ?", (expire_before,))
+            self.conn.execute(
+                "INSERT OR IGNORE INTO batch_parts (batch, part, finished_at) VALUES (?, ?, ?)", (batch, part, now)
+            )
+            return self.conn.execute("SELECT count(*) FROM batch_parts WHERE batch = ?", (batch,)).fetchone()[0] >= parts
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        with self.lock:
+            for stage, status, n in self.conn.execute("SELECT stage, status, count(*) FROM jobs GROUP BY stage, status"):
+                counts.setdefault(stage, {})[status] = n
+        return counts
+
+# Claim is one script so the lease sweep, the per-stage limit check and the pop are atomic
+_REDIS_ENQUEUE = """
+local prefix = ARGV[1]
+if ARGV[3] ~= '' then
+    local existing = redis.call('GET', prefix .. 'key:' .. ARGV[3])
+    if existing then return tonumber(existing) end
+end
+local id = redis.call('INCR', prefix .. 'next_id')
+redis.call('HSET', prefix .. 'job:' .. id, 'stage', ARGV[2], 'key', ARGV[3], 'payload', ARGV[4],
+           'attempts', 0, 'max_attempts', ARGV[5])
+redis.call('ZADD', prefix .. 'queued:' .. ARGV[2], ARGV[6], id)
+if ARGV[3] ~= '' then redis.call('SET', prefix .. 'key:' .. ARGV[3], id) end
+return id
+"""
+
+_REDIS_CLAIM = """
+local prefix, now, lease_until = ARGV[1], tonumber(ARGV[2]), ARGV[3]
+local best, best_stage, best_score
+for i = 4, #ARGV, 2 do
+    local stage, limit = ARGV[i], tonumber(ARGV[i + 1])
+    local running = prefix .. 'running:' .. stage
+    for _, id in ipairs(redis.call('ZRANGEBYSCORE', running, '-inf', now)) do
+        redis.call('ZREM', running, id)
+        local job = prefix .. 'job:' .. id
+        redis.call('HSET', job, 'error', 'Lease expired (worker lost)')
+        if tonumber(redis.call('HGET', job, 'attempts')) >= tonumber(redis.call('HGET', job, 'max_attempts')) then
+            redis.call('RPUSH', prefix .. 'failed', id)
+        else
+            redis.call('ZADD', prefix .. 'queued:' .. stage, now, id)
+            local key = redis.call('HGET', job, 'key')
+            if key ~= '' then redis.call('SET', prefix .. 'key:' .. key, id, 'NX') end
+        end
+    end
+    if redis.call('ZCARD', running) < limit then
+        local head = redis.call('ZRANGEBYSCORE', prefix .. 'queued:' .. stage, '-inf', now, 'WITHSCORES', 'LIMIT', 0, 1)
+        if head[1] and (best_score == nil or tonumber(head[2]) < best_score) then
+            best, best_stage, best_score = head[1], stage, tonumber(head[2])
+        end
+    end
+end
+if not best then return nil end
+
+local job = prefix .. 'job:' .. best
+redis.call('ZREM', prefix .. 'queued:' .. best_stage, best)
+if redis.call('EXISTS', job) == 0 then return nil end
+redis.call('ZADD', prefix .. 'running:' .. best_stage, lease_until, best)
+redis.call('HINCRBY', job, 'attempts', 1)
+local key = redis.call('HGET', job, 'key')
+if key ~= '' and redis.call('GET', prefix .. 'key:' .. key) == best then
+    redis.call('DEL', prefix .. 'key:' .. key)
+end
+local fields = redis.call('HGETALL', job)
+table.insert(fields, 1, best)
+return fields
+"""
+
+# A retried job is queued again under its key, unless a newer job with that key was queued meanwhile
+_REDIS_FAIL = """
+local prefix, id, stage = ARGV[1], ARGV[2], ARGV[3]
+local job = prefix .. 'job:' .. id
+redis.call('ZREM', prefix .. 'running:' .. stage, id)
+redis.call('HSET', job, 'error', ARGV[4])
+if ARGV[5] == '' then
+    redis.call('RPUSH', prefix .. 'failed', id)
+    return 0
+end
+redis.call('ZADD', prefix .. 'queued:' .. stage, ARGV[5], id)
+local key = redis.call('HGET', job, 'key')
+if key and key ~= '' then redis.call('SET', prefix .. 'key:' .. key, id, 'NX') end
+return 1
+"""
+
+class RedisQueueBackend:
+    """
+    Queue on REDIS_URL, shared by workers on any number of machines: one sorted set of ready jobs
+    and one of leases per stage, a hash per job, and a list of job ids that exhausted their attempts.
+    """
+    PREFIX = "jobs:"
+
+    def __init__(self, url: str):
+        import redis # Optional dependency, only needed for this backend
+        self.client = redis.Redis.from_url(url, decode_responses=True)
+        self.client.ping()
+        self._enqueue = self.client.register_script(_REDIS_ENQUEUE)
+        self._claim = self.client.register_script(_REDIS_CLAIM)
+        self._fail = self.client.register_script(_REDIS_FAIL)
+
+    def enqueue(self, stage: str, payload: str, key: Optional[str], max_attempts: int, run_at: float) -> int:
+        return int(self._enqueue(args=[self.PREFIX, stage, key or "", payload, max_attempts, run_at]))
+
+    def claim(self, limits: Dict[str, int], now: float, lease_until: float) -> Optional[Dict[str, Any]]:
+        args = [self.PREFIX, now, lease_until]
+        for stage, limit in limits.items():
+            args += [stage, limit]
+        result = self._claim(args=args)
+        if not result:
+            return None
+        fields = dict(zip(result[1::2], result[2::2]))
+        return {
+            "id": int(result[0]), "stage": fields["stage"], "key": fields["key"] or None, "payload": fields["payload"],
+            "attempts": int(fields["attempts"]), "max_attempts": int(fields["max_attempts"])
+        }
+
+    def heartbeat(self, job: Dict[str, Any], lease_until: float):
+        self.client.zadd(f"{self.PREFIX}running:{job['stage']}", {job["id"]: lease_until}, xx=True)
+
+    def complete(self, job: Dict[str, Any]):
+        pipe = self.client.pipeline()
+        pipe.zrem(f"{self.PREFIX}running:{job['stage']}", job["id"])
+        pipe.delete(f"{self.PREFIX}job:{job['id']}")
+        pipe.execute()
+
+    def fail(self, job: Dict[str, Any], error: str, retry_at: Optional[float]):
+        self._fail(args=[self.PREFIX, job["id"], job["stage"], error, "" if retry_at is None else retry_at])
+
+    def finish_batch_part(self, batch: str, part: int, parts: int, now: float, expire_before: float) -> bool:
+        name = f"{self.PREFIX}batch:{batch}"
+        pipe = self.client.pipeline() # MULTI/EXEC, so concurrent parts see each other's SADD
+        pipe.sadd(name, part)
+        pipe.expire(name, max(1, int(now - expire_before)))
+        pipe.scard(name)
+        return pipe.execute()[-1] >= parts
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        counts: Dict[str, Dict[str, int]] = {}
+        for name in self.client.scan_iter(f"{self.PREFIX}queued:*"):
+            counts.setdefault(name.split(":", 2)[2], {})["queued"] = self.client.zcard(name)
+        for name in self.client.scan_iter(f"{self.PREFIX}running:*"):
+            counts.setdefault(name.split(":", 2)[2], {})["running"] = self.client.zcard(name)
+        for job_id in self.client.lrange(f"{self.PREFIX}failed", 0, -1):
+            stage = self.client.hget(f"{self.PREFIX}job:{job_id}", "stage")
+            if stage:
+                counts.setdefault(stage, {})
+                counts[stage]["failed"] = counts[stage].get("failed", 0) + 1
+        return counts
+
+class JobQueue:
+    """
+    Pipeline jobs with per-stage concurrency limits, idempotency keys and retries.
+
+    - A job enqueued with a key while another job with that key is still queued is not added again;
+      the queued job's id is returned. Once a job starts, its key is free, so work that arrives
+      during a run schedules exactly one follow-up run. A job queued again for a retry holds its key again.
+    - Jobs split from one job form a batch; finish_batch_part() tells the one that finishes last,
+      so a follow-up they share is queued after all of them rather than after each.
+    - claim() only hands out jobs of stages below their limit, counted across all workers.
+    - A failed job is retried after JOB_RETRY_BACKOFF_SECONDS (doubling per attempt) until it has run
+      JOB_MAX_ATTEMPTS times, then kept as failed. A job whose worker stops heartbeating for
+      JOB_LEASE_SECONDS is handed out again, so delivery is at-least-once and stages must be idempotent.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+        self.lease_seconds = settings.JOB_LEASE_SECONDS
+
+    def enqueue(self, stage: str, payload: Optional[Dict[str, Any]] = None, key: Optional[str] = None,
+                delay: float = 0.0, max_attempts: Optional[int] = None) -> int:
+        return self.backend.enqueue(
+            stage, json.dumps(payload or {}), key, max_attempts or settings.JOB_MAX_ATTEMPTS, time.time() + delay
+        )
+
+    def claim(self, limits: Dict[str, int]) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        job = self.backend.claim(limits, now, now + self.lease_seconds)
+        if job is not None:
+            job["payload"] = json.loads(job["payload"])
+        return job
+
+    def heartbeat(self, job: Dict[str, Any]):
+        self.backend.heartbeat(job, time.time() + self.lease_seconds)
+
+    def complete(self, job: Dict[str, Any]):
+        self.backend.complete(job)
+
+    def fail(self, job: Dict[str, Any], error: str) -> bool:
+        """
+        Records the failure and schedules a retry if attempts remain. Returns whether it will be retried.
+        """
+        retry = job["attempts"] < job["max_attempts"]
+        retry_at = time.time() + settings.JOB_RETRY_BACKOFF_SECONDS * 2 ** (job["attempts"] - 1) if retry else None
+        self.backend.fail(job, error, retry_at)
+        return retry
+
+    def finish_batch_part(self, batch: str, part: int, parts: int) -> bool:
+        """
+        Records part `part` of `parts` in `batch` as finished and returns whether all parts now are.
+        Parts are a set, so a part run twice counts once; a part re-run after the batch finished gets
+        True again, which the follow-up's key makes harmless. Batches are forgotten after JOB_BATCH_TTL_SECONDS.
+        """
+        now = time.time()
+        return self.backend.finish_batch_part(batch, part, parts, now, now - settings.JOB_BATCH_TTL_SECONDS)
+
+    def counts(self) -> Dict[str, Dict[str, int]]:
+        """
+        Jobs per stage and status (queued / running / failed); completed jobs are not kept.
+        """
+        return self.backend.counts()
+
+_queue: Optional[JobQueue] = None
+_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """
+    Process-wide queue for JOB_QUEUE_BACKEND. Unlike the caches there is no silent fallback:
+    workers on different backends would never see each other's jobs.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            if settings.JOB_QUEUE_BACKEND == "redis":
+                backend = RedisQueueBackend(settings.REDIS_URL)
+            else:
+                backend = SQLiteQueueBackend(settings.JOB_QUEUE_PATH)
+            _queue = JobQueue(backend)
+        return _queue
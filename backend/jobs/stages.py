@@ -0,0 +1,91 @@
+from sqlalchemy.orm import Session
+from jobs.queue import JobQueue
+from config import settings
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+STAGES = ("collect", "process", "cluster", "score", "ideate")
+
+# (stage, payload, key) to enqueue once a job has succeeded. Jobs split from one job carry
+# payload["batch"] = {id, part, parts, then}: `then` is queued after the last of them finishes.
+FollowUp = Tuple[str, Dict[str, Any], str]
+
+def stage_limits(stages: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Jobs allowed to run at once per stage, across all workers. Clustering, scoring and ideation
+    work on the whole cluster table and always run one at a time.
+    """
+    limits = {
+        "collect": settings.JOB_COLLECT_CONCURRENCY,
+        "process": settings.JOB_PROCESS_CONCURRENCY,
+        "cluster": 1,
+        "score": 1,
+        "ideate": 1,
+    }
+    return {stage: limits[stage] for stage in (stages or STAGES)}
+
+def _forward(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # Options for later stages travel down the chain
+    return {"top_k": payload["top_k"]} if payload.get("top_k") else {}
+
+def run_collect(db: Session, payload: Dict[str, Any]) -> List[FollowUp]:
+    from ingestion.collector import main as run_collector
+    run_collector()
+    return [("process", _forward(payload), "process")]
+
+def run_process(db: Session, payload: Dict[str, Any]) -> List[FollowUp]:
+    """
+    Without a claim: claims the unprocessed posts in parts of JOB_PROCESS_BATCH_POSTS, one job each,
+    so extraction spreads over the workers, and clustering runs once after the last of them. Posts
+    still claimed by an earlier split's jobs are left to those jobs.
+    With a claim: processes its posts, then frees them. A failed attempt keeps them for the retry.
+    """
+    from ai.processor import PostProcessor, claim_unprocessed, release_claim
+
+    if "claim" not in payload:
+        batch_id = uuid.uuid4().hex
+        claims = claim_unprocessed(db, settings.JOB_PROCESS_BATCH_POSTS, batch_id)
+        logger.info(f"Split unprocessed posts into {len(claims)} extraction jobs.")
+        if not claims:
+            return [("cluster", _forward(payload), "cluster")]
+        batch = {"id": batch_id, "parts": len(claims), "then": ("cluster", _forward(payload), "cluster")}
+        return [
+            ("process", {**_forward(payload), "claim": claim, "batch": {**batch, "part": part}}, f"process:{claim}")
+            for part, claim in enumerate(claims)
+        ]
+
+    PostProcessor(db).run(payload["claim"])
+    release_claim(db, payload["claim"])
+    return []
+
+def run_cluster(db: Session, payload: Dict[str, Any]) -> List[FollowUp]:
+    from logic.clustering import ClusterEngine
+    ClusterEngine(db).run_clustering()
+    return [("score", _forward(payload), "score")]
+
+def run_score(db: Session, payload: Dict[str, Any]) -> List[FollowUp]:
+    from logic.scoring import ScoringEngine
+    ScoringEngine(db).rescore()
+    return [("ideate", _forward(payload), "ideate")]
+
+def run_ideate(db: Session, payload: Dict[str, Any]) -> List[FollowUp]:
+    from logic.ideation import IdeationRunner
+    IdeationRunner(db, top_k=payload.get("top_k")).run()
+    return []
+
+HANDLERS: Dict[str, Callable[[Session, Dict[str, Any]], List[FollowUp]]] = {
+    "collect": run_collect,
+    "process": run_process,
+    "cluster": run_cluster,
+    "score": run_score,
+    "ideate": run_ideate,
+}
+
+def submit(queue: JobQueue, stage: str, top_k: Optional[int] = None) -> int:
+    """
+    Starts the pipeline at `stage`; each stage enqueues the next one when it succeeds.
+    """
+    return queue.enqueue(stage, {"top_k": top_k} if top_k else {}, key=stage)
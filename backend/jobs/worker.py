@@ -0,0 +1,113 @@
+from database import SessionLocal
+from jobs.queue import JobQueue, get_job_queue
+from jobs.stages import HANDLERS, FollowUp, stage_limits
+from config import settings
+from typing import Any, Dict, List, Optional
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class Worker:
+    """
+    Runs queued jobs one at a time: claim -> stage handler with its own session -> enqueue follow-ups
+    -> complete. Follow-ups are enqueued before the job is completed, so a crash in between re-runs
+    the job and the follow-up keys keep the next stages from being queued twice. A heartbeat thread
+    keeps the lease alive while long stages (clustering) run. The last job of a batch to finish, whether
+    it succeeded or failed for good, also queues the batch's follow-up.
+    """
+    def __init__(self, queue: JobQueue, stages: Optional[List[str]] = None):
+        self.queue = queue
+        self.limits = stage_limits(stages)
+
+    def _heartbeat(self, job: Dict[str, Any], done: threading.Event):
+        while not done.wait(self.queue.lease_seconds / 3):
+            try:
+                self.queue.heartbeat(job)
+            except Exception as e:
+                logger.error(f"Heartbeat for job {job['id']} failed: {e}")
+
+    def _finish_batch_part(self, job: Dict[str, Any]) -> List[FollowUp]:
+        batch = job["payload"].get("batch")
+        if batch is None or not self.queue.finish_batch_part(batch["id"], batch["part"], batch["parts"]):
+            return []
+        return [tuple(batch["then"])]
+
+    def run_one(self) -> bool:
+        """
+        Runs the next ready job, if any. Returns whether a job was run.
+        """
+        job = self.queue.claim(self.limits)
+        if job is None:
+            return False
+
+        done = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job, done), daemon=True).start()
+        db = SessionLocal()
+        start = time.perf_counter()
+        try:
+            follow_ups = HANDLERS[job["stage"]](db, job["payload"])
+            follow_ups += self._finish_batch_part(job)
+            for stage, payload, key in follow_ups:
+                self.queue.enqueue(stage, payload, key)
+            self.queue.complete(job)
+            logger.info(
+                f"Job {job['id']} ({job['stage']}) done in {time.perf_counter() - start:.1f}s, "
+                f"queued {len(follow_ups)} follow-ups."
+            )
+        except Exception as e:
+            db.rollback()
+            retried = self.queue.fail(job, f"{type(e).__name__}: {e}")
+            logger.error(
+                f"Job {job['id']} ({job['stage']}) failed on attempt {job['attempts']}/{job['max_attempts']}"
+                f"{', will retry' if retried else ''}: {e}"
+            )
+            if not retried:
+                # The rest of the batch still gets its follow-up; the failed range stays unprocessed for the next run
+                for stage, payload, key in self._finish_batch_part(job):
+                    self.queue.enqueue(stage, payload, key)
+        finally:
+            done.set()
+            db.close()
+        return True
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            if not self.run_one():
+                stop.wait(settings.JOB_POLL_SECONDS)
+
+def _process_main(stages: Optional[List[str]], stop):
+    logging.basicConfig(level=logging.INFO)
+    # Ctrl-C reaches every process in the group; let the parent decide, the current job finishes first
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    Worker(get_job_queue(), stages).run(stop)
+
+def run_workers(processes: Optional[int] = None, stages: Optional[List[str]] = None):
+    """
+    Runs `processes` worker processes (JOB_WORKER_PROCESSES by default) until SIGINT/SIGTERM;
+    0 runs a single worker in this process. Start more on other machines with the redis backend.
+    """
+    processes = settings.JOB_WORKER_PROCESSES if processes is None else processes
+    context = multiprocessing.get_context("spawn") # Fresh DB engines and LLM clients per process
+    stop = context.Event() if processes > 0 else threading.Event()
+
+    def shutdown(signum, frame):
+        logger.info("Stopping workers after their current jobs...")
+        stop.set()
+    signal.signal(signal.SIGINT, shutdown)
+    signal.signal(signal.SIGTERM, shutdown)
+
+    if processes <= 0:
+        Worker(get_job_queue(), stages).run(stop)
+        return
+
+    workers = [context.Process(target=_process_main, args=(stages, stop), daemon=False) for _ in range(processes)]
+    for process in workers:
+        process.start()
+    logger.info(f"Started {processes} workers for stages {', '.join(stage_limits(stages))}.")
+    for process in workers:
+        process.join()
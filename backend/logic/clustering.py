@@ -1,68 +1,342 @@
 import numpy as np
 import hdbscan
 from sqlalchemy.orm import Session
-from models import ProblemStatement, ProblemCluster
+from sqlalchemy import select, insert, update, delete, func, and_, or_, true, Integer
+from database import bulk_update, values_cte
+from generations import bump_generation
+from ai.vectors import normalize, exact_nearest
+from models import ProblemStatement, ProblemCluster, GeneratedIdea
+from config import settings
 import logging
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
 
 logger = logging.getLogger(__name__)
 
+def reduce_dimensions(matrix: np.ndarray) -> np.ndarray:
+    """
+    Applies the configured pre-processing before HDBSCAN: optional L2 normalization
+    and PCA/UMAP reduction to CLUSTER_REDUCED_DIM dimensions. Returns float32.
+    """
+    X = matrix
+    if settings.CLUSTER_NORMALIZE:
+        X = normalize(X)
+
+    target_dim = min(settings.CLUSTER_REDUCED_DIM, X.shape[0], X.shape[1])
+    if settings.CLUSTER_REDUCER == "pca" and target_dim < X.shape[1]:
+        from sklearn.decomposition import PCA
+        X = PCA(n_components=target_dim, svd_solver="randomized", random_state=42).fit_transform(X)
+    elif settings.CLUSTER_REDUCER == "umap" and target_dim < X.shape[1]:
+        try:
+            import umap
+        except ImportError:
+            raise ImportError("CLUSTER_REDUCER=umap requires the umap-learn package.")
+        X = umap.UMAP(n_components=target_dim, metric="cosine", random_state=42).fit_transform(X)
+
+    return np.ascontiguousarray(X, dtype=np.float32)
+
 class ClusterEngine:
     def __init__(self, db: Session):
         self.db = db
-        self.min_cluster_size = 3
-        self.min_samples = 1
+        self.min_cluster_size = settings.CLUSTER_MIN_CLUSTER_SIZE
+        self.min_samples = settings.CLUSTER_MIN_SAMPLES
+        self.assign_max_distance = settings.CLUSTER_ASSIGN_MAX_DISTANCE
+        self.merge_max_distance = settings.CLUSTER_MERGE_MAX_DISTANCE
+
+    def _is_postgres(self) -> bool:
+        return self.db.get_bind().dialect.name == "postgresql"
+
+    def _unclustered(self):
+        # New problems, plus noise from earlier runs that is still within its retry window
+        retry_since = datetime.now(timezone.utc) - timedelta(days=settings.CLUSTER_NOISE_RETRY_DAYS)
+        return and_(
+            ProblemStatement.cluster_id == None,
+            ProblemStatement.embedding != None,
+            or_(ProblemStatement.noise_at == None, ProblemStatement.noise_at >= retry_since)
+        )
+
+    def load_unclustered(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Streams unclustered (id, embedding) rows into an id array and one contiguous float32 matrix,
+        instead of materializing an ORM object and a Python list per row.
+        """
+        unclustered = self._unclustered()
+        count = self.db.execute(
+            select(func.count()).select_from(ProblemStatement).where(unclustered)
+        ).scalar()
+        ids = np.empty(count, dtype=np.int64)
+        matrix = None
+
+        rows = self.db.execute(
+            select(ProblemStatement.id, ProblemStatement.embedding)
+            .where(unclustered)
+            .order_by(ProblemStatement.id)
+            .execution_options(yield_per=settings.CLUSTER_LOAD_BATCH)
+        )
+        n = 0
+        for row in rows:
+            if n == count:
+                break # Rows inserted after the count, picked up next run
+            if matrix is None:
+                matrix = np.empty((count, len(row.embedding)), dtype=np.float32)
+            ids[n] = row.id
+            matrix[n] = row.embedding
+            n += 1
+
+        if matrix is None:
+            return ids[:0], np.empty((0, 0), dtype=np.float32)
+        return ids[:n], matrix[:n]
+
+    def fit_labels(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        Runs HDBSCAN on the (normalized, reduced) embeddings and returns one label per row, -1 for noise.
+        """
+        X = reduce_dimensions(matrix)
+        clusterer = hdbscan.HDBSCAN(
+            min_cluster_size=self.min_cluster_size,
+            min_samples=self.min_samples,
+            metric='euclidean', # Normalized vectors: euclidean ranks like cosine
+            core_dist_n_jobs=settings.CLUSTER_N_JOBS
+        )
+        return clusterer.fit_predict(X)
 
     def run_clustering(self):
         """
-        Fetches unclustered problems, runs HDBSCAN, and updates the database.
+        Incremental clustering of unclustered problems:
+        1. each new problem joins the nearest existing cluster if its centroid is within CLUSTER_ASSIGN_MAX_DISTANCE,
+        2. HDBSCAN runs only on the residue, which can form new clusters.
+        Work is proportional to the number of new problems, not to the corpus. Noise is retried with
+        the new problems for CLUSTER_NOISE_RETRY_DAYS, then left out, so the residue stays bounded.
         """
         # 1. Fetch unclustered problems
-        unclustered = self.db.query(ProblemStatement).filter(ProblemStatement.cluster_id == None).all()
-        
-        if len(unclustered) < self.min_cluster_size:
+        ids, matrix = self.load_unclustered()
+        if len(ids) == 0:
+            logger.info("No new problems to cluster.")
+            return
+
+        # 2. Assign to existing clusters
+        residue = self.assign_to_existing(ids, matrix)
+        logger.info(f"Assigned {len(ids) - residue.sum()} problems to existing clusters, {residue.sum()} left.")
+
+        ids, matrix = ids[residue], matrix[residue]
+        if len(ids) < self.min_cluster_size:
+            self.db.commit()
             logger.info("Not enough data to cluster.")
             return
 
-        ids = [p.id for p in unclustered]
-        embeddings = [np.array(p.embedding) for p in unclustered]
-        
-        # 2. Run HDBSCAN
-        # We use a cosine distance metric (or euclidean on normalized vectors)
-        clusterer = hdbscan.HDBSCAN(
-            min_cluster_size=self.min_cluster_size,
-            min_samples=self.min_samples,
-            metric='euclidean' # Assuming normalized embeddings
+        # 3. Run HDBSCAN
+        labels = self.fit_labels(matrix)
+
+        # 4. Group and Save, in the same transaction as the assignments
+        unique_labels = [label for label in np.unique(labels) if label != -1] # -1: noise points
+        self._mark_noise(ids[labels == -1])
+        members = {label: np.nonzero(labels == label)[0] for label in unique_labels}
+        texts = dict(self.db.execute(
+            select(ProblemStatement.id, ProblemStatement.text)
+            .where(ProblemStatement.id.in_([int(ids[rows[0]]) for rows in members.values()]))
+        ).all())
+
+        if unique_labels:
+            cluster_ids = self.db.scalars(
+                insert(ProblemCluster).returning(ProblemCluster.id, sort_by_parameter_order=True),
+                [
+                    {
+                        "name": f"Cluster {label} - {(texts.get(int(ids[members[label][0]])) or '')[:30]}...",
+                        "description": "Auto-generated cluster based on embedding similarity.",
+                        "centroid": matrix[members[label]].mean(axis=0).tolist(),
+                        "size": len(members[label])
+                    }
+                    for label in unique_labels
+                ]
+            ).all()
+
+            self._set_cluster_ids([
+                (int(problem_id), cluster_id)
+                for label, cluster_id in zip(unique_labels, cluster_ids)
+                for problem_id in ids[members[label]]
+            ])
+        self.db.commit()
+
+        logger.info(f"Clustering complete. Found {len(unique_labels)} new clusters.")
+
+    def _mark_noise(self, problem_ids: np.ndarray):
+        """
+        Stamps noise_at on problems HDBSCAN left as noise, keeping the first stamp, so they stop being
+        re-clustered once CLUSTER_NOISE_RETRY_DAYS have passed. Does not commit.
+        """
+        if len(problem_ids) == 0:
+            return
+        self.db.execute(
+            update(ProblemStatement)
+            .where(ProblemStatement.id.in_([int(pid) for pid in problem_ids]), ProblemStatement.noise_at == None)
+            .values(noise_at=func.now())
+            .execution_options(synchronize_session=False)
         )
-        labels = clusterer.fit_predict(embeddings)
-        
-        # 3. Group and Save
-        clusters_found = 0
-        unique_labels = set(labels)
-        
-        for label in unique_labels:
-            if label == -1:
-                # Noise points
+
+    def _set_cluster_ids(self, assignments: List[Tuple[int, int]]):
+        """
+        Writes (problem_id, cluster_id) pairs as one set-based update, without committing.
+        """
+        bulk_update(self.db, ProblemStatement, [{"id": pid, "cluster_id": cid} for pid, cid in assignments])
+
+    def _nearest_clusters(self, matrix: np.ndarray, chunk_size: int = 500) -> List[Tuple[Optional[int], float]]:
+        """
+        (cluster_id, cosine distance) of the nearest centroid for each embedding row.
+        On Postgres each chunk of rows is one query: a LATERAL ORDER BY <=> LIMIT 1 per VALUES row,
+        served by the HNSW centroid index; elsewhere (SQLite tests) the centroids are compared in NumPy.
+        """
+        if self._is_postgres():
+            centroid_type = ProblemCluster.centroid.type
+            results = []
+            for start in range(0, len(matrix), chunk_size):
+                queries = values_cte(
+                    "queries", [("i", Integer()), ("embedding", centroid_type)],
+                    [(i, embedding.tolist()) for i, embedding in enumerate(matrix[start:start + chunk_size])]
+                )
+                distance = ProblemCluster.centroid.cosine_distance(queries.c.embedding)
+                nearest = (
+                    select(ProblemCluster.id, distance.label("distance"))
+                    .where(ProblemCluster.centroid != None)
+                    .order_by(distance)
+                    .limit(1)
+                    .lateral("nearest")
+                )
+                rows = self.db.execute(
+                    select(queries.c.i, nearest.c.id, nearest.c.distance)
+                    .select_from(queries.outerjoin(nearest, true()))
+                    .order_by(queries.c.i)
+                ).all()
+                results.extend((row.id, float(row.distance)) if row.id is not None else (None, float("inf")) for row in rows)
+            return results
+
+        rows = self.db.execute(
+            select(ProblemCluster.id, ProblemCluster.centroid).where(ProblemCluster.centroid != None)
+        ).all()
+        if not rows:
+            return [(None, float("inf"))] * len(matrix)
+
+        order, distances = exact_nearest(matrix, [row.centroid for row in rows])
+        return [(rows[j].id, float(distance)) for j, distance in zip(order[:, 0], distances[:, 0])]
+
+    def assign_to_existing(self, ids: np.ndarray, matrix: np.ndarray) -> np.ndarray:
+        """
+        Attaches problems to the nearest existing cluster within the distance threshold and
+        moves those clusters' centroids (running mean). Returns a boolean mask of the rows left unassigned.
+        Does not commit; run_clustering commits it together with the new clusters.
+        """
+        residue = np.ones(len(ids), dtype=bool)
+        if len(ids) == 0:
+            return residue
+
+        assigned: Dict[int, List[int]] = {}
+        for i, (cluster_id, distance) in enumerate(self._nearest_clusters(matrix)):
+            if cluster_id is not None and distance <= self.assign_max_distance:
+                assigned.setdefault(cluster_id, []).append(i)
+                residue[i] = False
+
+        if assigned:
+            clusters = self.db.query(ProblemCluster).filter(ProblemCluster.id.in_(assigned.keys())).all()
+            for cluster in clusters:
+                rows = assigned[cluster.id]
+                size = cluster.size or 0
+                centroid = np.asarray(cluster.centroid, dtype=np.float32)
+                cluster.centroid = ((centroid * size + matrix[rows].sum(axis=0)) / (size + len(rows))).tolist()
+                cluster.size = size + len(rows)
+                cluster.is_dirty = True
+
+            self._set_cluster_ids([
+                (int(ids[i]), cluster_id)
+                for cluster_id, rows in assigned.items()
+                for i in rows
+            ])
+
+        return residue
+
+    def refresh_centroids(self):
+        """
+        Recomputes every cluster's centroid and size from its members, one cluster at a time.
+        """
+        cluster_ids = self.db.execute(select(ProblemCluster.id)).scalars().all()
+        for cluster_id in cluster_ids:
+            embeddings = self.db.execute(
+                select(ProblemStatement.embedding)
+                .where(ProblemStatement.cluster_id == cluster_id, ProblemStatement.embedding != None)
+            ).scalars().all()
+            values = {"centroid": None, "size": 0}
+            if embeddings:
+                matrix = np.vstack([np.asarray(e, dtype=np.float32) for e in embeddings])
+                values = {"centroid": matrix.mean(axis=0).tolist(), "size": len(embeddings)}
+            # Only a size drift means membership changed outside the clustering paths
+            self.db.execute(
+                update(ProblemCluster)
+                .where(ProblemCluster.id == cluster_id, ProblemCluster.size != values["size"])
+                .values(is_dirty=True)
+            )
+            self.db.execute(update(ProblemCluster).where(ProblemCluster.id == cluster_id).values(**values))
+        self.db.commit()
+
+    def merge_clusters(self) -> int:
+        """
+        Periodic full pass: refreshes centroids, then merges clusters whose centroids are within
+        CLUSTER_MERGE_MAX_DISTANCE (transitively) into the largest one of each group.
+        Members and generated ideas move to the surviving cluster. Returns the number of clusters removed.
+        """
+        self.refresh_centroids()
+
+        rows = self.db.execute(
+            select(ProblemCluster.id, ProblemCluster.centroid, ProblemCluster.size)
+            .where(ProblemCluster.centroid != None)
+        ).all()
+        if len(rows) < 2:
+            return 0
+
+        ids = [row.id for row in rows]
+        sizes = np.array([row.size or 0 for row in rows], dtype=np.float32)
+        centroids = np.vstack([np.asarray(row.centroid, dtype=np.float32) for row in rows])
+        unit = normalize(centroids)
+
+        # Union-find over centroid pairs closer than the merge threshold
+        parent = list(range(len(ids)))
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        for i in range(len(ids)):
+            close = np.nonzero(1.0 - unit[i + 1:] @ unit[i] <= self.merge_max_distance)[0] + i + 1
+            for j in close:
+                parent[find(int(j))] = find(i)
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(ids)):
+            groups.setdefault(find(i), []).append(i)
+
+        removed = 0
+        for members in groups.values():
+            if len(members) < 2:
                 continue
-            
-            # Get points in this cluster
-            indices = [i for i, x in enumerate(labels) if x == label]
-            cluster_problems = [unclustered[i] for i in indices]
-            
-            # Create new Cluster in DB
-            new_cluster = ProblemCluster(
-                name=f"Cluster {label} - {cluster_problems[0].text[:30]}...",
-                description="Auto-generated cluster based on embedding similarity."
+
+            survivor = max(members, key=lambda i: sizes[i])
+            absorbed = [ids[i] for i in members if i != survivor]
+            total = sizes[members].sum()
+            centroid = (centroids[members] * sizes[members, None]).sum(axis=0) / max(total, 1.0)
+
+            self.db.execute(
+                update(ProblemStatement).where(ProblemStatement.cluster_id.in_(absorbed)).values(cluster_id=ids[survivor])
             )
-            self.db.add(new_cluster)
-            self.db.commit()
-            self.db.refresh(new_cluster)
-            
-            # Assign problems to this cluster
-            for p in cluster_problems:
-                p.cluster_id = new_cluster.id
-            
-            self.db.commit()
-            clusters_found += 1
-            
-        logger.info(f"Clustering complete. Found {clusters_found} new clusters.")
+            self.db.execute(
+                update(GeneratedIdea).where(GeneratedIdea.cluster_id.in_(absorbed)).values(cluster_id=ids[survivor])
+            )
+            self.db.execute(
+                update(ProblemCluster).where(ProblemCluster.id == ids[survivor])
+                .values(centroid=centroid.tolist(), size=int(total), is_dirty=True)
+            )
+            self.db.execute(delete(ProblemCluster).where(ProblemCluster.id.in_(absorbed)))
+            removed += len(absorbed)
+
+        if removed:
+            bump_generation(self.db)
+        self.db.commit()
+        logger.info(f"Merged {removed} clusters into their nearest neighbours.")
+        return removed
@@ -1,12 +1,62 @@
 from sqlalchemy.orm import Session
-from models import ProblemCluster, GeneratedIdea
-from ai.llm_provider import LLMProvider
+from sqlalchemy import select, delete, insert
+from models import ProblemCluster, ProblemStatement, GeneratedIdea
+from ai.llm_provider import LLMProvider, AsyncLLMProvider
+from logic.representatives import RepresentativeSelector
+from generations import bump_generation
 from config import settings
+from typing import Any, Dict, List, Optional
+import asyncio
+import hashlib
 import logging
 import json
 
 logger = logging.getLogger(__name__)
 
+SYSTEM_PROMPT = "You are a creative startup founder. Output strictly JSON."
+
+def build_prompt(problems: List[str]) -> str:
+    context_text = "\n- ".join(problems)
+    return (
+        f"Based on the following list of user problems/complaints, generate 3 startup ideas.\n"
+        f"Problems:\n- {context_text}\n\n"
+        "Format the output as a valid JSON object with a key 'ideas' containing a list of objects with keys: "
+        "'title', 'description', 'solution_type', 'monetization_strategy', 'technical_complexity', 'market_size_estimate'."
+    )
+
+def parse_ideas(data: Any) -> List[Dict[str, Any]]:
+    ideas = data.get("ideas", []) if isinstance(data, dict) else []
+    # Handle edge cases where LLM returns list directly or unwrapped dict
+    if not ideas and isinstance(data, list):
+         ideas = data
+    elif isinstance(data, dict) and "ideas" not in data:
+         # Try to find a list value in any key
+         for k, v in data.items():
+             if isinstance(v, list):
+                 ideas = v
+                 break
+    return [idea for idea in ideas if isinstance(idea, dict)]
+
+def idea_rows(cluster_id: int, ideas: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "cluster_id": cluster_id,
+            "title": idea.get("title", "Untitled"),
+            "description": idea.get("description", ""),
+            "solution_type": idea.get("solution_type", "SaaS"),
+            "monetization_strategy": idea.get("monetization_strategy", "Subscription"),
+            "technical_complexity": idea.get("technical_complexity", "Medium"),
+            "market_size_estimate": idea.get("market_size_estimate", "Unknown")
+        }
+        for idea in ideas
+    ]
+
+def member_fingerprint(problem_ids: List[int]) -> str:
+    """
+    Stable hash of a cluster's member set, stored with its ideas to detect membership changes.
+    """
+    return hashlib.sha256(",".join(str(i) for i in sorted(problem_ids)).encode()).hexdigest()
+
 class IdeaGenerator:
     def __init__(self, db: Session):
         self.db = db
@@ -18,52 +68,114 @@ class IdeaGenerator:
             logger.error(f"Cluster {cluster_id} not found.")
             return
 
-        # Gather context
-        problems = [p.text for p in cluster.problems[:10]] # Limit context
-        context_text = "\n- ".join(problems)
-
-        prompt = (
-            f"Based on the following list of user problems/complaints, generate 3 startup ideas.\n"
-            f"Problems:\n- {context_text}\n\n"
-            "Format the output as a valid JSON object with a key 'ideas' containing a list of objects with keys: "
-            "'title', 'description', 'solution_type', 'monetization_strategy', 'technical_complexity', 'market_size_estimate'."
-        )
+        # Gather context: representative, non-redundant members only
+        problems = RepresentativeSelector(self.db).select(cluster.id, cluster.centroid)
+        prompt = build_prompt(problems)
 
         try:
-            data = self.llm.generate_json(
-                system_prompt="You are a creative startup founder. Output strictly JSON.",
-                user_prompt=prompt
-            )
-            
+            data = self.llm.generate_json(system_prompt=SYSTEM_PROMPT, user_prompt=prompt)
+
             if not data:
                 logger.error("Failed to generate valid JSON from LLM.")
                 return
 
-            ideas = data.get("ideas", []) 
-            # Handle edge cases where LLM returns list directly or unwrapped dict
-            if not ideas and isinstance(data, list):
-                 ideas = data
-            elif isinstance(data, dict) and "ideas" not in data:
-                 # Try to find a list value in any key
-                 for k, v in data.items():
-                     if isinstance(v, list):
-                         ideas = v
-                         break
-
-            for idea in ideas:
-                new_idea = GeneratedIdea(
-                    cluster_id=cluster.id,
-                    title=idea.get("title", "Untitled"),
-                    description=idea.get("description", ""),
-                    solution_type=idea.get("solution_type", "SaaS"),
-                    monetization_strategy=idea.get("monetization_strategy", "Subscription"),
-                    technical_complexity=idea.get("technical_complexity", "Medium"),
-                    market_size_estimate=idea.get("market_size_estimate", "Unknown")
-                )
-                self.db.add(new_idea)
-            
+            ideas = parse_ideas(data)
+            for row in idea_rows(cluster.id, ideas):
+                self.db.add(GeneratedIdea(**row))
+
+            bump_generation(self.db)
             self.db.commit()
             logger.info(f"Generated {len(ideas)} ideas for Cluster {cluster.id}")
 
         except Exception as e:
             logger.error(f"Error generating ideas: {e}")
+
+class IdeationRunner:
+    """
+    Generates ideas for the top-K clusters by score, IDEATION_CONCURRENCY LLM calls at a time.
+    Member ids for all K clusters come from one query; a cluster whose member set is unchanged since
+    its ideas were generated (ideas_fingerprint) is skipped, the others get a representative context
+    (RepresentativeSelector). Each result is written as soon as it arrives, replacing that cluster's
+    previous ideas.
+    """
+    def __init__(self, db: Session, top_k: Optional[int] = None, concurrency: Optional[int] = None):
+        self.db = db
+        self.top_k = top_k or settings.IDEATION_TOP_K
+        self.concurrency = concurrency or settings.IDEATION_CONCURRENCY
+
+    def load_clusters(self) -> List[ProblemCluster]:
+        return self.db.execute(
+            select(ProblemCluster).order_by(ProblemCluster.total_validation_score.desc()).limit(self.top_k)
+        ).scalars().all()
+
+    def plan(self, clusters: List[ProblemCluster]) -> List[Dict[str, Any]]:
+        members: Dict[int, List[int]] = {}
+        for cluster_id, problem_id in self.db.execute(
+            select(ProblemStatement.cluster_id, ProblemStatement.id)
+            .where(ProblemStatement.cluster_id.in_([c.id for c in clusters]))
+        ):
+            members.setdefault(cluster_id, []).append(problem_id)
+
+        selector = RepresentativeSelector(self.db)
+        jobs = []
+        for cluster in clusters:
+            if cluster.id not in members:
+                continue
+            fingerprint = member_fingerprint(members[cluster.id])
+            if fingerprint == cluster.ideas_fingerprint:
+                logger.info(f"Cluster {cluster.id} unchanged since its last ideation, skipping.")
+                continue
+            problems = selector.select(cluster.id, cluster.centroid)
+            jobs.append({"cluster_id": cluster.id, "fingerprint": fingerprint, "problems": problems})
+        return jobs
+
+    def save(self, job: Dict[str, Any], ideas: List[Dict[str, Any]]):
+        self.db.execute(delete(GeneratedIdea).where(GeneratedIdea.cluster_id == job["cluster_id"]))
+        if ideas:
+            self.db.execute(insert(GeneratedIdea), idea_rows(job["cluster_id"], ideas))
+        cluster = self.db.get(ProblemCluster, job["cluster_id"])
+        cluster.ideas_fingerprint = job["fingerprint"]
+        bump_generation(self.db)
+        self.db.commit()
+        logger.info(f"Generated {len(ideas)} ideas for Cluster {job['cluster_id']}")
+
+    async def _generate_all(self, jobs: List[Dict[str, Any]]) -> Dict[str, int]:
+        llm = AsyncLLMProvider()
+        workers = asyncio.Semaphore(self.concurrency)
+        stats = {"generated": 0, "failed": 0}
+
+        async def generate(job: Dict[str, Any]):
+            async with workers:
+                data = await llm.generate_json(system_prompt=SYSTEM_PROMPT, user_prompt=build_prompt(job["problems"]))
+            return job, parse_ideas(data) if data else []
+
+        try:
+            for next_result in asyncio.as_completed([generate(job) for job in jobs]):
+                job, ideas = await next_result
+                if not ideas:
+                    # Keep the old ideas and fingerprint so the next run retries
+                    logger.error(f"Failed to generate ideas for Cluster {job['cluster_id']}.")
+                    stats["failed"] += 1
+                    continue
+                try:
+                    self.save(job, ideas)
+                    stats["generated"] += 1
+                except Exception as e:
+                    logger.error(f"Error saving ideas for Cluster {job['cluster_id']}: {e}")
+                    self.db.rollback()
+                    stats["failed"] += 1
+        finally:
+            await AsyncLLMProvider.aclose_shared() # run() owns this event loop
+        return stats
+
+    def run(self) -> Dict[str, int]:
+        clusters = self.load_clusters()
+        jobs = self.plan(clusters)
+        stats = {"generated": 0, "failed": 0}
+        if jobs:
+            stats = asyncio.run(self._generate_all(jobs))
+        stats["skipped"] = len(clusters) - len(jobs)
+        logger.info(
+            f"Ideation: {stats['generated']} clusters updated, {stats['skipped']} unchanged, {stats['failed']} failed."
+        )
+        return stats
@@ -0,0 +1,70 @@
+import numpy as np
+from sqlalchemy.orm import Session
+from sqlalchemy import select
+from models import ProblemStatement
+from ai.vectors import normalize
+from config import settings
+from typing import List, Optional, Sequence
+
+def mmr(candidates: np.ndarray, query: np.ndarray, k: int, diversity: float) -> List[int]:
+    """
+    Maximal marginal relevance: greedily picks rows similar to `query` but dissimilar to the rows
+    already picked. diversity=0 is pure relevance, 1 is pure novelty. Returns row indices in pick order.
+    """
+    if len(candidates) == 0:
+        return []
+    unit = normalize(candidates.astype(np.float32))
+    relevance = unit @ normalize(query.astype(np.float32))
+    redundancy = np.full(len(unit), -np.inf, dtype=np.float32)
+
+    picked: List[int] = []
+    available = np.ones(len(unit), dtype=bool)
+    for _ in range(min(k, len(unit))):
+        penalty = np.where(np.isfinite(redundancy), redundancy, 0.0)
+        scores = np.where(available, (1.0 - diversity) * relevance - diversity * penalty, -np.inf)
+        best = int(scores.argmax())
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, unit @ unit[best])
+    return picked
+
+class RepresentativeSelector:
+    """
+    Picks the problems that best represent a cluster for an ideation prompt: a pool of the
+    IDEATION_CANDIDATE_POOL members closest to the centroid (exact ORDER BY <=> LIMIT on Postgres),
+    narrowed to IDEATION_CONTEXT_PROBLEMS by MMR so near-duplicate complaints don't fill the context.
+    Only the pool is ever loaded, never the whole cluster.
+    """
+    def __init__(self, db: Session):
+        self.db = db
+        self.pool_size = settings.IDEATION_CANDIDATE_POOL
+        self.diversity = settings.IDEATION_MMR_DIVERSITY
+
+    def _pool(self, cluster_id: int, centroid: Optional[Sequence[float]]):
+        columns = (ProblemStatement.id, ProblemStatement.text, ProblemStatement.embedding)
+        base = select(*columns).where(ProblemStatement.cluster_id == cluster_id, ProblemStatement.embedding != None)
+
+        if centroid is not None and self.db.get_bind().dialect.name == "postgresql":
+            # Exact ranking over the members: served by the embedding ANN index, the cluster filter would
+            # only apply to the hnsw.ef_search candidates it returns from the whole table, rarely filling the pool
+            members = base.cte("members").prefix_with("MATERIALIZED")
+            return self.db.execute(
+                select(members).order_by(members.c.embedding.cosine_distance(centroid)).limit(self.pool_size)
+            ).all()
+
+        # Without pgvector (SQLite tests) or a centroid: a bounded, stable sample of members
+        return self.db.execute(base.order_by(ProblemStatement.id).limit(self.pool_size)).all()
+
+    def select(self, cluster_id: int, centroid: Optional[Sequence[float]] = None, k: Optional[int] = None) -> List[str]:
+        k = k or settings.IDEATION_CONTEXT_PROBLEMS
+        rows = self._pool(cluster_id, centroid)
+        if not rows:
+            # Members without embeddings: plain first-k, still bounded
+            return self.db.execute(
+                select(ProblemStatement.text).where(ProblemStatement.cluster_id == cluster_id)
+                .order_by(ProblemStatement.id).limit(k)
+            ).scalars().all()
+
+        embeddings = np.vstack([np.asarray(row.embedding, dtype=np.float32) for row in rows])
+        query = np.asarray(centroid, dtype=np.float32) if centroid is not None else embeddings.mean(axis=0)
+        return [rows[i].text for i in mmr(embeddings, query, k, self.diversity)]
@@ -1,80 +1,246 @@
 from sqlalchemy.orm import Session
-from models import ProblemCluster, ProblemStatement, Post
-from sqlalchemy import func
-from datetime import datetime, timedelta
+from models import ProblemCluster, ProblemStatement, Post, DuplicateLink
+from sqlalchemy import func, select, update
+from database import bulk_update
+from generations import bump_generation
+from config import settings
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
 import logging
 
 logger = logging.getLogger(__name__)
 
+def decay_factor(seconds: float) -> float:
+    """
+    Multiplier applied to a recency weight after `seconds` have passed (exponential, half-life SCORE_RECENCY_DAYS).
+    """
+    return 0.5 ** (max(seconds, 0.0) / (settings.SCORE_RECENCY_DAYS * 86400))
+
 class ScoringEngine:
+    """
+    Scores clusters on Frequency, Intensity, Engagement and Recency.
+    On Postgres the per-cluster inputs come from one GROUP BY query joining problems to posts;
+    on SQLite (tests), which stores datetimes as text, the same inputs are accumulated in Python
+    from one streamed join. Either way results are written with a single bulk update.
+
+    Recency is the mean exponentially-decayed age weight of a cluster's posts. Every post decays
+    by the same factor over the same interval, so a clean cluster's recency is rescaled in place
+    instead of being recomputed, and only once the decay is worth SCORE_DECAY_MIN_CHANGE points;
+    only dirty clusters are aggregated again (see rescore()).
+    """
     def __init__(self, db: Session):
         self.db = db
 
-    def calculate_scores(self, cluster_id: int):
-        cluster = self.db.query(ProblemCluster).filter(ProblemCluster.id == cluster_id).first()
-        if not cluster:
-            return
+    def _aggregate_sql(self, now: datetime, cluster_ids: Optional[List[int]] = None) -> List[Dict]:
+        half_life = settings.SCORE_RECENCY_DAYS * 86400
+        age = func.extract("epoch", now - Post.created_utc)
+        stmt = (
+            select(
+                ProblemStatement.cluster_id,
+                func.count(ProblemStatement.id).label("count"),
+                # Sentiment is -1..1 (missing = neutral); intensity: -1 -> 1.0, 1 -> 0.0
+                func.avg((func.coalesce(ProblemStatement.sentiment_score, 0.0) * -1 + 1) / 2).label("avg_intensity"),
+                func.sum(func.coalesce(Post.score, 0) + func.coalesce(Post.num_comments, 0)).label("total_engagement"),
+                func.sum(func.coalesce(func.power(0.5, func.greatest(age, 0) / half_life), 0.0)).label("recency_weight")
+            )
+            .outerjoin(Post, Post.id == ProblemStatement.post_id)
+            .where(ProblemStatement.cluster_id != None)
+            .group_by(ProblemStatement.cluster_id)
+        )
+        if cluster_ids is not None:
+            stmt = stmt.where(ProblemStatement.cluster_id.in_(cluster_ids))
+        return [dict(row._mapping) for row in self.db.execute(stmt)]
+
+    def _aggregate_python(self, now: datetime, cluster_ids: Optional[List[int]] = None) -> List[Dict]:
+        stmt = (
+            select(
+                ProblemStatement.cluster_id,
+                ProblemStatement.sentiment_score,
+                Post.score,
+                Post.num_comments,
+                Post.created_utc
+            )
+            .outerjoin(Post, Post.id == ProblemStatement.post_id)
+            .where(ProblemStatement.cluster_id != None)
+            .execution_options(yield_per=5000)
+        )
+        if cluster_ids is not None:
+            stmt = stmt.where(ProblemStatement.cluster_id.in_(cluster_ids))
+
+        totals: Dict[int, Dict] = {}
+        for row in self.db.execute(stmt):
+            agg = totals.setdefault(row.cluster_id, {
+                "cluster_id": row.cluster_id, "count": 0, "intensity": 0.0, "total_engagement": 0, "recency_weight": 0.0
+            })
+            s = row.sentiment_score if row.sentiment_score is not None else 0
+            agg["count"] += 1
+            agg["intensity"] += (s * -1 + 1) / 2
+            agg["total_engagement"] += (row.score or 0) + (row.num_comments or 0)
+            if row.created_utc:
+                created = row.created_utc if row.created_utc.tzinfo else row.created_utc.replace(tzinfo=timezone.utc)
+                agg["recency_weight"] += decay_factor((now - created).total_seconds())
+
+        for agg in totals.values():
+            agg["avg_intensity"] = agg.pop("intensity") / agg["count"]
+        return list(totals.values())
 
-        problems = cluster.problems
-        if not problems:
+    def _add_duplicates(self, aggregates: List[Dict], now: datetime, cluster_ids: Optional[List[int]] = None):
+        """
+        Folds linked duplicate posts into their canonical problem's cluster at SCORE_DUPLICATE_WEIGHT each:
+        they add frequency, engagement and recency evidence but no intensity (they carry no problem).
+        """
+        weight = settings.SCORE_DUPLICATE_WEIGHT
+        if weight <= 0:
             return
 
-        # 1. Frequency (Normalizing? Let's just use raw count for now, capped at 50)
+        stmt = (
+            select(ProblemStatement.cluster_id, Post.score, Post.num_comments, Post.created_utc)
+            .select_from(DuplicateLink)
+            .join(ProblemStatement, ProblemStatement.post_id == DuplicateLink.canonical_post_id)
+            .join(Post, Post.id == DuplicateLink.duplicate_post_id)
+            .where(ProblemStatement.cluster_id != None)
+        )
+        if cluster_ids is not None:
+            stmt = stmt.where(ProblemStatement.cluster_id.in_(cluster_ids))
+
+        by_cluster = {agg["cluster_id"]: agg for agg in aggregates}
+        for row in self.db.execute(stmt):
+            agg = by_cluster.get(row.cluster_id)
+            if agg is None:
+                continue
+            agg["count"] += weight
+            agg["total_engagement"] = float(agg["total_engagement"] or 0) + weight * ((row.score or 0) + (row.num_comments or 0))
+            if row.created_utc:
+                created = row.created_utc if row.created_utc.tzinfo else row.created_utc.replace(tzinfo=timezone.utc)
+                agg["recency_weight"] = float(agg["recency_weight"] or 0) + weight * decay_factor((now - created).total_seconds())
+
+    def _score(self, agg: Dict, now: datetime) -> Dict:
+        count = agg["count"]
+
+        # 1. Frequency (raw count, capped)
         # In a real app, we'd normalize against the average cluster size.
-        count = len(problems)
-        f_score = min(count / 50.0, 1.0) * 100
+        f_score = min(count / settings.SCORE_FREQUENCY_CAP, 1.0) * 100
 
         # 2. Intensity (Sentiment)
-        # Assuming sentiment_score in DB is -1 to 1. We want negative intensity.
-        # So close to -1 is high intensity.
-        dataset_intensity = []
-        for p in problems:
-            # If we haven't computed sentiment yet, assume neutral (0)
-            s = p.sentiment_score if p.sentiment_score is not None else 0
-            # Convert to intensity: -1 -> 1.0, 1 -> 0.0
-            intensity = (s * -1 + 1) / 2
-            dataset_intensity.append(intensity)
-        
-        avg_intensity = sum(dataset_intensity) / len(dataset_intensity) if dataset_intensity else 0
-        i_score = avg_intensity * 100
-
-        # 3. Engagement
-        # (Upvotes + Comments)
-        total_engagement = 0
-        for p in problems:
-            if p.post:
-                total_engagement += (p.post.score + p.post.num_comments)
-        
-        avg_engagement = total_engagement / count
-        # Cap at 1000 for normalization
-        e_score = min(avg_engagement / 1000.0, 1.0) * 100
-
-        # 4. Recency
-        # % of posts in last 30 days
-        now = datetime.utcnow()
-        recent_count = 0
-        for p in problems:
-            if p.post and p.post.created_utc:
-                if p.post.created_utc > now - timedelta(days=30):
-                    recent_count += 1
-        
-        r_score = (recent_count / count) * 100
+        i_score = float(agg["avg_intensity"] or 0) * 100
+
+        # 3. Engagement (Upvotes + Comments), capped for normalization
+        avg_engagement = float(agg["total_engagement"] or 0) / count
+        e_score = min(avg_engagement / settings.SCORE_ENGAGEMENT_CAP, 1.0) * 100
+
+        # 4. Recency (mean decayed post weight: 100 = all brand new)
+        r_score = (float(agg["recency_weight"] or 0) / count) * 100
 
         # Weighted Sum
-        # F: 40%, I: 30%, E: 20%, R: 10%
-        final_score = (f_score * 0.4) + (i_score * 0.3) + (e_score * 0.2) + (r_score * 0.1)
-
-        # Update Cluster
-        cluster.frequency_score = f_score
-        cluster.intensity_score = i_score
-        cluster.engagement_score = e_score
-        cluster.recency_score = r_score
-        cluster.total_validation_score = final_score
-        
+        final_score = (
+            f_score * settings.SCORE_WEIGHT_FREQUENCY
+            + i_score * settings.SCORE_WEIGHT_INTENSITY
+            + e_score * settings.SCORE_WEIGHT_ENGAGEMENT
+            + r_score * settings.SCORE_WEIGHT_RECENCY
+        )
+        return {
+            "id": agg["cluster_id"],
+            "frequency_score": f_score,
+            "intensity_score": i_score,
+            "engagement_score": e_score,
+            "recency_score": r_score,
+            "total_validation_score": final_score,
+            "is_dirty": False,
+            "scored_at": now
+        }
+
+    def score_clusters(self, cluster_ids: Optional[List[int]] = None) -> int:
+        """
+        Scores the given clusters (all clusters when None) with one aggregate read and one bulk write,
+        and clears their dirty flags. Clusters without problems keep their previous scores.
+        """
+        now = datetime.now(timezone.utc)
+        if self.db.get_bind().dialect.name == "postgresql":
+            aggregates = self._aggregate_sql(now, cluster_ids)
+        else:
+            aggregates = self._aggregate_python(now, cluster_ids)
+        self._add_duplicates(aggregates, now, cluster_ids)
+
+        scores = [self._score(agg, now) for agg in aggregates if agg["count"]]
+        bulk_update(self.db, ProblemCluster, scores)
+
+        # Requested clusters that have no members left are clean too
+        emptied = update(ProblemCluster).where(ProblemCluster.id.notin_([row["id"] for row in scores]))
+        if cluster_ids is not None:
+            emptied = emptied.where(ProblemCluster.id.in_(cluster_ids))
+        self.db.execute(emptied.values(is_dirty=False, scored_at=now).execution_options(synchronize_session=False))
+        if scores:
+            bump_generation(self.db)
         self.db.commit()
-        logger.info(f"Cluster {cluster.id} Score: {final_score:.2f}")
+
+        logger.info(f"Scored {len(scores)} clusters.")
+        return len(scores)
+
+    def decay_clean_clusters(self, now: Optional[datetime] = None) -> int:
+        """
+        Brings recency (and the total) of clean clusters up to `now` without reading their members,
+        rewriting only clusters whose total would drop by at least SCORE_DECAY_MIN_CHANGE points;
+        the others keep their scored_at and catch up on a later run. On Postgres this is one UPDATE
+        with the factor computed per row; elsewhere (SQLite tests) one UPDATE per distinct scored_at.
+        """
+        now = now or datetime.now(timezone.utc)
+        weight = settings.SCORE_WEIGHT_RECENCY
+        clean = (ProblemCluster.is_dirty == False, ProblemCluster.scored_at != None)
+
+        def rescale(factor):
+            # Right-hand sides see the old recency_score
+            return {
+                "recency_score": ProblemCluster.recency_score * factor,
+                "total_validation_score": ProblemCluster.total_validation_score
+                - ProblemCluster.recency_score * weight * (1.0 - factor),
+                "scored_at": now
+            }
+
+        def worth_it(factor):
+            return ProblemCluster.recency_score * weight * (1.0 - factor) >= settings.SCORE_DECAY_MIN_CHANGE
+
+        if self.db.get_bind().dialect.name == "postgresql":
+            age = func.greatest(func.extract("epoch", now - ProblemCluster.scored_at), 0)
+            factor = func.power(0.5, age / (settings.SCORE_RECENCY_DAYS * 86400))
+            updated = self.db.execute(
+                update(ProblemCluster).where(*clean, worth_it(factor)).values(**rescale(factor))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+        else:
+            watermarks = self.db.execute(select(ProblemCluster.scored_at).where(*clean).distinct()).scalars().all()
+            updated = 0
+            for scored_at in watermarks:
+                as_utc = scored_at if scored_at.tzinfo else scored_at.replace(tzinfo=timezone.utc)
+                factor = decay_factor((now - as_utc).total_seconds())
+                updated += self.db.execute(
+                    update(ProblemCluster)
+                    .where(*clean, ProblemCluster.scored_at == scored_at, worth_it(factor))
+                    .values(**rescale(factor))
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+        if updated:
+            bump_generation(self.db)
+        self.db.commit()
+        return updated
+
+    def rescore(self) -> int:
+        """
+        Incremental pass: decays clean clusters in place, then fully scores only dirty ones
+        (new clusters, changed membership, refreshed engagement). Returns the number rescored.
+        """
+        now = datetime.now(timezone.utc)
+        decayed = self.decay_clean_clusters(now)
+
+        dirty_ids = self.db.execute(
+            select(ProblemCluster.id).where(ProblemCluster.is_dirty.isnot(False))
+        ).scalars().all()
+        scored = self.score_clusters(dirty_ids) if dirty_ids else 0
+
+        logger.info(f"Rescored {scored} dirty clusters, decayed {decayed} clean clusters.")
+        return scored
+
+    def calculate_scores(self, cluster_id: int):
+        self.score_clusters([cluster_id])
 
     def score_all_clusters(self):
-        clusters = self.db.query(ProblemCluster).all()
-        for cluster in clusters:
-            self.calculate_scores(cluster.id)
+        self.score_clusters()
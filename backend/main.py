@@ -1,11 +1,14 @@
 import argparse
+from typing import Optional
 from ingestion.collector import main as run_collector
 from database import SessionLocal
+from ai.processor import PostProcessor
 from logic.clustering import ClusterEngine
-from logic.ideation import IdeaGenerator
+from logic.ideation import IdeationRunner
 from logic.scoring import ScoringEngine
+from jobs.stages import STAGES
 
-def run_pipeline():
+def run_pipeline(top_k: Optional[int] = None):
     print("Starting Pipeline...")
     
     # 1. Collection (Already implemented in collector.py, usually runs separately)
@@ -13,30 +16,25 @@ def run_pipeline():
     
     db = SessionLocal()
     
-    # 2. AI Processing (Placeholder loop - in real app would use extracting/embedding)
-    # For now, we assume data is ingested and processed by extraction/embedding scripts which we'd need to loop over.
-    # But since we didn't make a dedicated "processor.py" that loops over DB, we can add it here or just skip to clustering for now.
+    # 2. AI Processing (filter -> extract -> embed every unprocessed post)
+    print("Running Processing...")
+    processor = PostProcessor(db)
+    processor.run()
     
     # 3. Clustering
     print("Running Clustering...")
     clusterer = ClusterEngine(db)
     clusterer.run_clustering()
     
-    # 4. Scoring
+    # 4. Scoring (incremental)
     print("Running Scoring...")
     scorer = ScoringEngine(db)
-    scorer.score_all_clusters()
+    scorer.rescore() # Only dirty clusters are recomputed
     
-    # 5. Ideation
+    # 5. Ideation (top-K clusters in parallel, unchanged clusters skipped)
     print("Running Ideation...")
-    generator = IdeaGenerator(db)
-    # Get top 5 clusters by score
-    from models import ProblemCluster
-    top_clusters = db.query(ProblemCluster).order_by(ProblemCluster.total_validation_score.desc()).limit(5).all()
-    
-    for cluster in top_clusters:
-        print(f"Generating ideas for Cluster: {cluster.name} (Score: {cluster.total_validation_score})")
-        generator.generate_ideas_for_cluster(cluster.id)
+    runner = IdeationRunner(db, top_k=top_k)
+    runner.run()
 
     db.close()
     print("Pipeline Complete.")
@@ -45,12 +43,61 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--collect", action="store_true", help="Run data collection")
     parser.add_argument("--pipeline", action="store_true", help="Run AI pipeline")
+    parser.add_argument("--top-k", type=int, default=None, help="Clusters to generate ideas for (default: IDEATION_TOP_K)")
+    parser.add_argument("--merge-clusters", action="store_true", help="Refresh centroids and merge near-duplicate clusters")
+    parser.add_argument("--train-classifier", action="store_true", help="Train the extraction pre-classifier from processed posts")
+    parser.add_argument("--vector-index", nargs="?", const="", choices=["", "hnsw", "ivfflat", "binary", "none"], default=None,
+                        help="(Re)build the problem embedding ANN index (default kind: VECTOR_INDEX_TYPE)")
+    parser.add_argument("--migrate-embeddings", choices=["convert", "reembed"],
+                        help="Move stored embeddings to EMBEDDING_STORAGE/EMBEDDING_DIM (convert) or EMBEDDING_MODEL (reembed)")
+    parser.add_argument("--classifier-path", default=None, help="Where to save the pre-classifier (default: PRECLASSIFIER_PATH)")
+    parser.add_argument("--worker", action="store_true", help="Run queued pipeline jobs (JOB_QUEUE_BACKEND)")
+    parser.add_argument("--processes", type=int, default=None, help="Worker processes (default: JOB_WORKER_PROCESSES, 0 = in this process)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=None, help="Stages this worker runs (default: all)")
+    parser.add_argument("--enqueue", choices=STAGES, help="Queue the pipeline starting at this stage; later stages follow automatically")
+    parser.add_argument("--queue-status", action="store_true", help="Show queued/running/failed jobs per stage")
     
     args = parser.parse_args()
     
     if args.collect:
         run_collector()
     elif args.pipeline:
-        run_pipeline()
+        run_pipeline(top_k=args.top_k)
+    elif args.merge_clusters:
+        db = SessionLocal()
+        ClusterEngine(db).merge_clusters()
+        db.close()
+    elif args.train_classifier:
+        from ai.preclassifier import train_preclassifier
+        db = SessionLocal()
+        train_preclassifier(db, args.classifier_path)
+        db.close()
+    elif args.vector_index is not None:
+        from ai.vector_index import VectorIndexManager
+        db = SessionLocal()
+        manager = VectorIndexManager(db)
+        manager.build_index(args.vector_index or None, rebuild=True)
+        for index in manager.status():
+            print(f"{index['indexname']} ({index['size']}): {index['indexdef']}")
+        db.close()
+    elif args.migrate_embeddings:
+        from ai.embedding_migration import EmbeddingMigrator
+        db = SessionLocal()
+        EmbeddingMigrator(db).run(args.migrate_embeddings)
+        db.close()
+    elif args.worker:
+        from jobs.worker import run_workers
+        run_workers(args.processes, args.stages)
+    elif args.enqueue:
+        from jobs.queue import get_job_queue
+        from jobs.stages import submit
+        print(f"Queued job {submit(get_job_queue(), args.enqueue, args.top_k)} ({args.enqueue}).")
+    elif args.queue_status:
+        from jobs.queue import get_job_queue
+        for stage, counts in sorted(get_job_queue().counts().items()):
+            print(f"{stage}: " + ", ".join(f"{n} {status}" for status, n in sorted(counts.items())))
     else:
-        print("Use --collect or --pipeline")
+        print(
+            "Use --collect, --pipeline, --merge-clusters, --train-classifier, --vector-index, --migrate-embeddings, "
+            "--worker, --enqueue or --queue-status"
+        )
@@ -1,8 +1,32 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Float, ForeignKey, Boolean, JSON, ARRAY
+from sqlalchemy import Column, Integer, String, LargeBinary, Text, DateTime, Float, ForeignKey, Boolean, JSON, ARRAY, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import Vector, HALFVEC
 from database import Base
+from config import settings
+import numpy as np
+
+class HalfVec(HALFVEC):
+    """
+    halfvec column that loads as float32 NumPy arrays, like Vector, so readers don't depend on the storage type.
+    """
+    cache_ok = True
+
+    def result_processor(self, dialect, coltype):
+        process = super().result_processor(dialect, coltype)
+
+        def to_numpy(value):
+            value = process(value)
+            return None if value is None else value.to_numpy().astype(np.float32)
+        return to_numpy
+
+def embedding_type():
+    """
+    Column type for embeddings and centroids: EMBEDDING_DIM wide, 32-bit (vector) or 16-bit (halfvec) floats.
+    """
+    return (HalfVec if settings.EMBEDDING_STORAGE == "halfvec" else Vector)(settings.EMBEDDING_DIM)
+
+EMBEDDING_OPS = f"{settings.EMBEDDING_STORAGE}_cosine_ops"
 
 class Subreddit(Base):
     __tablename__ = "subreddits"
@@ -15,29 +39,91 @@ class Subreddit(Base):
     last_scanned_at = Column(DateTime(timezone=True), nullable=True)
     
     posts = relationship("Post", back_populates="subreddit")
+    cursors = relationship("CrawlCursor", back_populates="subreddit")
+
+class CrawlCursor(Base):
+    __tablename__ = "crawl_cursors"
+    __table_args__ = (UniqueConstraint("subreddit_id", "listing"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    subreddit_id = Column(Integer, ForeignKey("subreddits.id"))
+    listing = Column(String) # "new", "hot", "top"
+
+    # Newest post seen on this listing (watermark for paging "new")
+    last_fullname = Column(String, nullable=True) # e.g. "t3_xxxxx"
+    last_created_utc = Column(DateTime(timezone=True), nullable=True)
+    last_fetched_at = Column(DateTime(timezone=True), nullable=True)
+
+    subreddit = relationship("Subreddit", back_populates="cursors")
 
 class Post(Base):
     __tablename__ = "posts"
 
     id = Column(String, primary_key=True) # Reddit ID (e.g., "t3_xxxxx")
-    subreddit_id = Column(Integer, ForeignKey("subreddits.id"))
+    subreddit_id = Column(Integer, ForeignKey("subreddits.id"), index=True)
     title = Column(String)
     text = Column(Text)
     url = Column(String)
     author = Column(String)
     score = Column(Integer, default=0)
     num_comments = Column(Integer, default=0)
-    created_utc = Column(DateTime(timezone=True))
+    created_utc = Column(DateTime(timezone=True), index=True)
     
     # Processing Status
     is_processed = Column(Boolean, default=False)
     has_problem = Column(Boolean, default=False)
+    classifier_skipped = Column(Boolean, default=False) # Gated out by the pre-classifier, never seen by the LLM
+    # Extraction job ("<batch>:<part>") that owns this unprocessed post, so overlapping splits never hand it out twice
+    process_claim = Column(String, nullable=True, index=True)
+    process_claimed_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Near-duplicate detection: MinHash signature of title + text (see ingestion/dedupe.py)
+    minhash = Column(LargeBinary, nullable=True)
     
     subreddit = relationship("Subreddit", back_populates="posts")
     extracted_problems = relationship("ProblemStatement", back_populates="post")
 
+class PostSignatureBand(Base):
+    """
+    LSH bands of a post's MinHash signature. The (band, value) index turns "which stored posts could be
+    near-duplicates of this one" into a few index lookups instead of a scan.
+    Only canonical posts get bands, so a duplicate is never matched as the original.
+    """
+    __tablename__ = "post_signature_bands"
+    __table_args__ = (Index("ix_post_signature_bands_lookup", "band", "value"),)
+
+    post_id = Column(String, ForeignKey("posts.id"), primary_key=True)
+    band = Column(Integer, primary_key=True)
+    value = Column(Integer)
+
+class DuplicateLink(Base):
+    """
+    A post recognised as a near-duplicate of an earlier one, either by MinHash at ingestion ("post")
+    or by embedding similarity of its extracted problem ("problem"). Duplicates are not processed or
+    stored as problems; scoring can still count them (SCORE_DUPLICATE_WEIGHT).
+    """
+    __tablename__ = "duplicate_links"
+    __table_args__ = (UniqueConstraint("duplicate_post_id", name="uq_duplicate_links_duplicate"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String) # "post" or "problem"
+    duplicate_post_id = Column(String, ForeignKey("posts.id"))
+    canonical_post_id = Column(String, ForeignKey("posts.id"), index=True)
+    canonical_problem_id = Column(Integer, ForeignKey("problem_statements.id"), nullable=True)
+    similarity = Column(Float) # Estimated Jaccard for posts, 1 - cosine distance for problems
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
 class ProblemStatement(Base):
     __tablename__ = "problem_statements"
+    __table_args__ = (
+        # Default ANN index; ai/vector_index.py can rebuild it or switch to IVFFlat
+        Index(
+            "ix_problem_statements_embedding_hnsw", "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": EMBEDDING_OPS}
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     post_id = Column(String, ForeignKey("posts.id"))
@@ -45,19 +131,35 @@ class ProblemStatement(Base):
     text = Column(Text) # The extracted problem statement
     original_text_segment = Column(Text) # The quote from the post
     sentiment_score = Column(Float, nullable=True)
-    embedding = Column(Vector(1536)) # OpenAI embedding dimension
+    embedding = Column(embedding_type()) # EMBEDDING_DIM / EMBEDDING_STORAGE
     
-    cluster_id = Column(Integer, ForeignKey("problem_clusters.id"), nullable=True)
+    cluster_id = Column(Integer, ForeignKey("problem_clusters.id"), nullable=True, index=True)
+    noise_at = Column(DateTime(timezone=True), nullable=True) # First left as HDBSCAN noise (see CLUSTER_NOISE_RETRY_DAYS)
     
     post = relationship("Post", back_populates="extracted_problems")
     cluster = relationship("ProblemCluster", back_populates="problems")
 
 class ProblemCluster(Base):
     __tablename__ = "problem_clusters"
+    __table_args__ = (
+        # Keyset pagination of the cluster listing (ORDER BY total_validation_score DESC, id DESC)
+        Index("ix_problem_clusters_score_id", "total_validation_score", "id"),
+        # ANN index so new problems find their nearest cluster without scanning every centroid
+        Index(
+            "ix_problem_clusters_centroid_hnsw", "centroid",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"centroid": EMBEDDING_OPS}
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String) # Auto-generated name
     description = Column(Text)
+
+    # Mean embedding of the members, kept up to date by incremental clustering
+    centroid = Column(embedding_type(), nullable=True)
+    size = Column(Integer, default=0)
     
     # Metrics
     frequency_score = Column(Float, default=0.0)
@@ -65,6 +167,14 @@ class ProblemCluster(Base):
     engagement_score = Column(Float, default=0.0)
     recency_score = Column(Float, default=0.0)
     total_validation_score = Column(Float, default=0.0)
+
+    # Incremental scoring: set when members or their posts' engagement change, cleared by the scorer.
+    # recency_score is as of scored_at; it only decays afterwards, so clean clusters are rescaled, not recomputed.
+    is_dirty = Column(Boolean, default=True, index=True)
+    scored_at = Column(DateTime(timezone=True), nullable=True)
+
+    # Hash of the member ids the current ideas were generated from; ideation skips the cluster while it matches
+    ideas_fingerprint = Column(String, nullable=True)
     
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     
@@ -85,3 +195,14 @@ class GeneratedIdea(Base):
     market_size_estimate = Column(String)
     
     cluster = relationship("ProblemCluster", back_populates="generated_ideas")
+
+class DataGeneration(Base):
+    """
+    Version counter for derived data (scores, ideas), bumped in the same transaction that changes it.
+    Read-side caches key on it, so they invalidate exactly when pipeline results change.
+    """
+    __tablename__ = "data_generations"
+
+    name = Column(String, primary_key=True) # e.g. "clusters"
+    generation = Column(Integer, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
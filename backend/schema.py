@@ -0,0 +1,65 @@
+from sqlalchemy import inspect, select, update, func, cast
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.schema import CreateColumn
+from models import Base, Post, ProblemStatement, ProblemCluster
+from ai.vector_index import INDEX_NAMES
+import logging
+
+logger = logging.getLogger(__name__)
+
+def _backfill_classifier_skipped(conn: Connection):
+    conn.execute(update(Post).values(classifier_skipped=False))
+
+def _backfill_centroids(conn: Connection):
+    members = select(func.count()).where(ProblemStatement.cluster_id == ProblemCluster.id).scalar_subquery()
+    conn.execute(update(ProblemCluster).values(size=members))
+    if conn.dialect.name == "postgresql":
+        # pgvector's AVG over the members; otherwise `main.py --merge-clusters` recomputes them
+        mean = select(func.avg(ProblemStatement.embedding)).where(ProblemStatement.cluster_id == ProblemCluster.id)
+        conn.execute(update(ProblemCluster).values(
+            centroid=cast(mean.scalar_subquery(), ProblemCluster.centroid.type)
+        ))
+
+def _backfill_dirty(conn: Connection):
+    # Every existing cluster gets one full rescore, which also sets scored_at
+    conn.execute(update(ProblemCluster).values(is_dirty=True))
+
+# (table, column) -> fills existing rows after the column is added; columns missing here stay NULL
+BACKFILLS = {
+    ("posts", "classifier_skipped"): _backfill_classifier_skipped,
+    ("problem_clusters", "size"): _backfill_centroids,
+    ("problem_clusters", "is_dirty"): _backfill_dirty,
+}
+
+def ensure_schema(engine: Engine):
+    """
+    Creates missing tables, then brings existing ones up to the models: create_all never alters a
+    table, so columns added since it was created get ALTER TABLE ... ADD COLUMN plus a backfill, and
+    missing indexes are created. Idempotent, safe to run on every start. The problem embedding ANN
+    index is left to ai/vector_index.py (`main.py --vector-index`).
+    """
+    existing = set(inspect(engine).get_table_names())
+    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing:
+                continue
+
+            columns = {column["name"] for column in inspector.get_columns(table.name)}
+            added = [column for column in table.columns if column.name not in columns]
+            for column in added:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {ddl}")
+                logger.info(f"Added column {table.name}.{column.name}.")
+            for column in added:
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill is not None:
+                    backfill(conn)
+
+            indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes and index.name not in INDEX_NAMES.values():
+                    index.create(conn)
+                    logger.info(f"Created index {index.name}.")